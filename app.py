@@ -1,8 +1,14 @@
+import time
 import streamlit as st
-from utils.config import configure_api
-from utils.ui_components import render_header, render_about, render_sidebar
+from utils.config import get_client, METRICS_PORT, SHOW_ADMIN_PANEL
+from utils.lazy import warm_up
+from utils.metrics import observe, start_metrics_server
+from utils.ui_components import render_header, render_about, render_sidebar, render_admin_panel
 from services.youtube_service import youtube_analyzer
 from services.pdf_service import pdf_url_analyzer, pdf_upload_analyzer
+from services.batch_service import batch_analyzer
+from services.comparison_service import comparison_analyzer
+from services.history_service import history_browser
 from models.user_profile import save_profile, get_current_profile, initialize_session_state
 
 # Page and API config
@@ -12,8 +18,14 @@ st.set_page_config(
     layout="wide"
 )
 
-# API configuration
-client = configure_api()
+render_start = time.perf_counter()
+
+# Expose Prometheus metrics when a port is configured
+if METRICS_PORT:
+    start_metrics_server(METRICS_PORT)
+
+# Shared API client (created once per process)
+client = get_client()
 if client is None:
     st.error("API key not found. Please configure the GOOGLE_GENAI_API_KEY environment variable.")
     st.stop()
@@ -27,14 +39,17 @@ render_header()
 # User profile in sidebar
 user_profile = render_sidebar()
 
-# Main interface
+# Main interface; each analyzer is a fragment, so its widgets only rerun that tab
 if not user_profile.is_complete():
     st.info("👋 Please complete your profile to continue")
 else:
-    tab1, tab2, tab3 = st.tabs([
+    tab1, tab2, tab3, tab4, tab5, tab6 = st.tabs([
         "Analyze YouTube Video", 
         "Analyze PDF from URL", 
-        "Analyze Uploaded PDF"
+        "Analyze Uploaded PDF",
+        "Batch PDF Analysis",
+        "Compare Papers",
+        "History"
     ])
 
     with tab1:
@@ -46,5 +61,22 @@ else:
     with tab3:
         pdf_upload_analyzer(client, user_profile)
 
+    with tab4:
+        batch_analyzer(client, user_profile)
+
+    with tab5:
+        comparison_analyzer(client, user_profile)
+
+    with tab6:
+        history_browser(user_profile)
+
 # About section
 render_about()
+
+if SHOW_ADMIN_PANEL:
+    render_admin_panel()
+
+observe("render", time.perf_counter() - render_start)
+
+# The page never needs these; import them in the background before the first analysis does
+warm_up("google.genai", "httpx", "pypdf", "PIL.Image", "numpy")
@@ -0,0 +1 @@
+# Ce fichier est nécessaire pour que Python traite ce répertoire comme un package.
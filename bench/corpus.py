@@ -0,0 +1,87 @@
+import json
+import os
+import random
+from typing import List
+
+WORDS = (
+    "model attention network training data results method layer gradient loss "
+    "evaluation baseline dataset accuracy parameter experiment analysis approach "
+    "performance transformer sequence token embedding optimization benchmark"
+).split()
+
+
+def parse_size(spec: str) -> int:
+    """Parse sizes such as 200k, 5m or 1500"""
+    spec = spec.strip().lower()
+    units = {"k": 1024, "m": 1024 * 1024}
+    if spec and spec[-1] in units:
+        return int(float(spec[:-1]) * units[spec[-1]])
+    return int(spec)
+
+
+def _page_text(rng: random.Random, lines: int = 40) -> List[str]:
+    return [" ".join(rng.choice(WORDS) for _ in range(12)) for _ in range(lines)]
+
+
+def make_pdf(target_bytes: int, seed: int = 0, text_pages: int = None) -> bytes:
+    """Build a valid PDF of about target_bytes with extractable text.
+
+    Pages hold real text lines (about 3 KB each, up to 200 pages); the rest
+    of the size is an unreferenced binary stream, like the images and fonts
+    that make up most of a real paper's bytes.
+    """
+    rng = random.Random(seed)
+    pages = text_pages or max(1, min(200, target_bytes // 3072))
+    objects = ["<< /Type /Catalog /Pages 2 0 R >>"]
+    font = 3 + 2 * pages
+    kids = " ".join(f"{3 + 2 * i} 0 R" for i in range(pages))
+    objects.append(f"<< /Type /Pages /Kids [{kids}] /Count {pages} >>")
+    for i in range(pages):
+        objects.append(f"<< /Type /Page /Parent 2 0 R /MediaBox [0 0 612 792] "
+                       f"/Resources << /Font << /F1 {font} 0 R >> >> /Contents {4 + 2 * i} 0 R >>")
+        lines = [f"(Synthetic paper {seed} page {i + 1}) Tj"] + [f"0 -16 Td ({line}) Tj" for line in _page_text(rng)]
+        stream = "BT /F1 10 Tf 72 740 Td " + " ".join(lines) + " ET"
+        objects.append(f"<< /Length {len(stream)} >>\nstream\n{stream}\nendstream")
+    objects.append("<< /Type /Font /Subtype /Type1 /BaseFont /Helvetica >>")
+
+    out = bytearray(b"%PDF-1.4\n")
+    offsets = []
+    for number, body in enumerate(objects, start=1):
+        offsets.append(len(out))
+        out += f"{number} 0 obj\n{body}\nendobj\n".encode("latin-1")
+    padding = target_bytes - len(out) - 200 - 20 * (len(objects) + 2)
+    if padding > 0:
+        offsets.append(len(out))
+        out += f"{len(objects) + 1} 0 obj\n<< /Length {padding} >>\nstream\n".encode("latin-1")
+        out += rng.randbytes(padding)
+        out += b"\nendstream\nendobj\n"
+    xref = len(out)
+    out += f"xref\n0 {len(offsets) + 1}\n0000000000 65535 f \n".encode("latin-1")
+    for offset in offsets:
+        out += f"{offset:010d} 00000 n \n".encode("latin-1")
+    out += f"trailer\n<< /Size {len(offsets) + 1} /Root 1 0 R >>\nstartxref\n{xref}\n%%EOF\n".encode("latin-1")
+    return bytes(out)
+
+
+def make_corpus(sizes: List[int], count: int, seed: int = 0) -> List[bytes]:
+    """count distinct PDFs cycling through sizes, so no two requests share a cache key"""
+    return [make_pdf(sizes[i % len(sizes)], seed=seed + i) for i in range(count)]
+
+
+def video_id(index: int) -> str:
+    """A valid, synthetic 11-character video id"""
+    return f"bench{index:06d}"
+
+
+def write_transcripts(directory: str, count: int, minutes: int = 20, first: int = 0) -> List[str]:
+    """Write timed transcript fixtures (one segment every 5 s) for videos first.. and return their ids"""
+    rng = random.Random(first)
+    os.makedirs(directory, exist_ok=True)
+    ids = []
+    for index in range(first, first + count):
+        segments = [{"start": float(t), "text": " ".join(rng.choice(WORDS) for _ in range(14))}
+                    for t in range(0, minutes * 60, 5)]
+        with open(os.path.join(directory, f"{video_id(index)}.json"), "w", encoding="utf-8") as f:
+            json.dump(segments, f)
+        ids.append(video_id(index))
+    return ids
@@ -0,0 +1,337 @@
+import itertools
+import json
+import random
+import threading
+import time
+from dataclasses import dataclass
+from datetime import datetime, timedelta, timezone
+from io import BytesIO
+from types import SimpleNamespace
+from typing import List, Optional
+
+from google.genai import errors
+from PIL import Image
+
+
+@dataclass
+class Latency:
+    """A latency distribution in seconds, parsed from specs such as "lognormal:0.8:0.4".
+
+    fixed:<s>, uniform:<low>:<high>, normal:<mean>:<sd> and
+    lognormal:<median>:<sigma> are supported.
+    """
+    kind: str = "fixed"
+    a: float = 0.0
+    b: float = 0.0
+
+    @classmethod
+    def parse(cls, spec: str) -> "Latency":
+        kind, *params = spec.split(":")
+        params = [float(p) for p in params] + [0.0, 0.0]
+        if kind not in ("fixed", "uniform", "normal", "lognormal"):
+            raise ValueError(f"Unknown latency distribution: {kind}")
+        return cls(kind, params[0], params[1])
+
+    def sample(self, rng: random.Random) -> float:
+        if self.kind == "uniform":
+            value = rng.uniform(self.a, self.b)
+        elif self.kind == "normal":
+            value = rng.gauss(self.a, self.b)
+        elif self.kind == "lognormal":
+            value = self.a * rng.lognormvariate(0.0, self.b)
+        else:
+            value = self.a
+        return max(0.0, value)
+
+
+def _texts(contents) -> List[str]:
+    """Every text fragment of a request's contents"""
+    if contents is None:
+        return []
+    if isinstance(contents, str):
+        return [contents]
+    if isinstance(contents, (list, tuple)):
+        return [text for item in contents for text in _texts(item)]
+    if getattr(contents, "parts", None) is not None:
+        return _texts(contents.parts)
+    text = getattr(contents, "text", None)
+    return [text] if text else []
+
+
+def payload_bytes(contents) -> int:
+    """Bytes a request's contents put on the wire (text, inline data and URIs)"""
+    if contents is None:
+        return 0
+    if isinstance(contents, str):
+        return len(contents.encode("utf-8"))
+    if isinstance(contents, (bytes, bytearray, memoryview)):
+        return len(contents)
+    if isinstance(contents, (list, tuple)):
+        return sum(payload_bytes(item) for item in contents)
+    if getattr(contents, "parts", None) is not None:
+        return payload_bytes(contents.parts)
+    size = 0
+    if getattr(contents, "text", None):
+        size += len(contents.text.encode("utf-8"))
+    inline_data = getattr(contents, "inline_data", None)
+    if inline_data is not None and inline_data.data:
+        size += len(inline_data.data)
+    file_data = getattr(contents, "file_data", None)
+    if file_data is not None and file_data.file_uri:
+        size += len(file_data.file_uri)
+    return size
+
+
+def _fake_from_schema(schema, words: str):
+    if hasattr(schema, "model_dump"):
+        schema = schema.model_dump(exclude_none=True)
+    kind = str(schema.get("type", "STRING")).upper().split(".")[-1]
+    if kind == "OBJECT":
+        return {name: _fake_from_schema(value, words) for name, value in schema.get("properties", {}).items()}
+    if kind == "ARRAY":
+        return [_fake_from_schema(schema.get("items", {}), words) for _ in range(3)]
+    if kind in ("NUMBER", "INTEGER"):
+        return 1
+    if kind == "BOOLEAN":
+        return True
+    return words
+
+
+def fake_image(rng: random.Random, width: int = 1024, height: int = 1024) -> bytes:
+    """A noisy PNG, roughly as hard to thumbnail as a generated image"""
+    image = Image.frombytes("RGB", (width, height), rng.randbytes(width * height * 3))
+    buffer = BytesIO()
+    image.save(buffer, format="PNG")
+    return buffer.getvalue()
+
+
+class Recordings:
+    """Recorded responses replayed by FakeClient.
+
+    A JSON Lines file where each line holds "text" (or "chunks" for
+    streamed responses) and optionally "match", a substring the request
+    text must contain. The first matching recording is replayed.
+    """
+
+    def __init__(self, entries: Optional[list] = None):
+        self.entries = entries or []
+
+    @classmethod
+    def load(cls, path: str) -> "Recordings":
+        with open(path, encoding="utf-8") as f:
+            return cls([json.loads(line) for line in f if line.strip()])
+
+    def find(self, texts: List[str]) -> Optional[dict]:
+        for entry in self.entries:
+            match = entry.get("match")
+            if not match or any(match in text for text in texts):
+                return entry
+        return None
+
+
+class FakeModels:
+    """Stand-in for client.models: sleeps like the API and replays or synthesizes responses"""
+
+    def __init__(self, client: "FakeClient"):
+        self._client = client
+
+    def generate_content(self, model: str, contents, config=None):
+        client = self._client
+        texts, tokens_in = client.begin(contents, config)
+        if config is not None and "IMAGE" in (getattr(config, "response_modalities", None) or []):
+            client.sleep(client.latency)
+            image = client.image()
+            return SimpleNamespace(
+                text=None,
+                usage_metadata=SimpleNamespace(prompt_token_count=tokens_in, candidates_token_count=1290),
+                candidates=[SimpleNamespace(content=SimpleNamespace(parts=[
+                    SimpleNamespace(text="Illustration of the concept.", inline_data=None),
+                    SimpleNamespace(text=None, inline_data=SimpleNamespace(data=image, mime_type="image/png")),
+                ]))],
+            )
+        text = client.respond(texts, config)
+        client.sleep(client.latency)
+        return SimpleNamespace(
+            text=text,
+            usage_metadata=SimpleNamespace(prompt_token_count=tokens_in, candidates_token_count=len(text) // 4),
+        )
+
+    def generate_content_stream(self, model: str, contents, config=None):
+        client = self._client
+        texts, tokens_in = client.begin(contents, config)
+        entry = client.recordings.find(texts)
+        chunks = entry["chunks"] if entry and "chunks" in entry else None
+        if chunks is None:
+            text = client.respond(texts, config)
+            size = max(1, len(text) // max(1, client.stream_chunks))
+            chunks = [text[i:i + size] for i in range(0, len(text), size)]
+        client.sleep(client.first_chunk)
+        for index, chunk in enumerate(chunks):
+            if index:
+                client.sleep(client.chunk_interval)
+            last = index == len(chunks) - 1
+            yield SimpleNamespace(
+                text=chunk,
+                usage_metadata=SimpleNamespace(prompt_token_count=tokens_in,
+                                      candidates_token_count=sum(len(c) for c in chunks) // 4) if last else None,
+            )
+
+    def embed_content(self, model: str, contents, config=None):
+        self._client.begin(contents, config)
+        self._client.sleep(self._client.latency)
+        rng = random.Random(hash(tuple(_texts(contents))))
+        return SimpleNamespace(embeddings=[
+            SimpleNamespace(values=[rng.uniform(-1, 1) for _ in range(64)]) for _ in _texts(contents)
+        ])
+
+
+class FakeFiles:
+    """Stand-in for client.files: upload() reads the file and counts it as sent"""
+
+    def __init__(self, client: "FakeClient"):
+        self._client = client
+        self._files = {}
+
+    def upload(self, file, config=None):
+        if hasattr(file, "read"):
+            data = file.read()
+        else:
+            with open(file, "rb") as f:
+                data = f.read()
+        self._client.add_bytes(len(data))
+        self._client.sleep(self._client.latency)
+        name = f"files/fake-{len(self._files) + 1}"
+        self._files[name] = SimpleNamespace(
+            name=name, uri=f"https://generativelanguage.googleapis.com/v1beta/{name}",
+            mime_type=getattr(config, "mime_type", None) or "application/pdf", state="ACTIVE",
+            expiration_time=None,
+        )
+        return self._files[name]
+
+    def get(self, name: str):
+        return self._files[name]
+
+
+class FakeCaches:
+    """In-memory stand-in for client.caches.
+
+    Stores the contents of each cached context and expires it after its
+    TTL; expand() lets a fake models object resolve cached_content.
+    """
+
+    def __init__(self):
+        self._caches = {}
+        self._ids = itertools.count(1)
+        self._lock = threading.Lock()
+
+    def create(self, model: str, config):
+        seconds = float(str(config.ttl or "3600s").rstrip("s"))
+        cache = SimpleNamespace(
+            name=f"cachedContents/fake-{next(self._ids)}",
+            model=model,
+            expire_time=datetime.now(timezone.utc) + timedelta(seconds=seconds),
+        )
+        with self._lock:
+            self._caches[cache.name] = (cache, list(config.contents))
+        return cache
+
+    def get(self, name: str):
+        with self._lock:
+            entry = self._caches.get(name)
+        if entry is None or entry[0].expire_time <= datetime.now(timezone.utc):
+            raise errors.ClientError(404, {"error": {
+                "code": 404, "message": "CachedContent not found (or permission denied)", "status": "NOT_FOUND"
+            }})
+        return entry[0]
+
+    def delete(self, name: str):
+        with self._lock:
+            self._caches.pop(name, None)
+
+    def expand(self, contents, config) -> list:
+        """Return the cached contents followed by contents, as the API would see them"""
+        name = getattr(config, "cached_content", None)
+        if not name:
+            return list(contents)
+        self.get(name)
+        with self._lock:
+            return self._caches[name][1] + list(contents)
+
+
+class FakeClient:
+    """Offline stand-in for genai.Client with realistic timing.
+
+    Every call sleeps for a sample of `latency` (plus `seconds_per_mb` of
+    request payload), fails with a 429 with probability `error_rate`, and
+    returns a replayed recording or a synthesized response of `words`
+    words. Streams wait `first_chunk` before the first of `stream_chunks`
+    chunks and `chunk_interval` between the others. Calls and bytes sent
+    are counted for the benchmark report.
+    """
+
+    def __init__(self, latency: Latency = None, first_chunk: Latency = None, chunk_interval: Latency = None,
+                 error_rate: float = 0.0, seconds_per_mb: float = 0.0, words: int = 200, stream_chunks: int = 20,
+                 recordings: Recordings = None, image_px: int = 1024, seed: int = 0):
+        self.latency = latency or Latency()
+        self.first_chunk = first_chunk or self.latency
+        self.chunk_interval = chunk_interval or Latency()
+        self.error_rate = error_rate
+        self.seconds_per_mb = seconds_per_mb
+        self.words = words
+        self.stream_chunks = stream_chunks
+        self.recordings = recordings or Recordings()
+        self.image_px = image_px
+        self.calls = 0
+        self.errors = 0
+        self.bytes_sent = 0
+        self._rng = random.Random(seed)
+        self._lock = threading.Lock()
+        self._images = {}
+        self.models = FakeModels(self)
+        self.files = FakeFiles(self)
+        self.caches = FakeCaches()
+
+    def add_bytes(self, size: int):
+        with self._lock:
+            self.bytes_sent += size
+
+    def sleep(self, latency: Latency):
+        with self._lock:
+            seconds = latency.sample(self._rng)
+        time.sleep(seconds)
+
+    def begin(self, contents, config):
+        """Count one call and its payload; raise an injected 429 when it is drawn"""
+        # Only what is sent counts; a cached context's contents are already on the server
+        size = payload_bytes(contents)
+        if getattr(config, "cached_content", None):
+            contents = self.caches.expand(contents, config)
+        with self._lock:
+            self.calls += 1
+            self.bytes_sent += size
+            failed = self._rng.random() < self.error_rate
+            if failed:
+                self.errors += 1
+        time.sleep(self.seconds_per_mb * size / (1024 * 1024))
+        if failed:
+            raise errors.ClientError(429, {"error": {
+                "code": 429, "message": "Resource has been exhausted (e.g. check quota).", "status": "RESOURCE_EXHAUSTED"
+            }})
+        return _texts(contents), size // 4
+
+    def respond(self, texts: List[str], config=None) -> str:
+        entry = self.recordings.find(texts)
+        if entry is not None and "text" in entry:
+            return entry["text"]
+        words = " ".join(["lorem"] * self.words)
+        schema = getattr(config, "response_schema", None)
+        if schema is not None:
+            return json.dumps(_fake_from_schema(schema, words))
+        return words
+
+    def image(self) -> bytes:
+        # Encoding a large random PNG is slow, so each size is encoded once
+        with self._lock:
+            if self.image_px not in self._images:
+                self._images[self.image_px] = fake_image(self._rng, self.image_px, self.image_px)
+            return self._images[self.image_px]
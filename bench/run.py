@@ -0,0 +1,280 @@
+"""Offline benchmark of HikmaMind's hot paths against a fake Gemini client.
+
+    python -m bench.run --scenarios pdf,pdf_stream,video,image --requests 40 --concurrency 8 \
+        --latency lognormal:0.8:0.4 --error-rate 0.05 --json results.json
+
+Each scenario runs its requests through the real service code on a fresh,
+empty cache directory and reports throughput, p50/p95/p99 latency (and
+time to first chunk for streams), peak RSS, model calls and bytes sent per
+request. With --baseline, a previous --json output is compared and the
+exit status is 1 when a scenario regressed by more than --tolerance.
+"""
+import argparse
+import json
+import os
+import resource
+import sys
+import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from functools import partial
+
+from bench.corpus import make_corpus, parse_size, write_transcripts
+
+SCENARIOS = ["pdf", "pdf_all", "pdf_stream", "pdf_chunked", "video", "video_stream", "image"]
+
+# Regressions checked against a baseline: (metric, True when higher is worse)
+GATED_METRICS = [("p95_ms", True), ("throughput_rps", False), ("peak_rss_mb", True), ("bytes_per_request", True)]
+
+
+def percentile(values, q: float) -> float:
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, max(0, int(round(q * (len(ordered) - 1)))))]
+
+
+def current_rss() -> int:
+    """Resident set size in bytes (peak RSS where /proc is unavailable)"""
+    try:
+        with open("/proc/self/statm") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+    except (OSError, ValueError):
+        return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024
+
+
+class RSSSampler:
+    """Track the peak RSS of the process while a scenario runs"""
+
+    def __init__(self, interval: float = 0.01):
+        self.interval = interval
+        self.peak = current_rss()
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, daemon=True)
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            self.peak = max(self.peak, current_rss())
+
+    def __enter__(self):
+        self._thread.start()
+        return self
+
+    def __exit__(self, *exc):
+        self._stop.set()
+        self._thread.join()
+        self.peak = max(self.peak, current_rss())
+
+
+def _no_first_chunk(fn, *args):
+    fn(*args)
+
+
+def _first_chunk(make_stream, *args) -> float:
+    start = time.perf_counter()
+    first = None
+    for _ in make_stream(*args):
+        if first is None:
+            first = time.perf_counter() - start
+    return first
+
+
+def make_requests(scenario: str, args, workdir: str) -> list:
+    """Return one zero-argument callable per request; each returns time to first chunk or None"""
+    from models.user_profile import UserProfile
+    from services.image_service import generate_images
+    from services.pdf_analysis import ALL_ANALYSES, analyze_pdf, generate_prompt_for_pdf, pdf_model_for, stream_pdf_analysis
+    from services.video_analysis import (
+        analyze_video, generate_prompt_for_youtube, load_transcript, stream_video_analysis, video_model_for
+    )
+    from utils.youtube_url import parse_youtube_url
+
+    client = args.client
+    profile = UserProfile()
+    sizes = [parse_size(size) for size in args.pdf_sizes.split(",")]
+
+    # Documents and videos are distinct per scenario, so nothing is served from another scenario's cache entries
+    offset = SCENARIOS.index(scenario) * 100000
+    if scenario.startswith("pdf"):
+        corpus = make_corpus(sizes, args.requests, seed=offset)
+        if scenario == "pdf_stream":
+            prompt = generate_prompt_for_pdf(args.pdf_type, profile)
+            model = pdf_model_for(args.pdf_type)
+            return [partial(_first_chunk, stream_pdf_analysis, client, pdf, prompt, model) for pdf in corpus]
+        analysis_type = ALL_ANALYSES if scenario == "pdf_all" else args.pdf_type
+        chunked = scenario == "pdf_chunked"
+        return [partial(_no_first_chunk, analyze_pdf, client, pdf, analysis_type, profile, chunked) for pdf in corpus]
+
+    if scenario.startswith("video"):
+        ids = write_transcripts(os.path.join(workdir, "transcripts"), args.requests, args.transcript_minutes, offset)
+        videos = [parse_youtube_url(f"https://youtu.be/{video_id}") for video_id in ids]
+        if scenario == "video_stream":
+            prompt = generate_prompt_for_youtube(args.video_type, profile)
+            model = video_model_for(args.video_type)
+            return [partial(_first_chunk, lambda video: stream_video_analysis(
+                client, video, prompt, model, load_transcript(video)), video) for video in videos]
+        return [partial(_no_first_chunk, analyze_video, client, video, args.video_type, profile) for video in videos]
+
+    if scenario == "image":
+        return [partial(_no_first_chunk, generate_images, client, f"Benchmark illustration {offset + index}",
+                        args.image_variants) for index in range(args.requests)]
+    raise ValueError(f"Unknown scenario: {scenario}")
+
+
+def run_scenario(scenario: str, args, workdir: str) -> dict:
+    from utils.scheduler import get_scheduler
+
+    requests = make_requests(scenario, args, workdir)
+    client = args.client
+    calls, bytes_sent, injected = client.calls, client.bytes_sent, client.errors
+    retries = get_scheduler().retries
+    latencies, first_chunks, failures = [], [], []
+
+    def timed_request(request):
+        start = time.perf_counter()
+        try:
+            first = request()
+        except Exception as e:
+            failures.append(repr(e))
+            return
+        latencies.append(time.perf_counter() - start)
+        if first is not None:
+            first_chunks.append(first)
+
+    with RSSSampler() as rss:
+        start = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=max(1, args.concurrency)) as pool:
+            list(pool.map(timed_request, requests))
+        elapsed = time.perf_counter() - start
+
+    count = len(requests)
+    result = {
+        "scenario": scenario,
+        "requests": count,
+        "errors": len(failures),
+        "seconds": round(elapsed, 3),
+        "throughput_rps": round(len(latencies) / elapsed, 3) if elapsed else 0.0,
+        "p50_ms": round(percentile(latencies, 0.50) * 1000, 1),
+        "p95_ms": round(percentile(latencies, 0.95) * 1000, 1),
+        "p99_ms": round(percentile(latencies, 0.99) * 1000, 1),
+        "peak_rss_mb": round(rss.peak / (1024 * 1024), 1),
+        "calls_per_request": round((client.calls - calls) / max(1, count), 2),
+        "bytes_per_request": int((client.bytes_sent - bytes_sent) / max(1, count)),
+        "injected_429": client.errors - injected,
+        "retries": get_scheduler().retries - retries,
+    }
+    if first_chunks:
+        result["first_chunk_p50_ms"] = round(percentile(first_chunks, 0.50) * 1000, 1)
+        result["first_chunk_p95_ms"] = round(percentile(first_chunks, 0.95) * 1000, 1)
+    if failures:
+        result["first_error"] = failures[0]
+    return result
+
+
+def compare(results: list, baseline: list, tolerance: float) -> list:
+    """Return a message for each metric that regressed by more than tolerance"""
+    previous = {row["scenario"]: row for row in baseline}
+    regressions = []
+    for row in results:
+        base = previous.get(row["scenario"])
+        if base is None:
+            continue
+        for metric, higher_is_worse in GATED_METRICS:
+            old, new = base.get(metric), row.get(metric)
+            if not old or new is None:
+                continue
+            change = (new - old) / old
+            if (change > tolerance) if higher_is_worse else (change < -tolerance):
+                regressions.append(f"{row['scenario']}: {metric} {old} -> {new} ({change:+.0%})")
+    return regressions
+
+
+def print_table(results: list):
+    columns = ["scenario", "requests", "errors", "throughput_rps", "p50_ms", "p95_ms", "p99_ms",
+               "first_chunk_p50_ms", "peak_rss_mb", "calls_per_request", "bytes_per_request", "retries"]
+    rows = [[str(row.get(column, "")) for column in columns] for row in results]
+    widths = [max(len(column), *(len(r[i]) for r in rows)) for i, column in enumerate(columns)]
+    print("  ".join(column.ljust(width) for column, width in zip(columns, widths)))
+    for r in rows:
+        print("  ".join(value.ljust(width) for value, width in zip(r, widths)))
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(prog="bench.run", description="Benchmark HikmaMind offline with a fake Gemini client.")
+    parser.add_argument("--scenarios", default="pdf,pdf_stream,video,image",
+                        help=f"Comma-separated scenarios among {', '.join(SCENARIOS)}")
+    parser.add_argument("--requests", type=int, default=20, help="Requests per scenario")
+    parser.add_argument("--concurrency", type=int, default=4, help="Requests in flight at once")
+    parser.add_argument("--latency", default="lognormal:0.5:0.4", help="Model call latency, e.g. fixed:0.2 or lognormal:0.8:0.4")
+    parser.add_argument("--first-chunk", default=None, help="Latency to the first streamed chunk (default: --latency)")
+    parser.add_argument("--chunk-interval", default="fixed:0.02", help="Latency between streamed chunks")
+    parser.add_argument("--seconds-per-mb", type=float, default=0.0, help="Extra latency per MB sent")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="Probability that a call fails with a 429")
+    parser.add_argument("--words", type=int, default=200, help="Words in synthesized responses")
+    parser.add_argument("--recordings", default=None, help="JSONL of recorded responses to replay")
+    parser.add_argument("--pdf-sizes", default="100k,1m,8m", help="Sizes of the synthetic PDFs, cycled")
+    parser.add_argument("--pdf-type", default="General summary")
+    parser.add_argument("--video-type", default="Simple summary (3 sentences)")
+    parser.add_argument("--transcript-minutes", type=int, default=20)
+    parser.add_argument("--image-variants", type=int, default=1)
+    parser.add_argument("--image-px", type=int, default=1024, help="Side of the fake generated images")
+    parser.add_argument("--rpm", type=float, default=0, help="Client-side rate limit (0 = unlimited)")
+    parser.add_argument("--retry-delay", type=float, default=0.05, help="Base delay of the retry backoff")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--json", default=None, help="Write the results to this file")
+    parser.add_argument("--baseline", default=None, help="Results file of a previous run to compare with")
+    parser.add_argument("--tolerance", type=float, default=0.2, help="Allowed relative regression")
+    args = parser.parse_args(argv)
+
+    scenarios = [s.strip() for s in args.scenarios.split(",") if s.strip()]
+    unknown = [s for s in scenarios if s not in SCENARIOS]
+    if unknown:
+        parser.error(f"Unknown scenarios: {', '.join(unknown)}")
+
+    workdir = tempfile.mkdtemp(prefix="hikmamind-bench-")
+    # Settings are read when the modules are imported, so they are set first
+    os.environ["HIKMAMIND_CACHE_DIR"] = workdir
+    os.environ["HIKMAMIND_TRANSCRIPT_FIXTURES"] = os.path.join(workdir, "transcripts")
+    os.environ["HIKMAMIND_RATE_LIMIT_RPM"] = str(args.rpm)
+    os.environ["HIKMAMIND_RETRY_BASE_DELAY"] = str(args.retry_delay)
+    os.environ["HIKMAMIND_EMBEDDER"] = "hashing"
+    # One benchmark user sends far more than a real one; budgets would reject or downgrade later scenarios
+    os.environ["HIKMAMIND_TOKEN_BUDGET_PER_USER"] = "0"
+    os.environ["HIKMAMIND_TOKEN_BUDGET_PER_PROCESS"] = "0"
+    from bench.fake_client import FakeClient, Latency, Recordings
+
+    latency = Latency.parse(args.latency)
+    args.client = FakeClient(
+        latency=latency,
+        first_chunk=Latency.parse(args.first_chunk) if args.first_chunk else latency,
+        chunk_interval=Latency.parse(args.chunk_interval),
+        error_rate=args.error_rate,
+        seconds_per_mb=args.seconds_per_mb,
+        words=args.words,
+        recordings=Recordings.load(args.recordings) if args.recordings else None,
+        image_px=args.image_px,
+        seed=args.seed,
+    )
+
+    results = []
+    for scenario in scenarios:
+        results.append(run_scenario(scenario, args, workdir))
+        print(f"{scenario}: done in {results[-1]['seconds']} s", file=sys.stderr)
+    print_table(results)
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as f:
+            json.dump(results, f, indent=2)
+
+    if args.baseline:
+        with open(args.baseline, encoding="utf-8") as f:
+            regressions = compare(results, json.load(f), args.tolerance)
+        for message in regressions:
+            print(f"REGRESSION {message}", file=sys.stderr)
+        if regressions:
+            return 1
+    return 1 if any(row["errors"] for row in results) else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,153 @@
+#!/usr/bin/env python
+"""HikmaMind command line: analyze PDFs and YouTube videos in bulk, without Streamlit.
+
+Reads one input per line from a file or stdin: a PDF URL, a local PDF path
+or a YouTube URL. A line can also be a JSON object such as
+{"source": "...", "type": "Key points"} to override the analysis type, with
+"start"/"end" timestamps to analyze only a clip of a video.
+Results are written as JSON Lines, one per input, as soon as each finishes;
+a line that cannot be parsed gets a failed record and the run goes on.
+
+    python hikmamind.py listings.txt -o results.jsonl --workers 8
+    cat urls.txt | python hikmamind.py --pdf-type "General summary"
+"""
+import argparse
+import json
+import os
+import sys
+import threading
+import time
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+
+from models.user_profile import UserProfile
+from services.pdf_analysis import ALL_ANALYSES, PDF_ANALYSIS_TYPES, analyze_pdf
+from services.video_analysis import VIDEO_ANALYSIS_TYPES, analyze_video
+from utils.config import ANALOGY_STYLES, BATCH_MAX_WORKERS, KNOWLEDGE_LEVELS, get_client
+from utils.youtube_url import InvalidYouTubeURL, parse_timestamp, parse_youtube_url
+
+
+def parse_line(line: str, pdf_type: str, video_type: str):
+    """Return (source, kind, analysis type) for an input line, or None for blank lines and comments.
+
+    Raises ValueError for malformed lines.
+    """
+    line = line.strip()
+    if not line or line.startswith("#"):
+        return None
+    data = json.loads(line) if line.startswith("{") else {"source": line}
+    if not isinstance(data, dict) or not isinstance(data.get("source"), str) or not data["source"].strip():
+        raise ValueError('JSON input lines need a non-empty "source" string')
+    line, analysis_type = data["source"].strip(), data.get("type")
+    try:
+        video = parse_youtube_url(line)
+    except InvalidYouTubeURL:
+        return line, "pdf", analysis_type or pdf_type
+    video = video.with_range(parse_timestamp(str(data.get("start", ""))), parse_timestamp(str(data.get("end", ""))))
+    return video, "video", analysis_type or video_type
+
+
+def load_source(source: str):
+    """URLs are downloaded by the service; local paths are read here"""
+    if source.startswith(("http://", "https://")):
+        return source
+    with open(os.path.expanduser(source), "rb") as f:
+        return f.read()
+
+
+def run_one(client, item, user_profile: UserProfile, use_transcript: bool, chunked: bool) -> dict:
+    source, kind, analysis_type = item
+    record = {
+        "source": source.url if kind == "video" else source,
+        "kind": kind,
+        "type": analysis_type,
+    }
+    if kind == "video" and source.is_clip:
+        record.update(start=source.start, end=source.end)
+    start = time.perf_counter()
+    try:
+        if kind == "video":
+            record["result"] = analyze_video(client, source, analysis_type, user_profile, use_transcript)
+        else:
+            record["result"] = analyze_pdf(client, load_source(source), analysis_type, user_profile, chunked)
+        record["status"] = "done"
+    except Exception as e:
+        record["status"] = "failed"
+        record["error"] = str(e)
+    record["seconds"] = round(time.perf_counter() - start, 3)
+    return record
+
+
+def run(client, lines, output, user_profile: UserProfile, workers: int, pdf_type: str, video_type: str,
+        use_transcript: bool = True, chunked: bool = False) -> int:
+    """Analyze inputs concurrently, writing each result line as soon as it is ready.
+
+    Inputs are read lazily and at most 2 * workers are in flight, so
+    arbitrarily long input streams run in constant memory. Returns the
+    number of failed inputs.
+    """
+    failed = 0
+    lock = threading.Lock()
+
+    def write(record):
+        nonlocal failed
+        with lock:
+            failed += record["status"] != "done"
+            output.write(json.dumps(record, ensure_ascii=False) + "\n")
+            output.flush()
+
+    with ThreadPoolExecutor(max_workers=max(1, workers)) as pool:
+        pending = set()
+        for line in lines:
+            try:
+                item = parse_line(line, pdf_type, video_type)
+            except ValueError as e:
+                write({"source": line.strip(), "kind": None, "type": None, "status": "failed",
+                       "error": f"Invalid input line: {e}", "seconds": 0.0})
+                continue
+            if item is None:
+                continue
+            if len(pending) >= 2 * workers:
+                done, pending = wait(pending, return_when=FIRST_COMPLETED)
+                for future in done:
+                    write(future.result())
+            pending.add(pool.submit(run_one, client, item, user_profile, use_transcript, chunked))
+        for future in wait(pending).done:
+            write(future.result())
+    return failed
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(prog="hikmamind", description="Analyze PDFs and YouTube videos in bulk.")
+    parser.add_argument("input", nargs="?", default="-", help="File with one input per line (default: stdin)")
+    parser.add_argument("-o", "--output", default="-", help="JSONL output file (default: stdout)")
+    parser.add_argument("--workers", type=int, default=BATCH_MAX_WORKERS, help="Inputs analyzed concurrently")
+    parser.add_argument("--pdf-type", default=ALL_ANALYSES, choices=PDF_ANALYSIS_TYPES)
+    parser.add_argument("--video-type", default=VIDEO_ANALYSIS_TYPES[0], choices=VIDEO_ANALYSIS_TYPES)
+    parser.add_argument("--field", default=UserProfile.field)
+    parser.add_argument("--level", default=UserProfile.knowledge_level, choices=KNOWLEDGE_LEVELS)
+    parser.add_argument("--style", default=UserProfile.analogy_style, choices=list(ANALOGY_STYLES))
+    parser.add_argument("--citations", action="store_true", help="Ask for citations in the analyses")
+    parser.add_argument("--no-transcript", action="store_true", help="Always analyze the full video")
+    parser.add_argument("--chunked", action="store_true", help="Use large document mode for PDFs")
+    args = parser.parse_args(argv)
+
+    client = get_client()
+    if client is None:
+        parser.error("API key not found. Please configure the GOOGLE_GENAI_API_KEY environment variable.")
+    user_profile = UserProfile(args.field, args.level, args.style, args.citations)
+
+    lines = sys.stdin if args.input == "-" else open(args.input, encoding="utf-8")
+    output = sys.stdout if args.output == "-" else open(args.output, "a", encoding="utf-8")
+    try:
+        failed = run(client, lines, output, user_profile, args.workers, args.pdf_type, args.video_type,
+                     not args.no_transcript, args.chunked)
+    finally:
+        if lines is not sys.stdin:
+            lines.close()
+        if output is not sys.stdout:
+            output.close()
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
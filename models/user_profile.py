@@ -1,4 +1,3 @@
-import streamlit as st
 from dataclasses import dataclass
 from typing import Optional
 
@@ -40,18 +39,25 @@ class UserProfile:
              modifiers.append("Use analogies related to sports, games, training, and athletic performance.")
         elif self.analogy_style == "Pop Culture":
             modifiers.append("Use analogies related to movies, series, and popular culture references.")
+        
+        return " ".join(modifiers)
+
+# Streamlit is imported inside the session helpers so UserProfile can be used headless (CLI, jobs)
 
 def initialize_session_state():
     """Initialize session state variables if necessary"""
+    import streamlit as st
     if 'user_profile' not in st.session_state:
         st.session_state.user_profile = UserProfile()
 
 def save_profile(profile: UserProfile):
     """Save user profile in session state"""
+    import streamlit as st
     st.session_state.user_profile = profile
 
 def get_current_profile() -> UserProfile:
     """Get current user profile"""
+    import streamlit as st
     initialize_session_state()
     return st.session_state.user_profile
 
@@ -0,0 +1,232 @@
+import io
+import json
+import random
+import time
+import zipfile
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from contextlib import nullcontext
+from dataclasses import dataclass
+from typing import Callable, ContextManager, List, Optional
+
+import streamlit as st
+from models.user_profile import UserProfile
+from services.pdf_analysis import PDF_ANALYSIS_TYPES, analyze_pdf, download_pdf
+from services.preflight import InputTooLarge
+from services.upload_store import get_upload_store
+from utils.budget import BudgetExceeded
+from utils.config import BATCH_MAX_RETRIES, BATCH_MAX_WORKERS
+from utils.jobs import current_job, get_job_manager, in_job, report_progress
+from utils.ui_components import fragment, get_session_id, get_user_id, render_job_progress
+
+
+@dataclass
+class BatchItem:
+    """One document of a batch: a display name and a callable opening its bytes (as a context manager)"""
+    name: str
+    source: str
+    open: Callable[[], ContextManager[bytes]]
+
+
+@dataclass
+class BatchResult:
+    """Outcome of analyzing one batch item"""
+    name: str
+    source: str
+    status: str = "pending"
+    text: Optional[str] = None
+    error: Optional[str] = None
+    attempts: int = 0
+    seconds: float = 0.0
+
+    def to_dict(self) -> dict:
+        return {
+            "name": self.name,
+            "source": self.source,
+            "status": self.status,
+            "text": self.text,
+            "error": self.error,
+            "attempts": self.attempts,
+            "seconds": round(self.seconds, 3),
+        }
+
+
+def _process_item(client, item: BatchItem, analysis_type: str, user_profile: UserProfile,
+                  max_retries: int, user: str = None) -> BatchResult:
+    result = BatchResult(name=item.name, source=item.source)
+    start = time.monotonic()
+    for attempt in range(max_retries + 1):
+        result.attempts = attempt + 1
+        try:
+            with item.open() as pdf_data:
+                result.text = analyze_pdf(client, pdf_data, analysis_type, user_profile, user=user)
+            result.status = "done"
+            result.error = None
+            break
+        except (BudgetExceeded, InputTooLarge) as e:
+            # Retrying cannot help before the budget window moves on
+            result.status = "failed"
+            result.error = str(e)
+            break
+        except Exception as e:
+            result.status = "failed"
+            result.error = str(e)
+            if attempt < max_retries:
+                # Exponential backoff with jitter before the next attempt
+                time.sleep(min(30.0, 2 ** attempt) * (0.5 + random.random()))
+    result.seconds = time.monotonic() - start
+    return result
+
+
+def run_batch(client, items: List[BatchItem], analysis_type: str, user_profile: UserProfile,
+              max_workers: int = BATCH_MAX_WORKERS, max_retries: int = BATCH_MAX_RETRIES,
+              on_result: Callable[[int, BatchResult], None] = None, user: str = None) -> List[BatchResult]:
+    """Analyze items on a bounded thread pool, retrying failed items.
+
+    on_result(index, result) is called from the calling thread as each item
+    finishes, which keeps it safe to update Streamlit elements from there.
+    Results are returned in input order. Tokens are charged to `user`'s budget,
+    by default the session of the calling job.
+    """
+    results = [None] * len(items)
+    # Items run as part of the calling job, if any, so their usage and budget are attributed to it
+    process_item = in_job(current_job(), _process_item)
+    with ThreadPoolExecutor(max_workers=max(1, max_workers)) as pool:
+        futures = {
+            pool.submit(process_item, client, item, analysis_type, user_profile, max_retries, user): index
+            for index, item in enumerate(items)
+        }
+        for future in as_completed(futures):
+            index = futures[future]
+            results[index] = future.result()
+            if on_result is not None:
+                on_result(index, results[index])
+    return results
+
+
+def run_batch_job(client, items: List[BatchItem], analysis_type: str, user_profile: UserProfile,
+                  max_workers: int = BATCH_MAX_WORKERS, max_retries: int = BATCH_MAX_RETRIES):
+    """Body of a background batch job; returns (results, zip export, jsonl export).
+
+    Each finished item is reported as job progress and listed in the job's
+    streamed output, so the page can poll the batch like any other job.
+    """
+    job = current_job()
+    finished = []
+
+    def on_result(index, result):
+        finished.append(index)
+        report_progress(len(finished) / len(items), f"{len(finished)} / {len(items)} documents analyzed")
+        if job is not None:
+            job.append(f"- {'✅' if result.status == 'done' else '❌'} {result.name}"
+                       f"{'' if result.status == 'done' else f': {result.error}'}\n")
+
+    report_progress(0.0, f"0 / {len(items)} documents analyzed")
+    results = run_batch(client, items, analysis_type, user_profile, max_workers, max_retries, on_result)
+    # The exports are built once here, so reruns only redraw them
+    return results, export_zip(results), export_jsonl(results)
+
+
+def export_jsonl(results: List[BatchResult]) -> str:
+    """Serialize batch results as JSON Lines"""
+    return "".join(json.dumps(result.to_dict(), ensure_ascii=False) + "\n" for result in results)
+
+
+def export_zip(results: List[BatchResult]) -> bytes:
+    """Bundle one TXT file per successful result plus a results.jsonl summary"""
+    buffer = io.BytesIO()
+    used_names = set()
+    with zipfile.ZipFile(buffer, "w", zipfile.ZIP_DEFLATED) as archive:
+        for result in results:
+            if result.status != "done":
+                continue
+            base = result.name.rsplit(".", 1)[0] or "document"
+            name = f"hikmamind_analysis_{base}.txt"
+            suffix = 1
+            while name in used_names:
+                suffix += 1
+                name = f"hikmamind_analysis_{base}_{suffix}.txt"
+            used_names.add(name)
+            archive.writestr(name, result.text)
+        archive.writestr("results.jsonl", export_jsonl(results))
+    return buffer.getvalue()
+
+
+def url_item(url: str) -> BatchItem:
+    name = url.rstrip("/").rsplit("/", 1)[-1] or url
+    return BatchItem(name=name, source=url, open=lambda: nullcontext(download_pdf(url)))
+
+
+def upload_item(uploaded_file) -> BatchItem:
+    upload = get_upload_store().put(uploaded_file)
+    # The upload is held in memory, within the store's budget, only while its item is analyzed
+    return BatchItem(name=upload.name, source=upload.name, open=lambda: get_upload_store().open(upload))
+
+
+@fragment
+def batch_analyzer(client, user_profile: UserProfile):
+    st.header("Batch PDF analysis")
+
+    uploaded_files = st.file_uploader("Upload PDF documents", type="pdf", accept_multiple_files=True)
+    url_list = st.text_area(
+        "Or enter PDF URLs (one per line):",
+        placeholder="https://arxiv.org/pdf/1706.03762"
+    )
+
+    batch_analysis_type = st.selectbox(
+        "Type of analysis:",
+        PDF_ANALYSIS_TYPES,
+        key="pdf_batch_analogy"
+    )
+
+    col1, col2 = st.columns(2)
+    with col1:
+        max_workers = st.number_input("Concurrent analyses", min_value=1, max_value=16, value=BATCH_MAX_WORKERS)
+    with col2:
+        max_retries = st.number_input("Retries per document", min_value=0, max_value=5, value=BATCH_MAX_RETRIES)
+
+    items = [upload_item(f) for f in uploaded_files or []]
+    items += [url_item(url.strip()) for url in url_list.splitlines() if url.strip()]
+
+    if st.button("Analyze all", key="analyze_pdf_batch", disabled=not items):
+        # Run in the background so widget interactions don't cancel or block the batch
+        job = get_job_manager().submit(
+            get_session_id(), f"Batch of {len(items)} documents", run_batch_job,
+            client, items, batch_analysis_type, user_profile, int(max_workers), int(max_retries),
+            user=get_user_id()
+        )
+        st.session_state["batch_job"] = job.id
+
+    job = get_job_manager().get(st.session_state.get("batch_job"))
+    if job is None:
+        return
+    if not job.done:
+        render_job_progress(job.id)
+        return
+    if job.status == "failed":
+        st.error(f"Error during batch analysis: {job.error}")
+        return
+    results, zip_data, jsonl_data = job.result
+
+    succeeded = sum(1 for result in results if result.status == "done")
+    st.success(f"✅ {succeeded} of {len(results)} documents analyzed")
+
+    for result in results:
+        if result.status == "done":
+            with st.expander(result.name):
+                st.markdown(result.text)
+
+    col1, col2 = st.columns(2)
+    with col1:
+        st.download_button(
+            label="🗜️ Download all as ZIP",
+            data=zip_data,
+            file_name="hikmamind_batch.zip",
+            mime="application/zip"
+        )
+    with col2:
+        st.download_button(
+            label="📄 Download results as JSONL",
+            data=jsonl_data,
+            file_name="hikmamind_batch.jsonl",
+            mime="application/jsonl"
+        )
@@ -0,0 +1,201 @@
+import json
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from typing import List, Tuple
+
+import streamlit as st
+from models.user_profile import UserProfile
+from services.batch_service import BatchItem, upload_item, url_item
+from services.document_registry import get_document_registry
+from services.preflight import plan_model, size_pdf, size_text, token_budget
+from utils.cache import get_result_cache, hash_bytes, make_cache_key, response_text
+from utils.config import COMPARE_MAX_PAPERS, COMPARE_MAX_WORKERS, get_model
+from utils.history import record_analysis
+from utils.jobs import current_job, get_job_manager, in_job, report_progress
+from utils.lazy import lazy_import
+from utils.metrics import timed
+from utils.prompts import profile_context
+from utils.scheduler import get_scheduler
+from utils.ui_components import fragment, get_session_id, get_user_id, render_job_progress
+
+genai = lazy_import("google.genai")
+
+DIGEST_LISTS = ["contributions", "methods", "results", "limitations"]
+
+# Independent of the user profile, so one digest per paper serves every comparison
+DIGEST_PROMPT = (
+    "Read this research paper and return a compact JSON digest of it: its title, "
+    "and short factual bullet points for its main contributions, its methods "
+    "(including data and setup), its key results (keep the numbers) and its "
+    "limitations. Use at most five bullets per list."
+)
+
+COMPARISON_PROMPT = (
+    "Below are structured digests of {count} research papers. Compare them: "
+    "what they have in common, how their methods differ, how their results compare "
+    "(include a Markdown table), how their limitations complement each other, and "
+    "which paper to read for what. Refer to papers by their number and title."
+)
+
+
+def _digest_schema() -> dict:
+    properties = {"title": {"type": "STRING"}}
+    properties.update({name: {"type": "ARRAY", "items": {"type": "STRING"}} for name in DIGEST_LISTS})
+    return {"type": "OBJECT", "properties": properties, "required": ["title"] + DIGEST_LISTS}
+
+
+def get_digest(client, pdf_data: bytes, model: str = None) -> dict:
+    """Return the structured digest of a paper, generating it at most once per document"""
+    model = model or get_model("paper_digest")
+    cache = get_result_cache()
+    doc_hash = hash_bytes(pdf_data)
+    key = make_cache_key(doc_hash, DIGEST_PROMPT, model)
+    cached = cache.get(key)
+    if cached is not None:
+        return json.loads(cached)
+
+    size = size_pdf(pdf_data)
+    # Cached under the requested model even when budget pressure downgrades the run
+    run_model = plan_model(model, size)
+    registry = get_document_registry()
+
+    def generate():
+        return client.models.generate_content(
+            model=run_model,
+            contents=[registry.get_part(client, pdf_data, doc_hash), DIGEST_PROMPT],
+            config=genai.types.GenerateContentConfig(
+                response_mime_type="application/json",
+                response_schema=_digest_schema()
+            )
+        )
+
+    with token_budget(size), timed("model.digest", run_model) as timer:
+        response = get_scheduler().run(lambda: registry.retry_if_missing(doc_hash, generate), key=key, timer=timer)
+    digest = json.loads(response_text(response))
+    cache.set(key, json.dumps(digest, ensure_ascii=False))
+    return digest
+
+
+def format_digest(number: int, name: str, digest: dict) -> str:
+    """Render a digest as compact Markdown"""
+    lines = [f"### Paper {number}: {digest.get('title') or name}"]
+    for section in DIGEST_LISTS:
+        lines.append(f"**{section.capitalize()}**")
+        lines.extend(f"- {point}" for point in digest.get(section) or [])
+    return "\n".join(lines)
+
+
+def _digest_item(client, item: BatchItem) -> dict:
+    with item.open() as pdf_data:
+        return get_digest(client, pdf_data)
+
+
+def build_digests(client, items: List[BatchItem], max_workers: int = COMPARE_MAX_WORKERS) -> List[Tuple[str, dict]]:
+    """Load and digest papers in parallel; returns (name, digest) pairs in input order"""
+    digests = [None] * len(items)
+    with ThreadPoolExecutor(max_workers=max(1, max_workers)) as pool:
+        digest = in_job(current_job(), _digest_item)
+        futures = {pool.submit(digest, client, item): index for index, item in enumerate(items)}
+        for completed, future in enumerate(as_completed(futures), start=1):
+            index = futures[future]
+            digests[index] = (items[index].name, future.result())
+            report_progress(0.1 + 0.6 * completed / len(items), f"Digested {completed} of {len(items)} papers...")
+    return digests
+
+
+def compare_digests(client, digests: List[Tuple[str, dict]], user_profile: UserProfile,
+                    model: str = None) -> Tuple[str, str]:
+    """Run the single synthesis call over the digests only; returns (text, model that ran)"""
+    model = model or get_model("comparison")
+    document = "\n\n".join(format_digest(number, name, digest)
+                           for number, (name, digest) in enumerate(digests, start=1))
+    prompt = f"{profile_context(user_profile)}\n{COMPARISON_PROMPT.format(count=len(digests))}"
+    cache = get_result_cache()
+    key = make_cache_key(hash_bytes(document.encode("utf-8")), prompt, model)
+    cached = cache.get(key)
+    if cached is not None:
+        return cached, model
+
+    size = size_text(f"{document}\n{prompt}")
+    # Cached under the requested model even when budget pressure downgrades the run
+    run_model = plan_model(model, size)
+    with token_budget(size), timed("model.comparison", run_model) as timer:
+        response = get_scheduler().run(lambda: client.models.generate_content(
+            model=run_model,
+            contents=[document, prompt]
+        ), key=key, timer=timer)
+        timer.bytes = len(document)
+    text = response_text(response)
+    cache.set(key, text)
+    return text, run_model
+
+
+def run_comparison_job(client, items: List[BatchItem], user_profile: UserProfile) -> dict:
+    """Body of a background comparison job"""
+    start = time.perf_counter()
+    report_progress(0.05, "Digesting papers...")
+    digests = build_digests(client, items)
+    report_progress(0.75, "Comparing papers...")
+    comparison, model = compare_digests(client, digests, user_profile)
+    record_analysis(
+        "comparison", ", ".join(item.source for item in items),
+        hash_bytes(json.dumps(digests, sort_keys=True).encode("utf-8")), "Comparison", comparison,
+        user_profile, model, time.perf_counter() - start
+    )
+    return {"digests": digests, "comparison": comparison}
+
+
+@fragment
+def comparison_analyzer(client, user_profile: UserProfile):
+    st.header("Compare papers")
+    st.caption("Each paper is condensed once into a short digest; the comparison only reads the digests.")
+
+    uploaded_files = st.file_uploader("Upload PDF documents", type="pdf", accept_multiple_files=True,
+                                      key="compare_files")
+    url_list = st.text_area(
+        "Or enter PDF URLs (one per line):",
+        placeholder="https://arxiv.org/pdf/1706.03762",
+        key="compare_urls"
+    )
+
+    items = [upload_item(f) for f in uploaded_files or []]
+    items += [url_item(url.strip()) for url in url_list.splitlines() if url.strip()]
+
+    if st.button("Compare papers", key="compare_papers", disabled=len(items) < 2):
+        if len(items) > COMPARE_MAX_PAPERS:
+            st.warning(f"⚠️ Please select at most {COMPARE_MAX_PAPERS} papers.")
+        else:
+            job = get_job_manager().submit(
+                get_session_id(), f"Comparison of {len(items)} papers", run_comparison_job,
+                client, items, user_profile, user=get_user_id()
+            )
+            st.session_state["compare_job"] = job.id
+    elif len(items) < 2:
+        st.info("Select at least two papers to compare.")
+
+    job = get_job_manager().get(st.session_state.get("compare_job"))
+    if job is None:
+        return
+    if not job.done:
+        render_job_progress(job.id)
+        return
+    if job.status == "failed":
+        st.error(f"Error during comparison: {job.error}")
+        return
+
+    st.success("✅ Comparison complete!")
+    with st.container(border=True):
+        st.subheader("🔍 Comparison")
+        st.markdown(job.result["comparison"])
+
+    for number, (name, digest) in enumerate(job.result["digests"], start=1):
+        with st.expander(f"Digest {number}: {digest.get('title') or name}"):
+            st.markdown(format_digest(number, name, digest))
+
+    st.download_button(
+        label="📄 Download comparison as TXT",
+        data=job.result["comparison"],
+        file_name="hikmamind_comparison.txt",
+        mime="text/plain",
+        key="compare_download"
+    )
@@ -0,0 +1,195 @@
+import threading
+import time
+from collections import OrderedDict
+from datetime import datetime, timezone
+from typing import Callable, Optional
+
+from services.document_registry import get_document_registry, is_missing_file_error
+from utils.config import CONTEXT_CACHE_MIN_BYTES, CONTEXT_CACHE_TTL_SECONDS
+from utils.metrics import timed
+from utils.lazy import lazy_import
+from utils.scheduler import get_scheduler, is_retryable
+
+genai = lazy_import("google.genai")
+
+# Stop referencing a cached context this long before the API expires it
+EXPIRY_MARGIN_SECONDS = 60
+# (document, model) pairs tracked at once; the least recently analyzed are forgotten first
+MAX_TRACKED_DOCUMENTS = 1024
+
+
+def is_missing_context_error(error: Exception) -> bool:
+    """True when the API no longer knows a cached context (expired or deleted)"""
+    code = getattr(error, "code", None)
+    return code in (403, 404) and "cached" in str(error).lower()
+
+
+class _Tracked:
+    """What the registry knows about one (document, model) pair"""
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.name: Optional[str] = None
+        self.expires_at = 0.0
+        self.uncacheable = False
+
+
+class ContextCacheRegistry:
+    """Provider-side cached contexts for documents that are analyzed repeatedly.
+
+    The first analysis of a document sends it as usual. From the second
+    one on, the document is stored once as an explicit cached context (per
+    model, since caches are model-specific) and later prompts reference it
+    instead of resending it. Entries are keyed by content hash and model,
+    expire after ttl seconds and are recreated transparently. Documents
+    below min_bytes, or that the API refuses to cache, are always sent.
+    At most max_tracked pairs are remembered, least recently used first
+    out; a forgotten document just counts as new again.
+    """
+
+    def __init__(self, ttl: float = CONTEXT_CACHE_TTL_SECONDS, min_bytes: int = CONTEXT_CACHE_MIN_BYTES,
+                 max_tracked: int = MAX_TRACKED_DOCUMENTS):
+        self.ttl = ttl
+        self.min_bytes = min_bytes
+        self.max_tracked = max_tracked
+        self.created = 0
+        self.reuses = 0
+        self._tracked = OrderedDict()
+        self._lock = threading.Lock()
+
+    def _track(self, key):
+        """Return (state, seen before) for key, marking it as the most recently used"""
+        with self._lock:
+            tracked = self._tracked.get(key)
+            seen = tracked is not None
+            if seen:
+                self._tracked.move_to_end(key)
+            else:
+                tracked = self._tracked[key] = _Tracked()
+                while len(self._tracked) > self.max_tracked:
+                    self._tracked.popitem(last=False)
+            return tracked, seen
+
+    def _expires_at(self, cache) -> float:
+        expires_at = time.time() + self.ttl
+        expire_time = getattr(cache, "expire_time", None)
+        if isinstance(expire_time, datetime):
+            if expire_time.tzinfo is None:
+                expire_time = expire_time.replace(tzinfo=timezone.utc)
+            expires_at = min(expires_at, expire_time.timestamp())
+        return expires_at - EXPIRY_MARGIN_SECONDS
+
+    def get(self, client, model: str, pdf_data: bytes, doc_hash: str) -> Optional[str]:
+        """Return the name of a cached context holding the document, or None to send it directly"""
+        if self.ttl <= 0 or not isinstance(pdf_data, bytes) or len(pdf_data) < self.min_bytes:
+            return None
+        tracked, seen = self._track((doc_hash, model))
+        with tracked.lock:
+            if tracked.name is not None and tracked.expires_at > time.time():
+                self.reuses += 1
+                return tracked.name
+            if not seen or tracked.uncacheable:
+                # Only documents analyzed more than once are worth caching
+                return None
+
+            part = get_document_registry().get_part(client, pdf_data, doc_hash)
+            try:
+                with timed("create_context_cache", model) as timer:
+                    timer.bytes = len(pdf_data)
+                    cache = get_scheduler().run(lambda: client.caches.create(
+                        model=model,
+                        config=genai.types.CreateCachedContentConfig(
+                            contents=[genai.types.Content(role="user", parts=[part])],
+                            ttl=f"{int(self.ttl)}s",
+                            display_name=f"hikmamind-{doc_hash[:16]}"
+                        )
+                    ))
+            except Exception as e:
+                if is_missing_file_error(e):
+                    # The uploaded file is gone: send the document directly, which uploads it again
+                    get_document_registry().forget(doc_hash)
+                    return None
+                if is_retryable(e):
+                    return None
+                # E.g. below the model's minimum cacheable size: stop trying for this document
+                tracked.uncacheable = True
+                return None
+            tracked.name, tracked.expires_at = cache.name, self._expires_at(cache)
+            self.created += 1
+            return cache.name
+
+    def forget(self, doc_hash: str, model: str):
+        """Drop a cached context, e.g. after the API reported it missing"""
+        with self._lock:
+            tracked = self._tracked.get((doc_hash, model))
+        if tracked is not None:
+            with tracked.lock:
+                tracked.name = None
+
+    def request(self, client, model: str, document, prompt: str, doc_hash: str,
+                make_contents: Callable[[], list], config=None) -> dict:
+        """Keyword arguments for generate_content(_stream), referencing a cached context when possible"""
+        cached = self.get(client, model, document, doc_hash)
+        if cached is None:
+            return {"model": model, "contents": make_contents(), "config": config}
+        if config is None:
+            config = genai.types.GenerateContentConfig(cached_content=cached)
+        else:
+            config = config.model_copy(update={"cached_content": cached})
+        return {"model": model, "contents": [prompt], "config": config}
+
+    def _recover(self, error: Exception, request: dict, prompt: str, doc_hash: str, model: str) -> bool:
+        """Forget the cached context or uploaded file the API reported missing; True if worth retrying"""
+        if request["contents"] == [prompt]:
+            if not is_missing_context_error(error):
+                return False
+            self.forget(doc_hash, model)
+        elif is_missing_file_error(error):
+            get_document_registry().forget(doc_hash)
+        else:
+            return False
+        return True
+
+    def generate(self, client, model: str, document, prompt: str, doc_hash: str,
+                 make_contents: Callable[[], list], config=None):
+        """generate_content on the document, recreating the cached context or the upload once if it went missing"""
+        request = self.request(client, model, document, prompt, doc_hash, make_contents, config)
+        try:
+            return client.models.generate_content(**request)
+        except Exception as e:
+            if not self._recover(e, request, prompt, doc_hash, model):
+                raise
+        return client.models.generate_content(
+            **self.request(client, model, document, prompt, doc_hash, make_contents, config)
+        )
+
+    def stream(self, client, model: str, document, prompt: str, doc_hash: str,
+               make_contents: Callable[[], list], config=None):
+        """Streaming counterpart of generate()"""
+        request = self.request(client, model, document, prompt, doc_hash, make_contents, config)
+        try:
+            iterator = iter(client.models.generate_content_stream(**request))
+            first = next(iterator, None)
+        except Exception as e:
+            if not self._recover(e, request, prompt, doc_hash, model):
+                raise
+            request = self.request(client, model, document, prompt, doc_hash, make_contents, config)
+            iterator = iter(client.models.generate_content_stream(**request))
+            first = next(iterator, None)
+        if first is None:
+            return
+        yield first
+        yield from iterator
+
+
+_context_cache_registry = None
+_context_cache_registry_lock = threading.Lock()
+
+
+def get_context_cache_registry() -> ContextCacheRegistry:
+    """Return the process-wide context cache registry"""
+    global _context_cache_registry
+    with _context_cache_registry_lock:
+        if _context_cache_registry is None:
+            _context_cache_registry = ContextCacheRegistry()
+        return _context_cache_registry
@@ -0,0 +1,162 @@
+import io
+import re
+import threading
+import time
+from collections import OrderedDict
+from datetime import datetime, timezone
+from typing import Callable
+
+from utils.cache import hash_bytes
+from utils.config import FILE_REF_TTL_SECONDS, INLINE_PDF_MAX_BYTES
+from utils.lazy import lazy_import
+from utils.metrics import timed
+from utils.scheduler import get_scheduler
+
+genai = lazy_import("google.genai")
+
+# Stop reusing a file reference this long before the API expires it
+EXPIRY_MARGIN_SECONDS = 300
+# Documents tracked at once; the least recently used are forgotten first
+MAX_TRACKED_DOCUMENTS = 1024
+
+
+def is_missing_file_error(error: Exception) -> bool:
+    """True when the API no longer serves an uploaded file (deleted, expired or not ours)"""
+    code = getattr(error, "code", None)
+    return code in (403, 404) and re.search(r"\bfiles?\b", str(error), re.IGNORECASE) is not None
+
+
+class _Tracked:
+    """What the registry knows about one document"""
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.file = None
+        self.expires_at = 0.0
+
+
+class DocumentRegistry:
+    """Upload each distinct PDF once through the Files API and reuse the reference.
+
+    Entries are keyed by the SHA-256 of the document bytes. Documents at or
+    below inline_limit are small enough to send inline, so they are never
+    uploaded. Any object exposing client.files.upload/get works as the
+    client, which keeps the registry usable with a local fake in tests.
+    At most max_tracked documents are remembered, least recently used
+    first out; a forgotten document is just uploaded again.
+    """
+
+    def __init__(self, inline_limit: int = INLINE_PDF_MAX_BYTES, ttl: float = FILE_REF_TTL_SECONDS,
+                 max_tracked: int = MAX_TRACKED_DOCUMENTS):
+        self.inline_limit = inline_limit
+        self.ttl = ttl
+        self.max_tracked = max_tracked
+        self.uploads = 0
+        self.reuses = 0
+        self._tracked = OrderedDict()
+        self._lock = threading.Lock()
+
+    def _track(self, doc_hash: str) -> _Tracked:
+        """Return the state of a document, marking it as the most recently used"""
+        with self._lock:
+            tracked = self._tracked.get(doc_hash)
+            if tracked is not None:
+                self._tracked.move_to_end(doc_hash)
+            else:
+                tracked = self._tracked[doc_hash] = _Tracked()
+                while len(self._tracked) > self.max_tracked:
+                    self._tracked.popitem(last=False)
+            return tracked
+
+    def _expires_at(self, file) -> float:
+        expires_at = time.time() + self.ttl
+        expiration_time = getattr(file, "expiration_time", None)
+        if isinstance(expiration_time, datetime):
+            if expiration_time.tzinfo is None:
+                expiration_time = expiration_time.replace(tzinfo=timezone.utc)
+            expires_at = min(expires_at, expiration_time.timestamp())
+        return expires_at - EXPIRY_MARGIN_SECONDS
+
+    def _wait_until_active(self, client, file, timeout: float = 60.0):
+        deadline = time.time() + timeout
+        while str(getattr(file, "state", "") or "").endswith("PROCESSING"):
+            if time.time() > deadline:
+                raise TimeoutError(f"File {file.name} is still processing")
+            time.sleep(1)
+            file = client.files.get(name=file.name)
+        if str(getattr(file, "state", "") or "").endswith("FAILED"):
+            raise RuntimeError(f"File {file.name} failed to process")
+        return file
+
+    def get_file(self, client, pdf_data: bytes, doc_hash: str = None):
+        """Return an uploaded file reference for the document, uploading it if needed"""
+        doc_hash = doc_hash or hash_bytes(pdf_data)
+        tracked = self._track(doc_hash)
+        with tracked.lock:
+            if tracked.file is not None and tracked.expires_at > time.time():
+                self.reuses += 1
+                return tracked.file
+
+            with timed("upload_file") as timer:
+                timer.bytes = len(pdf_data)
+                file = get_scheduler().run(lambda: client.files.upload(
+                    file=io.BytesIO(pdf_data),
+                    config=genai.types.UploadFileConfig(
+                        mime_type="application/pdf",
+                        display_name=f"hikmamind-{doc_hash[:16]}.pdf"
+                    )
+                ))
+                file = self._wait_until_active(client, file)
+            tracked.file, tracked.expires_at = file, self._expires_at(file)
+            self.uploads += 1
+            return file
+
+    def get_part(self, client, pdf_data: bytes, doc_hash: str = None):
+        """Return a content part for the document, inline when small and by reference otherwise"""
+        if len(pdf_data) <= self.inline_limit:
+            with timed("serialize_pdf") as timer:
+                timer.bytes = len(pdf_data)
+                return genai.types.Part.from_bytes(
+                    data=pdf_data,
+                    mime_type='application/pdf',
+                )
+        file = self.get_file(client, pdf_data, doc_hash)
+        return genai.types.Part.from_uri(
+            file_uri=file.uri,
+            mime_type=file.mime_type or 'application/pdf',
+        )
+
+    def forget(self, doc_hash: str):
+        """Drop a file reference, e.g. after the API reported it missing"""
+        with self._lock:
+            tracked = self._tracked.get(doc_hash)
+        if tracked is not None:
+            with tracked.lock:
+                tracked.file = None
+
+    def retry_if_missing(self, doc_hash: str, call: Callable):
+        """Return call(); if the API reports the document's file missing, forget it and call once more.
+
+        call must fetch its content part from this registry, so the retry
+        uploads the document again.
+        """
+        try:
+            return call()
+        except Exception as e:
+            if not is_missing_file_error(e):
+                raise
+            self.forget(doc_hash)
+        return call()
+
+
+_document_registry = None
+_document_registry_lock = threading.Lock()
+
+
+def get_document_registry() -> DocumentRegistry:
+    """Return the process-wide document registry"""
+    global _document_registry
+    with _document_registry_lock:
+        if _document_registry is None:
+            _document_registry = DocumentRegistry()
+        return _document_registry
@@ -0,0 +1,66 @@
+from datetime import datetime
+
+import streamlit as st
+from models.user_profile import UserProfile
+from utils.config import HISTORY_PAGE_SIZE
+from utils.history import HistoryEntry, get_history_store
+from utils.ui_components import fragment, get_user_id
+
+HISTORY_KINDS = {"All": None, "PDF": "pdf", "Video": "video", "Comparison": "comparison"}
+
+
+def _entry_label(entry: HistoryEntry) -> str:
+    created = datetime.fromtimestamp(entry.created).strftime("%Y-%m-%d %H:%M")
+    return f"{created} · {entry.analysis_type} · {entry.source}"
+
+
+@fragment
+def history_browser(user_profile: UserProfile):
+    st.header("Analysis history")
+
+    col1, col2 = st.columns([3, 1])
+    with col1:
+        query = st.text_input("Search past analyses", key="history_query",
+                              placeholder="Words from the result, the source or the analysis type")
+    with col2:
+        kind = st.radio("Show", list(HISTORY_KINDS), horizontal=True, key="history_kind")
+    same_profile = st.checkbox("Only analyses made for my current profile", value=False, key="history_same_profile")
+
+    # Each user only sees, and can only delete, their own analyses
+    user_id = get_user_id()
+    store = get_history_store()
+    entries = store.search(user_id, query, HISTORY_KINDS[kind], HISTORY_PAGE_SIZE,
+                           user_profile if same_profile else None)
+    if not entries:
+        st.info("No matching analyses." if query else "Your analyses will appear here once they complete.")
+        return
+
+    entry = st.selectbox("Analysis", entries, format_func=_entry_label, key="history_selected")
+
+    # Re-opening reads the stored text; no model call is made
+    with st.container(border=True):
+        st.subheader(entry.analysis_type)
+        st.caption(f"Source: {entry.source}")
+        st.caption(
+            f"Field: {entry.field} | Level: {entry.knowledge_level} | Analogy style: {entry.analogy_style} | "
+            f"Citations: {'yes' if entry.include_citations else 'no'}"
+            + (f" | {entry.options}" if entry.options else "")
+            + f" | Model: {entry.model} | {entry.seconds:.1f} s | {entry.tokens_in + entry.tokens_out:,} tokens"
+        )
+        st.markdown(entry.result)
+
+    col1, col2 = st.columns(2)
+    with col1:
+        st.download_button(
+            label="📄 Download analysis as TXT",
+            data=entry.result,
+            file_name=f"hikmamind_analysis_{entry.id}.txt",
+            mime="text/plain",
+            key="history_download"
+        )
+    with col2:
+        if st.button("🗑️ Delete from history", key="history_delete"):
+            if store.delete(entry.id, user_id):
+                st.rerun()
+            else:
+                st.error("This analysis is no longer in your history.")
@@ -0,0 +1,168 @@
+import os
+import sqlite3
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from dataclasses import dataclass
+from io import BytesIO
+from typing import List, Optional, Tuple
+
+from services.preflight import size_text, token_budget
+from utils.cache import hash_bytes, make_cache_key
+from utils.config import (
+    CACHE_DIR,
+    IMAGE_CACHE_MAX_BYTES,
+    IMAGE_THUMBNAIL_PX,
+    generate_image,
+    get_model,
+)
+from utils.jobs import current_job, in_job, report_progress
+from utils.lazy import lazy_import
+from utils.metrics import record_cache, timed
+
+Image = lazy_import("PIL.Image")
+
+
+@dataclass
+class GeneratedImage:
+    """One generated image: the original for download and a WebP thumbnail for display"""
+    data: bytes
+    mime: str
+    thumbnail: bytes
+    text: Optional[str] = None
+
+    @property
+    def extension(self) -> str:
+        return self.mime.split("/")[-1].replace("jpeg", "jpg")
+
+
+def make_thumbnail(image_data: bytes, max_px: int = IMAGE_THUMBNAIL_PX):
+    """Return (mime of the original, downscaled WebP bytes), decoding the image once"""
+    with timed("thumbnail") as timer:
+        with Image.open(BytesIO(image_data)) as image:
+            mime = Image.MIME.get(image.format, "image/png")
+            image.thumbnail((max_px, max_px))
+            if image.mode not in ("RGB", "RGBA"):
+                image = image.convert("RGBA")
+            buffer = BytesIO()
+            image.save(buffer, format="WEBP", quality=80)
+        timer.bytes = len(image_data)
+    return mime, buffer.getvalue()
+
+
+class ImageCache:
+    """Content-addressed store of generated images, evicted LRU by total bytes"""
+
+    def __init__(self, path: str, max_bytes: int = IMAGE_CACHE_MAX_BYTES):
+        self.path = path
+        self.max_bytes = max_bytes
+        self._lock = threading.Lock()
+        dirname = os.path.dirname(path)
+        if dirname:
+            os.makedirs(dirname, exist_ok=True)
+        with self._connect() as conn:
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS images ("
+                " key TEXT PRIMARY KEY,"
+                " data BLOB NOT NULL,"
+                " mime TEXT NOT NULL,"
+                " thumbnail BLOB NOT NULL,"
+                " text TEXT,"
+                " size INTEGER NOT NULL,"
+                " accessed REAL NOT NULL)"
+            )
+
+    def _connect(self):
+        return sqlite3.connect(self.path, timeout=30)
+
+    def get(self, key: str) -> Optional[GeneratedImage]:
+        with self._lock, self._connect() as conn:
+            row = conn.execute(
+                "SELECT data, mime, thumbnail, text FROM images WHERE key = ?", (key,)
+            ).fetchone()
+            record_cache("image", hit=row is not None)
+            if row is None:
+                return None
+            conn.execute("UPDATE images SET accessed = ? WHERE key = ?", (time.time(), key))
+        return GeneratedImage(*row)
+
+    def set(self, key: str, image: GeneratedImage):
+        size = len(image.data) + len(image.thumbnail)
+        with self._lock, self._connect() as conn:
+            conn.execute(
+                "INSERT OR REPLACE INTO images (key, data, mime, thumbnail, text, size, accessed) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?)",
+                (key, image.data, image.mime, image.thumbnail, image.text, size, time.time())
+            )
+            total = conn.execute("SELECT COALESCE(SUM(size), 0) FROM images").fetchone()[0]
+            if total <= self.max_bytes:
+                return
+            # Drop least recently used images until we fit in the budget
+            for old_key, old_size in conn.execute(
+                "SELECT key, size FROM images ORDER BY accessed ASC"
+            ).fetchall():
+                conn.execute("DELETE FROM images WHERE key = ?", (old_key,))
+                total -= old_size
+                if total <= self.max_bytes:
+                    break
+
+
+_image_cache = None
+_image_cache_lock = threading.Lock()
+
+
+def get_image_cache() -> ImageCache:
+    """Return the process-wide image cache"""
+    global _image_cache
+    with _image_cache_lock:
+        if _image_cache is None:
+            _image_cache = ImageCache(os.path.join(CACHE_DIR, "images.sqlite3"))
+        return _image_cache
+
+
+def image_key(prompt: str, model: str, variant: int) -> str:
+    """Cache key of one variant; variant n of a prompt is reused by every later request"""
+    return make_cache_key(hash_bytes(f"image-variant-{variant}".encode("utf-8")), prompt, model)
+
+
+def _generate_variant(client, prompt: str, model: str, variant: int) -> Optional[GeneratedImage]:
+    cache = get_image_cache()
+    key = image_key(prompt, model, variant)
+    cached = cache.get(key)
+    if cached is not None:
+        return cached
+    # The output allowance of the reservation covers the generated image
+    with token_budget(size_text(prompt)):
+        text_response, image_data = generate_image(client, prompt)
+    if not image_data:
+        return None
+    mime, thumbnail = make_thumbnail(image_data)
+    image = GeneratedImage(image_data, mime, thumbnail, text_response)
+    cache.set(key, image)
+    return image
+
+
+def generate_images(client, prompt: str, variants: int = 1) -> Tuple[List[GeneratedImage], List[str]]:
+    """Generate `variants` images for a prompt concurrently, generating only the uncached ones.
+
+    Returns (images, errors): a failing variant adds its error without
+    discarding the others. Raises the first error when every variant failed.
+    """
+    model = get_model("image")
+    images = [None] * variants
+    failures = []
+    with ThreadPoolExecutor(max_workers=max(1, variants)) as pool:
+        generate = in_job(current_job(), _generate_variant)
+        futures = {pool.submit(generate, client, prompt, model, variant): variant for variant in range(variants)}
+        for done, future in enumerate(as_completed(futures), start=1):
+            variant = futures[future]
+            try:
+                images[variant] = future.result()
+            except Exception as e:
+                failures.append((variant, e))
+            report_progress(0.1 + 0.9 * done / variants, f"Generated {done} of {variants} images...")
+    if failures and len(failures) == variants:
+        raise failures[0][1]
+    errors = [f"Image {variant + 1}: {error}" for variant, error in sorted(failures, key=lambda failure: failure[0])]
+    return [image for image in images if image is not None], errors
@@ -0,0 +1,241 @@
+import hashlib
+import os
+import re
+import threading
+from collections import OrderedDict
+from typing import List, Tuple
+
+import numpy as np
+from google.genai import types
+from services.pdf_text import TextChunk, estimate_tokens, extract_chunks
+from services.preflight import InputSize, plan_model, size_text, token_budget
+from utils.cache import get_result_cache, hash_bytes, make_cache_key, response_text
+from utils.config import (
+    CACHE_DIR,
+    CHUNK_MAX_WORKERS,
+    EMBEDDER,
+    INDEX_CHUNK_TOKENS,
+    INDEX_MEMORY_ENTRIES,
+    INDEX_TOP_K,
+    get_model,
+)
+from utils.jobs import map_bounded
+from utils.metrics import timed
+from utils.scheduler import get_scheduler
+
+_TOKEN_RE = re.compile(r"\w+")
+
+# Texts per embedding request (the API limit)
+EMBED_BATCH_SIZE = 100
+
+QUESTION_PROMPT = (
+    "Answer the question about a research paper using only the excerpts below. "
+    "Mention the pages you rely on, e.g. (p. 3). If the excerpts do not contain "
+    "the answer, say so instead of guessing."
+)
+
+
+def _normalize(matrix: np.ndarray) -> np.ndarray:
+    norms = np.linalg.norm(matrix, axis=1, keepdims=True)
+    return (matrix / np.where(norms == 0, 1, norms)).astype(np.float32)
+
+
+class HashingEmbedder:
+    """Local, deterministic embedder using the hashing trick on words and word pairs.
+
+    Needs no network access, which makes it suitable for tests and offline use.
+    """
+
+    def __init__(self, dim: int = 1024):
+        self.dim = dim
+        self.name = f"hashing-{dim}"
+
+    def _features(self, text: str) -> List[str]:
+        words = [word.lower() for word in _TOKEN_RE.findall(text)]
+        return words + [f"{a} {b}" for a, b in zip(words, words[1:])]
+
+    def embed(self, texts: List[str], query: bool = False) -> np.ndarray:
+        matrix = np.zeros((len(texts), self.dim), dtype=np.float32)
+        for row, text in enumerate(texts):
+            digests = [hashlib.blake2b(feature.encode("utf-8"), digest_size=8).digest()
+                       for feature in self._features(text)]
+            if not digests:
+                continue
+            values = np.frombuffer(b"".join(digests), dtype=np.uint64)
+            signs = np.where(values & np.uint64(1), 1.0, -1.0).astype(np.float32)
+            np.add.at(matrix[row], (values >> np.uint64(1)) % np.uint64(self.dim), signs)
+        return _normalize(matrix)
+
+
+class GeminiEmbedder:
+    """Embeds through the Gemini embedding model, in batches, via the request scheduler"""
+
+    def __init__(self, client, model: str = None):
+        self.client = client
+        self.model = model or get_model("embedding")
+        self.name = self.model.split("/")[-1]
+
+    def embed(self, texts: List[str], query: bool = False) -> np.ndarray:
+        config = types.EmbedContentConfig(task_type="RETRIEVAL_QUERY" if query else "RETRIEVAL_DOCUMENT")
+        vectors = []
+        for start in range(0, len(texts), EMBED_BATCH_SIZE):
+            batch = texts[start:start + EMBED_BATCH_SIZE]
+            size = InputSize(sum(len(text) for text in batch), sum(estimate_tokens(text) for text in batch))
+            with token_budget(size), timed("embed", self.model) as timer:
+                response = get_scheduler().run(lambda: self.client.models.embed_content(
+                    model=self.model, contents=batch, config=config
+                ))
+                timer.bytes = size.bytes
+                # Embedding responses carry no usage metadata, so the estimate is what gets counted
+                timer.tokens_in = size.tokens
+            vectors.extend(embedding.values for embedding in response.embeddings)
+        return _normalize(np.asarray(vectors, dtype=np.float32))
+
+
+class ChunkIndex:
+    """Passages of one document and their embeddings, searched with a single matrix product"""
+
+    def __init__(self, texts: List[str], pages: np.ndarray, vectors: np.ndarray):
+        self.texts = texts
+        self.pages = pages
+        self.vectors = vectors
+
+    def __len__(self) -> int:
+        return len(self.texts)
+
+    def search(self, query_vector: np.ndarray, k: int = INDEX_TOP_K) -> List[Tuple[int, float]]:
+        """Return the (passage index, score) of the k best passages, best first"""
+        if not len(self):
+            return []
+        scores = self.vectors @ query_vector.reshape(-1)
+        k = min(k, len(scores))
+        top = np.argpartition(-scores, k - 1)[:k]
+        top = top[np.argsort(-scores[top])]
+        return [(int(i), float(scores[i])) for i in top]
+
+    def save(self, path: str):
+        np.savez(path, texts=np.array(self.texts, dtype=str), pages=self.pages, vectors=self.vectors)
+
+    @classmethod
+    def load(cls, path: str) -> "ChunkIndex":
+        with np.load(path, allow_pickle=False) as data:
+            return cls([str(text) for text in data["texts"]], data["pages"], data["vectors"])
+
+
+def _batches(chunks, size: int):
+    batch = []
+    for chunk in chunks:
+        batch.append(chunk)
+        if len(batch) == size:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+
+
+def build_index(pdf_data: bytes, embedder, max_tokens: int = INDEX_CHUNK_TOKENS,
+                max_workers: int = CHUNK_MAX_WORKERS) -> ChunkIndex:
+    """Extract the text once, split it into passages and embed them.
+
+    Passages are embedded in batches while the rest of the text is still
+    being extracted.
+    """
+    def embed(batch: List[TextChunk]):
+        return batch, embedder.embed([chunk.text for chunk in batch])
+
+    chunks = _batches(extract_chunks(pdf_data, max_tokens=max_tokens), EMBED_BATCH_SIZE)
+    batches = dict(map_bounded(embed, chunks, max_workers))
+    if not batches:
+        raise ValueError("No extractable text found in this PDF")
+    chunks = [chunk for index in range(len(batches)) for chunk in batches[index][0]]
+    texts = [chunk.text for chunk in chunks]
+    pages = np.array([(chunk.first_page, chunk.last_page) for chunk in chunks], dtype=np.int32)
+    return ChunkIndex(texts, pages, np.concatenate([batches[index][1] for index in range(len(batches))]))
+
+
+_embedder = None
+_indexes = OrderedDict()
+_lock = threading.Lock()
+
+
+def set_embedder(embedder):
+    """Replace the embedder (any object with a name and embed(texts, query) -> ndarray)"""
+    global _embedder
+    with _lock:
+        _embedder = embedder
+        _indexes.clear()
+
+
+def get_embedder(client):
+    global _embedder
+    with _lock:
+        if _embedder is None:
+            _embedder = HashingEmbedder() if EMBEDDER == "hashing" else GeminiEmbedder(client)
+        return _embedder
+
+
+def get_paper_index(client, pdf_data: bytes, doc_hash: str = None) -> ChunkIndex:
+    """Return the index of a PDF, building it at most once.
+
+    Indexes are saved under the cache directory and the most recent ones
+    are also kept in memory.
+    """
+    embedder = get_embedder(client)
+    doc_hash = doc_hash or hash_bytes(pdf_data)
+    key = f"{doc_hash}-{embedder.name}"
+    with _lock:
+        if key in _indexes:
+            _indexes.move_to_end(key)
+            return _indexes[key]
+
+    directory = os.path.join(CACHE_DIR, "index")
+    path = os.path.join(directory, f"{key}.npz")
+    if os.path.exists(path):
+        index = ChunkIndex.load(path)
+    else:
+        index = build_index(pdf_data, embedder)
+        os.makedirs(directory, exist_ok=True)
+        # Write then rename so other processes never load a partial file
+        partial = f"{path}.{threading.get_ident()}.npz"
+        index.save(partial)
+        os.replace(partial, path)
+
+    with _lock:
+        _indexes[key] = index
+        while len(_indexes) > INDEX_MEMORY_ENTRIES:
+            _indexes.popitem(last=False)
+    return index
+
+
+def answer_question(client, pdf_data: bytes, question: str, profile_context: str = "",
+                    k: int = INDEX_TOP_K, model: str = None) -> str:
+    """Answer a question about a PDF from its k most relevant passages"""
+    model = model or get_model("paper_question")
+    doc_hash = hash_bytes(pdf_data)
+    index = get_paper_index(client, pdf_data, doc_hash)
+    with timed("retrieve"):
+        hits = index.search(get_embedder(client).embed([question], query=True)[0], k)
+    # Passages go back in document order so the model reads them in context
+    excerpts = "\n\n".join(
+        f"[Pages {index.pages[i][0]}-{index.pages[i][1]}]\n{index.texts[i]}" for i, _ in sorted(hits)
+    )
+    prompt = f"{profile_context}\n{QUESTION_PROMPT}\n\nQuestion: {question}"
+
+    cache = get_result_cache()
+    key = make_cache_key(doc_hash, f"{prompt}\n{sorted(i for i, _ in hits)}", model)
+    cached = cache.get(key)
+    if cached is not None:
+        return cached
+
+    size = size_text(f"{excerpts}\n{prompt}")
+    # Cached under the requested model even when budget pressure downgrades the run
+    run_model = plan_model(model, size)
+    with token_budget(size), timed("model.question", run_model) as timer:
+        response = get_scheduler().run(lambda: client.models.generate_content(
+            model=run_model,
+            contents=[f"Excerpts from the paper:\n\n{excerpts}", prompt]
+        ), key=key, timer=timer)
+        timer.bytes = len(excerpts)
+    text = response_text(response)
+    cache.set(key, text)
+    return text
@@ -0,0 +1,262 @@
+import json
+import time
+from contextlib import nullcontext
+from typing import Union
+
+from models.user_profile import UserProfile
+from utils.config import get_model
+from services.document_registry import get_document_registry
+from services.context_cache import get_context_cache_registry
+from services.pdf_text import build_section_notes, summarize_chunks
+from services.preflight import plan_model, route_model, size_pdf, token_budget
+from utils.history import record_analysis
+from utils.http_client import fetch_pdf
+from utils.jobs import current_job, report_progress
+from utils.metrics import instrument_stream, timed
+from utils.scheduler import get_scheduler
+from utils.cache import EmptyResponse, cached_stream, get_result_cache, hash_bytes, make_cache_key, response_text
+from utils.prompts import ALL_PDF_ANALYSES, analysis_types, json_field, render_all_pdf_prompt, render_prompt
+from utils.lazy import lazy_import
+
+genai = lazy_import("google.genai")
+
+# Produces every analysis type from a single request
+ALL_ANALYSES = ALL_PDF_ANALYSES
+PDF_ANALYSIS_TYPES = analysis_types("pdf") + [ALL_ANALYSES]
+
+def generate_prompt_for_pdf(analysis_type, user_profile):
+    """Return the prompt for an analysis type and user profile (rendered once per profile)."""
+    return render_prompt("pdf", analysis_type, user_profile)
+
+def generate_prompt_for_all_pdf_analyses(user_profile):
+    """Return the prompt asking for every analysis type as fields of one JSON object."""
+    return render_all_pdf_prompt(user_profile)
+
+def pdf_model_for(analysis_type: str, tokens: int = None) -> str:
+    """Return the model used for an analysis type; short summaries and small documents use a cheaper model"""
+    return route_model(get_model("pdf_summary" if analysis_type == "General summary" else "pdf_analysis"), tokens)
+
+def _document_hash(document) -> str:
+    if isinstance(document, str):
+        return hash_bytes(document.encode("utf-8"))
+    return hash_bytes(document)
+
+def _pdf_contents(client, document, prompt: str, doc_hash: str = None):
+    # Section notes from the chunked pipeline are sent as plain text
+    if isinstance(document, str):
+        return [document, prompt]
+    return [
+        get_document_registry().get_part(client, document, doc_hash),
+        prompt
+    ]
+
+def prepare_document(client, pdf_data: bytes, chunked: bool = False, page_range=None):
+    """Return what the analysis runs on: the PDF itself, or section notes.
+    
+    In chunked mode the text is extracted locally, split into token-bounded
+    chunks and summarized in parallel; the joined notes then stand in for
+    the PDF in the final, profile-aware request.
+    """
+    if not chunked:
+        return pdf_data
+    return build_section_notes(summarize_chunks(client, pdf_data, get_model("chunk_summary"), page_range))
+
+def analyze_pdf_bytes(client, pdf_data, prompt: str, model: str = None, cache_model: str = None) -> str:
+    """Analyze a PDF with the given prompt, reusing cached results when possible.
+    
+    The result is cached under cache_model's key when given, so it can be
+    found by requests that asked for that model.
+    """
+    model = model or get_model("pdf_analysis")
+    cache = get_result_cache()
+    doc_hash = _document_hash(pdf_data)
+    key = make_cache_key(doc_hash, prompt, cache_model or model)
+    cached = cache.get(key)
+    if cached is not None:
+        return cached
+    
+    with timed("model.pdf", model) as timer:
+        response = get_scheduler().run(lambda: get_context_cache_registry().generate(
+            client, model, pdf_data, prompt, doc_hash,
+            lambda: _pdf_contents(client, pdf_data, prompt, doc_hash)
+        ), key=key, timer=timer)
+    text = response_text(response)
+    cache.set(key, text)
+    return text
+
+def stream_pdf_analysis(client, pdf_data, prompt: str, model: str = None, cache_model: str = None):
+    """Yield the analysis text chunk by chunk as the model generates it (cached like analyze_pdf_bytes)"""
+    model = model or get_model("pdf_analysis")
+    doc_hash = _document_hash(pdf_data)
+    key = make_cache_key(doc_hash, prompt, cache_model or model)
+    return cached_stream(key, lambda: instrument_stream(lambda timer: get_scheduler().stream(
+        lambda: get_context_cache_registry().stream(
+            client, model, pdf_data, prompt, doc_hash,
+            lambda: _pdf_contents(client, pdf_data, prompt, doc_hash)
+        ), key=key, timer=timer
+    ), "model.pdf", model))
+
+def _single_type_key(doc_hash: str, analysis_type: str, user_profile: UserProfile, tokens: int = None) -> str:
+    # The key a single-type request for this document looks up, under that type's own model
+    return make_cache_key(doc_hash, generate_prompt_for_pdf(analysis_type, user_profile),
+                          pdf_model_for(analysis_type, tokens))
+
+def analyze_pdf_all(client, pdf_data, user_profile: UserProfile, model: str = None, tokens: int = None) -> dict:
+    """Produce every analysis type in one structured-output request.
+    
+    Returns a dict mapping analysis type to text. Each part is also stored
+    under its single-type cache key (with that type's model for a document
+    of `tokens` tokens), so later single-type requests hit. When the JSON
+    reply is invalid, truncated or missing fields, the missing types are
+    requested one at a time instead.
+    """
+    model = model or get_model("pdf_analysis")
+    cache = get_result_cache()
+    doc_hash = _document_hash(pdf_data)
+    keys = {
+        analysis_type: _single_type_key(doc_hash, analysis_type, user_profile, tokens)
+        for analysis_type in analysis_types("pdf")
+    }
+    results = {analysis_type: cache.get(key) for analysis_type, key in keys.items()}
+    if all(text is not None for text in results.values()):
+        return results
+    
+    fields = [json_field(analysis_type) for analysis_type in analysis_types("pdf")]
+    prompt = generate_prompt_for_all_pdf_analyses(user_profile)
+    with timed("model.pdf_all", model) as timer:
+        response = get_scheduler().run(lambda: get_context_cache_registry().generate(
+            client, model, pdf_data, prompt, doc_hash,
+            lambda: _pdf_contents(client, pdf_data, prompt, doc_hash),
+            config=genai.types.GenerateContentConfig(
+                response_mime_type="application/json",
+                response_schema={
+                    "type": "OBJECT",
+                    "properties": {field: {"type": "STRING"} for field in fields},
+                    "required": fields,
+                }
+            )
+        ), key=make_cache_key(doc_hash, prompt, model), timer=timer)
+    data = _parse_fields(response)
+    for analysis_type, key in keys.items():
+        text = data.get(json_field(analysis_type))
+        if isinstance(text, str) and text.strip():
+            cache.set(key, text)
+        else:
+            # Produced on its own, cached under the key a single-type request looks up
+            text = analyze_pdf_bytes(client, pdf_data, generate_prompt_for_pdf(analysis_type, user_profile),
+                                     model, cache_model=pdf_model_for(analysis_type, tokens))
+        results[analysis_type] = text
+    return results
+
+def _parse_fields(response) -> dict:
+    # Blocked, truncated or malformed output parses as no fields at all
+    try:
+        data = json.loads(response_text(response))
+    except (EmptyResponse, ValueError):
+        return {}
+    return data if isinstance(data, dict) else {}
+
+def format_all_analyses(results: dict) -> str:
+    """Join per-type results into one Markdown document"""
+    return "\n\n".join(f"## {name}\n\n{text}" for name, text in results.items())
+
+def is_pdf_cached(doc_hash: str, analysis_type: str, user_profile: UserProfile, tokens: int = None) -> bool:
+    """True if this analysis of the document is already cached ("All analyses" when every type is)"""
+    cache = get_result_cache()
+    return all(
+        cache.contains(_single_type_key(doc_hash, single_type, user_profile, tokens))
+        for single_type in (analysis_types("pdf") if analysis_type == ALL_ANALYSES else [analysis_type])
+    )
+
+def cached_pdf_types(doc_hash: str, user_profile: UserProfile, tokens: int = None) -> list:
+    """Return the analysis types whose result for this document and profile is already cached"""
+    return [
+        analysis_type for analysis_type in PDF_ANALYSIS_TYPES
+        if is_pdf_cached(doc_hash, analysis_type, user_profile, tokens)
+    ]
+
+def plan_pdf_analysis(pdf_data: bytes, analysis_type: str, user_profile: UserProfile,
+                      chunked: bool = False, page_range=None, user: str = None):
+    """Size a PDF locally and pick its model before any request; returns (size, model, cache_model, budget).
+    
+    model is the one to run, possibly downgraded under budget pressure;
+    the result is still cached under the key of cache_model, the model
+    the analysis type asks for, so later lookups find it. budget is the
+    context to run the analysis in: a reservation on the token budgets,
+    or nothing when the result is already cached. Raises InputTooLarge
+    for documents above the per-request limit.
+    """
+    size = size_pdf(pdf_data, chunked, page_range)
+    cache_model = pdf_model_for(analysis_type, size.tokens)
+    # Section notes only exist after the map step, so large document mode always reserves
+    if not chunked and is_pdf_cached(hash_bytes(pdf_data), analysis_type, user_profile, size.tokens):
+        return size, cache_model, cache_model, nullcontext()
+    return size, plan_model(cache_model, size, user), cache_model, token_budget(size, user)
+
+def analyze_pdf(client, source: Union[bytes, str], analysis_type: str, user_profile: UserProfile,
+                chunked: bool = False, page_range=None, user: str = None) -> str:
+    """Run one analysis type (or all of them) on a PDF given as bytes or as a URL, and return the text.
+    
+    This is the headless entry point used by batch mode and the CLI; it
+    needs no Streamlit session. Tokens are charged to `user`'s budget.
+    """
+    pdf_data = download_pdf(source) if isinstance(source, str) else source
+    size, model, cache_model, budget = plan_pdf_analysis(pdf_data, analysis_type, user_profile, chunked,
+                                                         page_range, user)
+    with budget:
+        document = prepare_document(client, pdf_data, chunked, page_range)
+        if analysis_type == ALL_ANALYSES:
+            return format_all_analyses(analyze_pdf_all(client, document, user_profile, model, size.tokens))
+        return analyze_pdf_bytes(client, document, generate_prompt_for_pdf(analysis_type, user_profile), model,
+                                 cache_model)
+
+def download_pdf(pdf_url: str) -> bytes:
+    """Download a PDF and return its bytes"""
+    return fetch_pdf(pdf_url)
+
+def run_pdf_analysis_job(client, open_pdf, analysis_type: str, user_profile: UserProfile, stream: bool = True,
+                         chunked: bool = False, page_range=None, source: str = ""):
+    """Body of a background PDF analysis job.
+    
+    open_pdf() returns a context manager yielding the PDF bytes, which are
+    held for the whole job. Returns the text for a single analysis type, or
+    a dict of texts for "All analyses". Streamed output is appended to the
+    job as it arrives. The finished analysis is recorded in the history
+    under `source`.
+    """
+    report_progress(0.05, "Loading PDF...")
+    with open_pdf() as pdf_data:
+        return _run_pdf_analysis(client, pdf_data, analysis_type, user_profile, stream, chunked, page_range, source)
+
+def _run_pdf_analysis(client, pdf_data: bytes, analysis_type: str, user_profile: UserProfile, stream: bool,
+                      chunked: bool, page_range, source: str):
+    job = current_job()
+    start = time.perf_counter()
+    size, model, cache_model, budget = plan_pdf_analysis(pdf_data, analysis_type, user_profile, chunked, page_range)
+    with budget:
+        if chunked:
+            report_progress(0.2, f"Extracting text and summarizing sections ({size.describe()})...")
+        document = prepare_document(client, pdf_data, chunked, page_range)
+        report_progress(0.6, f"Analyzing PDF ({size.describe()}) with {model.split('/')[-1]}...")
+        if analysis_type == ALL_ANALYSES:
+            result = analyze_pdf_all(client, document, user_profile, model, size.tokens)
+        else:
+            prompt = generate_prompt_for_pdf(analysis_type, user_profile)
+            if stream and job is not None:
+                for chunk in stream_pdf_analysis(client, document, prompt, model, cache_model):
+                    job.append(chunk)
+                result = job.partial
+            else:
+                result = analyze_pdf_bytes(client, document, prompt, model, cache_model)
+    record_analysis(
+        "pdf", source, hash_bytes(pdf_data), analysis_type,
+        format_all_analyses(result) if isinstance(result, dict) else result,
+        user_profile, model, time.perf_counter() - start, _pdf_options(chunked, page_range)
+    )
+    return result
+
+def _pdf_options(chunked: bool, page_range) -> str:
+    if not chunked:
+        return ""
+    first_page, last_page = page_range or (1, None)
+    return f"Large document mode, pages {first_page}-{last_page or 'end'}"
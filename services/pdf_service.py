@@ -1,32 +1,166 @@
 import streamlit as st
-import httpx
-from google import genai
 from models.user_profile import UserProfile
-from PIL import Image
-from io import BytesIO
-from utils.config import generate_image
+from utils.config import IMAGE_MAX_VARIANTS
+from services.pdf_analysis import (
+    PDF_ANALYSIS_TYPES,
+    download_pdf,
+    format_all_analyses,
+    run_pdf_analysis_job,
+)
+from services.image_service import generate_images
+from services.prefetch import get_prefetcher, prefetch_key, prepare_pdf_url, prepare_upload
+from services.upload_store import get_upload_store
+from utils.jobs import get_job_manager, report_progress
+from utils.ui_components import fragment, get_session_id, get_user_id, render_job_progress, render_prefetch_status
+from utils.prompts import profile_context
 
-def generate_prompt_for_pdf(analysis_type, user_profile):
-    """Generate a simple prompt string based on analysis type and user profile."""
-    if analysis_type == "General summary":
-        base_prompt = "Summarize this research paper concisely."
-    elif analysis_type == "Detailed analogy":
-        base_prompt = "Explain the main concepts of this paper using simple, familiar analogies."
-    elif analysis_type == "Simplify concepts":
-        base_prompt = "Simplify the complex concepts in this paper for a non-expert audience."
-    else:  # Key research points
-        base_prompt = "Identify and explain the main contributions and key findings of this research."
+def run_image_job(client, image_prompt: str, variants: int = 1):
+    """Body of a background image generation job"""
+    report_progress(0.1, "Generating images..." if variants > 1 else "Generating image...")
+    return generate_images(client, image_prompt, variants)
+
+@fragment
+def render_image_panel(client, key_prefix: str):
+    """Image generation expander whose requests run as background jobs"""
+    job_key = f"{key_prefix}_image_job"
+    with st.expander("Generate images to illustrate concepts"):
+        st.info("You can generate images to help visualize complex concepts from the paper")
+        image_prompt = st.text_area("Describe the image you want to generate:", 
+                                placeholder="E.g., Create a visual representation of neural networks as described in this paper",
+                                key=f"{key_prefix}_image_prompt")
+        variants = st.number_input("Number of variants", min_value=1, max_value=max(1, IMAGE_MAX_VARIANTS), value=1,
+                                   key=f"{key_prefix}_image_variants")
+        
+        if st.button("Generate Image", key=f"{key_prefix}_generate_img") and image_prompt:
+            job = get_job_manager().submit(get_session_id(), "Image generation", run_image_job,
+                                           client, image_prompt, int(variants), user=get_user_id())
+            st.session_state[job_key] = job.id
+        
+        job = get_job_manager().get(st.session_state.get(job_key))
+        if job is None:
+            return
+        if not job.done:
+            render_job_progress(job.id)
+            return
+        if job.status == "failed":
+            st.error(f"Error generating image: {job.error}")
+            return
+        # Variants that failed are reported; the others are still shown
+        images, errors = job.result
+        for error in errors:
+            st.warning(f"Error generating image: {error}")
+        if not images and not errors:
+            st.warning("The model did not return an image. Try rephrasing the description.")
+        elif images:
+            # Thumbnails are displayed; the untouched originals are offered for download
+            for index, (column, image) in enumerate(zip(st.columns(len(images)), images), start=1):
+                with column:
+                    st.image(image.thumbnail, caption=f"Generated Image {index}" if len(images) > 1 else "Generated Image")
+                    st.download_button(
+                        label="Download Image",
+                        data=image.data,
+                        file_name=f"hikmamind_generated_image_{index}.{image.extension}",
+                        mime=image.mime,
+                        key=f"{key_prefix}_download_img_{index}"
+                    )
+            comments = [image.text for image in images if image.text]
+            if comments:
+                st.write("AI comments on the image:")
+                st.write(comments[0])
+
+def run_question_job(client, open_pdf, question: str, user_profile: UserProfile):
+    """Body of a background question job; the paper is indexed on the first question"""
+    # Imported here: the index needs numpy, which only question answering uses
+    from services.paper_index import answer_question
+    
+    report_progress(0.1, "Finding the relevant passages...")
+    with open_pdf() as pdf_data:
+        return answer_question(client, pdf_data, question, profile_context(user_profile))
+
+def render_question_box(client, key_prefix: str, open_pdf, user_profile: UserProfile):
+    """Render the "Ask about this paper" box; questions run as background jobs"""
+    job_key = f"{key_prefix}_question_job"
+    with st.container(border=True):
+        st.subheader("💬 Ask about this paper")
+        question = st.text_input("Your question:", key=f"{key_prefix}_question",
+                                 placeholder="E.g., What dataset was used for the evaluation?")
+        if st.button("Ask", key=f"{key_prefix}_ask") and question.strip():
+            job = get_job_manager().submit(get_session_id(), "Question", run_question_job,
+                                           client, open_pdf, question.strip(), user_profile, user=get_user_id())
+            st.session_state[job_key] = job.id
+        
+        job = get_job_manager().get(st.session_state.get(job_key))
+        if job is None:
+            return
+        if not job.done:
+            render_job_progress(job.id)
+        elif job.status == "failed":
+            st.error(f"Error answering the question: {job.error}")
+        else:
+            st.markdown(job.result)
+
+def render_pdf_job(client, job_key: str, user_profile: UserProfile, file_name: str, open_pdf=None):
+    """Show the state of the analysis job stored under job_key, polling while it runs"""
+    job = get_job_manager().get(st.session_state.get(job_key))
+    if job is None:
+        return
+    if not job.done:
+        render_job_progress(job.id)
+        return
+    if job.status == "failed":
+        st.error(f"Error during analysis: {job.error}")
+        return
+    
+    st.success("✅ Analysis complete!")
     
-    # Add user profile context
-    profile_context = (
-        f"The user is in the field of {user_profile.field}, "
-        f"knowledge level: {user_profile.knowledge_level}, "
-        f"prefers analogies: {user_profile.analogy_style}."
+    # Add bordered container for result
+    with st.container(border=True):
+        st.subheader("🎯 Personalized analysis for your profile")
+        st.caption(f"Field: {user_profile.field} | Level: {user_profile.knowledge_level} | Analogy style: {user_profile.analogy_style}")
+        if isinstance(job.result, dict):
+            for tab, (name, text) in zip(st.tabs(list(job.result)), job.result.items()):
+                with tab:
+                    st.markdown(text)
+            result_text = format_all_analyses(job.result)
+        else:
+            result_text = job.result
+            st.markdown(result_text)
+    
+    # Allow export of result
+    st.download_button(
+        label="📄 Download analysis as TXT",
+        data=result_text,
+        file_name=file_name,
+        mime="text/plain",
+        key=f"{job_key}_download"
     )
     
-    prompt = f"{profile_context}\n{base_prompt}"
-    return prompt
+    # Follow-up questions only send the relevant passages, not the whole PDF
+    if open_pdf is not None:
+        render_question_box(client, job_key, open_pdf, user_profile)
+    
+    # Image generation option
+    render_image_panel(client, job_key)
 
+def render_large_document_options(key_prefix: str):
+    """Render the chunked-analysis options and return (chunked, page_range)"""
+    chunked = st.checkbox(
+        "Large document mode (extract text locally and analyze in sections)",
+        value=False,
+        key=f"{key_prefix}_chunked",
+        help="Recommended for very long papers and theses. Lets you analyze only a range of pages."
+    )
+    page_range = None
+    if chunked:
+        col1, col2 = st.columns(2)
+        with col1:
+            first_page = st.number_input("From page", min_value=1, value=1, key=f"{key_prefix}_first_page")
+        with col2:
+            last_page = st.number_input("To page (0 = last page)", min_value=0, value=0, key=f"{key_prefix}_last_page")
+        page_range = (int(first_page), int(last_page) or None)
+    return chunked, page_range
+
+@fragment
 def pdf_url_analyzer(client, user_profile: UserProfile):
     st.header("Analyze PDF from URL")
     
@@ -37,78 +171,41 @@ def pdf_url_analyzer(client, user_profile: UserProfile):
     
     pdf_analogy_type = st.selectbox(
         "Type of analysis:",
-        ["General summary", "Detailed analogy", "Simplify concepts", "Key research points"],
+        PDF_ANALYSIS_TYPES,
         key="pdf_url_analogy"
     )
     
+    stream_results = st.checkbox("Stream results as they are generated", value=True, key="pdf_url_stream")
+    chunked, page_range = render_large_document_options("pdf_url")
+    
+    # Download and stage the PDF while options are chosen; the job then takes the prepared copy
+    session_id = get_session_id()
+    prefetcher = get_prefetcher()
+    url_key = prefetch_key(pdf_url, user_profile)
+    if pdf_url.startswith(("http://", "https://")):
+        render_prefetch_status(prefetcher.start(session_id, "pdf_url", url_key, prepare_pdf_url,
+                                                client, pdf_url, user_profile))
+    else:
+        prefetcher.cancel(session_id, "pdf_url")
+    
+    def open_pdf():
+        return prefetcher.open(session_id, "pdf_url", url_key, lambda: download_pdf(pdf_url))
+    
     if st.button("Analyze PDF", key="analyze_pdf_url"):
         if pdf_url:
-            try:
-                with st.spinner("Downloading and analyzing PDF..."):
-                    # Download the PDF
-                    doc_data = httpx.get(pdf_url).content
-                    
-                    # Prepare personalized prompt
-                    prompt = generate_prompt_for_pdf(pdf_analogy_type, user_profile)
-                    
-                    # Generate content
-                    response = client.models.generate_content(
-                        model="gemini-2.5-flash-preview-04-17",
-                        contents=[
-                            genai.types.Part.from_bytes(
-                                data=doc_data,
-                                mime_type='application/pdf',
-                            ),
-                            prompt
-                        ]
-                    )
-                    
-                    # Display result
-                    st.success("✅ Analysis complete!")
-                    
-                    # Add bordered container for result
-                    with st.container(border=True):
-                        st.subheader("🎯 Personalized analysis for your profile")
-                        st.caption(f"Field: {user_profile.field} | Level: {user_profile.knowledge_level} | Analogy style: {user_profile.analogy_style}")
-                        st.markdown(response.text)
-                    
-                    # Allow export of result
-                    st.download_button(
-                        label="📄 Download analysis as TXT",
-                        data=response.text,
-                        file_name="hikmamind_analysis.txt",
-                        mime="text/plain"
-                    )
-                    
-                    # Image generation option
-                    with st.expander("Generate images to illustrate concepts"):
-                        st.info("You can generate images to help visualize complex concepts from the paper")
-                        image_prompt = st.text_area("Describe the image you want to generate:", 
-                                                placeholder="E.g., Create a visual representation of neural networks as described in this paper")
-                        
-                        if st.button("Generate Image", key="generate_img_url") and image_prompt:
-                            try:
-                                with st.spinner("Generating image..."):
-                                    text_response, image_data = generate_image(client, image_prompt)
-                                    
-                                    if image_data:
-                                        st.image(Image.open(BytesIO(image_data)), caption="Generated Image")
-                                        st.download_button(
-                                            label="Download Image",
-                                            data=BytesIO(image_data).getvalue(),
-                                            file_name="hikmamind_generated_image.png",
-                                            mime="image/png"
-                                        )
-                                    if text_response:
-                                        st.write("AI comments on the image:")
-                                        st.write(text_response)
-                            except Exception as e:
-                                st.error(f"Error generating image: {str(e)}")
-            except Exception as e:
-                st.error(f"Error during analysis: {str(e)}")
+            # Run in the background so widget interactions don't cancel the analysis
+            job = get_job_manager().submit(
+                session_id, "PDF analysis", run_pdf_analysis_job,
+                client, open_pdf, pdf_analogy_type, user_profile,
+                stream_results, chunked, page_range, pdf_url, user=get_user_id()
+            )
+            st.session_state["pdf_url_job"] = job.id
         else:
             st.warning("⚠️ Please enter a valid PDF URL.")
+    
+    render_pdf_job(client, "pdf_url_job", user_profile, "hikmamind_analysis.txt", open_pdf)
 
+@fragment
 def pdf_upload_analyzer(client, user_profile: UserProfile):
     st.header("Analyze uploaded PDF")
     
@@ -116,157 +213,55 @@ def pdf_upload_analyzer(client, user_profile: UserProfile):
     
     pdf_upload_analogy_type = st.selectbox(
         "Type of analysis:",
-        ["General summary", "Detailed analogy", "Simplify concepts", "Key research points"],
+        PDF_ANALYSIS_TYPES,
         key="pdf_upload_analogy"
     )
     
+    stream_results = st.checkbox("Stream results as they are generated", value=True, key="pdf_upload_stream")
+    chunked, page_range = render_large_document_options("pdf_upload")
+    
     show_original = st.checkbox("Show PDF alongside analysis", value=False)
     
-    # Fix: Only create multiple columns if showing original & file is uploaded
-    if show_original and uploaded_file:
-        col1, col2 = st.columns([2, 3])
-        
-        # Column 1: Analysis section
-        with col1:
-            if st.button("Analyze PDF", key="analyze_pdf_upload", disabled=not uploaded_file):
-                if uploaded_file is not None:
-                    try:
-                        with st.spinner("Analyzing PDF..."):
-                            # Read uploaded file
-                            pdf_data = uploaded_file.getvalue()
-                            
-                            # Prepare personalized prompt
-                            prompt = generate_prompt_for_pdf(pdf_upload_analogy_type, user_profile)
-                            
-                            # Generate content
-                            response = client.models.generate_content(
-                                model="gemini-2.5-flash-preview-04-17", 
-                                contents=[
-                                    genai.types.Part.from_bytes(
-                                        data=pdf_data,
-                                        mime_type='application/pdf',
-                                    ),
-                                    prompt
-                                ]
-                            )
-                            
-                            # Display result
-                            st.success("✅ Analysis complete!")
-                            
-                            # Add bordered container for result
-                            with st.container(border=True):
-                                st.subheader("🎯 Personalized analysis for your profile")
-                                st.caption(f"Field: {user_profile.field} | Level: {user_profile.knowledge_level} | Analogy style: {user_profile.analogy_style}")
-                                st.markdown(response.text)
-                            
-                            # Allow export of result
-                            st.download_button(
-                                label="📄 Download analysis as TXT",
-                                data=response.text,
-                                file_name=f"hikmamind_analysis_{uploaded_file.name.split('.')[0]}.txt",
-                                mime="text/plain"
-                            )
-                            
-                            # Image generation option
-                            with st.expander("Generate images to illustrate concepts"):
-                                st.info("You can generate images to help visualize complex concepts from the paper")
-                                image_prompt = st.text_area("Describe the image you want to generate:", 
-                                                        placeholder="E.g., Create a visual representation of neural networks as described in this paper",
-                                                        key="img_prompt_upload")
-                                
-                                if st.button("Generate Image", key="generate_img_upload") and image_prompt:
-                                    try:
-                                        with st.spinner("Generating image..."):
-                                            text_response, image_data = generate_image(client, image_prompt)
-                                            
-                                            if image_data:
-                                                st.image(Image.open(BytesIO(image_data)), caption="Generated Image")
-                                                st.download_button(
-                                                    label="Download Image",
-                                                    data=BytesIO(image_data).getvalue(),
-                                                    file_name="hikmamind_generated_image.png",
-                                                    mime="image/png"
-                                                )
-                                            if text_response:
-                                                st.write("AI comments on the image:")
-                                                st.write(text_response)
-                                    except Exception as e:
-                                        st.error(f"Error generating image: {str(e)}")
-                    except Exception as e:
-                        st.error(f"Error during analysis: {str(e)}")
+    # Spooled once per distinct document; analysis, questions and preview all read that copy
+    upload = get_upload_store().put(uploaded_file) if uploaded_file is not None else None
+    
+    def open_pdf():
+        # Jobs hold the upload in memory, within the store's budget, for as long as they use it
+        return get_upload_store().open(upload)
+    
+    # Stage large uploads through the Files API and check the cache before the click
+    session_id = get_session_id()
+    if upload is not None:
+        prefetch = get_prefetcher().start(session_id, "pdf_upload", prefetch_key(upload.doc_hash, user_profile),
+                                          prepare_upload, client, upload, user_profile)
+    else:
+        prefetch = None
+        get_prefetcher().cancel(session_id, "pdf_upload")
+    
+    # Only create multiple columns if showing original & file is uploaded
+    if show_original and upload is not None:
+        analysis_area, preview_area = st.columns([2, 3])
+    else:
+        analysis_area, preview_area = st.container(), None
+    
+    with analysis_area:
+        render_prefetch_status(prefetch)
+        if st.button("Analyze PDF", key="analyze_pdf_upload", disabled=upload is None):
+            # Run in the background so widget interactions don't cancel the analysis
+            job = get_job_manager().submit(
+                session_id, f"Analysis of {upload.name}", run_pdf_analysis_job,
+                client, open_pdf, pdf_upload_analogy_type, user_profile,
+                stream_results, chunked, page_range, upload.name, user=get_user_id()
+            )
+            st.session_state["pdf_upload_job"] = job.id
         
-        # Column 2: PDF preview 
-        with col2:
+        if upload is not None:
+            render_pdf_job(client, "pdf_upload_job", user_profile,
+                           f"hikmamind_analysis_{upload.name.split('.')[0]}.txt", open_pdf)
+    
+    if preview_area is not None:
+        with preview_area:
             st.header("Original document")
-            st.write(f"File: {uploaded_file.name}")
-            # Display PDF directly
+            st.write(f"File: {upload.name}")
             st.write("PDF preview:")
-            st.pdf(uploaded_file)
-    else:
-        # No columns, just use the main area
-        if st.button("Analyze PDF", key="analyze_pdf_upload", disabled=not uploaded_file):
-            if uploaded_file is not None:
-                try:
-                    with st.spinner("Analyzing PDF..."):
-                        # Read uploaded file
-                        pdf_data = uploaded_file.getvalue()
-                        
-                        # Prepare personalized prompt
-                        prompt = generate_prompt_for_pdf(pdf_upload_analogy_type, user_profile)
-                        
-                        # Generate content
-                        response = client.models.generate_content(
-                            model="gemini-2.5-flash-preview-04-17", 
-                            contents=[
-                                genai.types.Part.from_bytes(
-                                    data=pdf_data,
-                                    mime_type='application/pdf',
-                                ),
-                                prompt
-                            ]
-                        )
-                        
-                        # Display result
-                        st.success("✅ Analysis complete!")
-                        
-                        # Add bordered container for result
-                        with st.container(border=True):
-                            st.subheader("🎯 Personalized analysis for your profile")
-                            st.caption(f"Field: {user_profile.field} | Level: {user_profile.knowledge_level} | Analogy style: {user_profile.analogy_style}")
-                            st.markdown(response.text)
-                        
-                        # Allow export of result
-                        st.download_button(
-                            label="📄 Download analysis as TXT",
-                            data=response.text,
-                            file_name=f"hikmamind_analysis_{uploaded_file.name.split('.')[0]}.txt",
-                            mime="text/plain"
-                        )
-                        
-                        # Image generation option
-                        with st.expander("Generate images to illustrate concepts"):
-                            st.info("You can generate images to help visualize complex concepts from the paper")
-                            image_prompt = st.text_area("Describe the image you want to generate:", 
-                                                    placeholder="E.g., Create a visual representation of neural networks as described in this paper",
-                                                    key="img_prompt_upload")
-                            
-                            if st.button("Generate Image", key="generate_img_upload") and image_prompt:
-                                try:
-                                    with st.spinner("Generating image..."):
-                                        text_response, image_data = generate_image(client, image_prompt)
-                                        
-                                        if image_data:
-                                            st.image(Image.open(BytesIO(image_data)), caption="Generated Image")
-                                            st.download_button(
-                                                label="Download Image",
-                                                data=BytesIO(image_data).getvalue(),
-                                                file_name="hikmamind_generated_image.png",
-                                                mime="image/png"
-                                            )
-                                        if text_response:
-                                            st.write("AI comments on the image:")
-                                            st.write(text_response)
-                                except Exception as e:
-                                    st.error(f"Error generating image: {str(e)}")
-                except Exception as e:
-                    st.error(f"Error during analysis: {str(e)}")
+            st.pdf(upload.path)
@@ -0,0 +1,163 @@
+import time
+from dataclasses import dataclass
+from io import BytesIO
+from typing import Iterable, Iterator, List, Optional, Tuple
+
+from utils.cache import get_result_cache, hash_bytes, make_cache_key, response_text
+from utils.config import CHUNK_MAX_TOKENS, CHUNK_MAX_WORKERS
+from utils.jobs import map_bounded, report_progress
+from utils.lazy import lazy_import
+from utils.metrics import observe, timed
+from utils.scheduler import get_scheduler
+
+pypdf = lazy_import("pypdf")
+
+# Rough characters-per-token ratio used for local token estimates
+CHARS_PER_TOKEN = 4
+
+MAP_PROMPT = (
+    "You are reading pages {first}-{last} of a longer research document. "
+    "Write concise notes capturing the key ideas, methods, results, numbers and "
+    "definitions in this section. Do not add information that is not in the text."
+)
+
+REDUCE_PREAMBLE = (
+    "The document is too long to read at once, so it is provided below as notes "
+    "summarizing each section in order. Base your answer on these notes."
+)
+
+
+@dataclass
+class TextChunk:
+    """A run of consecutive pages whose text fits in one request"""
+    first_page: int
+    last_page: int
+    text: str
+
+
+def estimate_tokens(text: str) -> int:
+    """Cheap local token estimate"""
+    return len(text) // CHARS_PER_TOKEN + 1
+
+
+def count_pages(pdf_data: bytes) -> int:
+    """Return the number of pages in a PDF"""
+    return len(pypdf.PdfReader(BytesIO(pdf_data)).pages)
+
+
+def iter_page_text(pdf_data: bytes, first_page: int = 1, last_page: Optional[int] = None) -> Iterator[Tuple[int, str]]:
+    """Yield (page_number, text) for each page in the range, one page at a time.
+
+    Page numbers are 1-based and inclusive. pypdf parses pages lazily, so
+    only the page being extracted is held in memory.
+    """
+    reader = pypdf.PdfReader(BytesIO(pdf_data))
+    total = len(reader.pages)
+    last_page = min(last_page or total, total)
+    for number in range(max(first_page, 1), last_page + 1):
+        yield number, reader.pages[number - 1].extract_text() or ""
+
+
+def _split_text(text: str, max_chars: int) -> Iterator[str]:
+    """Split an oversized page on paragraph breaks, then hard-wrap"""
+    current = ""
+    for paragraph in text.split("\n\n"):
+        while len(paragraph) > max_chars:
+            if current:
+                yield current
+                current = ""
+            yield paragraph[:max_chars]
+            paragraph = paragraph[max_chars:]
+        if len(current) + len(paragraph) + 2 > max_chars and current:
+            yield current
+            current = ""
+        current = f"{current}\n\n{paragraph}" if current else paragraph
+    if current:
+        yield current
+
+
+def iter_chunks(pages: Iterable[Tuple[int, str]], max_tokens: int = CHUNK_MAX_TOKENS) -> Iterator[TextChunk]:
+    """Group consecutive pages into chunks of at most max_tokens (estimated)"""
+    max_chars = max_tokens * CHARS_PER_TOKEN
+    parts, first, last, size = [], None, None, 0
+    for number, text in pages:
+        for piece in _split_text(text, max_chars):
+            if parts and size + len(piece) > max_chars:
+                yield TextChunk(first, last, "\n\n".join(parts))
+                parts, first, size = [], None, 0
+            if first is None:
+                first = number
+            last = number
+            parts.append(piece)
+            size += len(piece) + 2
+    if parts:
+        yield TextChunk(first, last, "\n\n".join(parts))
+
+
+def extract_chunks(pdf_data: bytes, first_page: int = 1, last_page: Optional[int] = None,
+                   max_tokens: int = CHUNK_MAX_TOKENS) -> Iterator[TextChunk]:
+    """Yield the chunks of a page range as they are extracted.
+
+    The time spent extracting is recorded as one extract_text stage once
+    the chunks run out.
+    """
+    chunks = iter_chunks(iter_page_text(pdf_data, first_page, last_page), max_tokens)
+    seconds = 0.0
+    try:
+        while True:
+            start = time.perf_counter()
+            chunk = next(chunks, None)
+            seconds += time.perf_counter() - start
+            if chunk is None:
+                return
+            yield chunk
+    finally:
+        observe("extract_text", seconds, len(pdf_data))
+
+
+def _summarize_chunk(client, chunk: TextChunk, model: str) -> str:
+    prompt = MAP_PROMPT.format(first=chunk.first_page, last=chunk.last_page)
+    cache = get_result_cache()
+    key = make_cache_key(hash_bytes(chunk.text.encode("utf-8")), prompt, model)
+    cached = cache.get(key)
+    if cached is not None:
+        return cached
+
+    with timed("model.chunk", model) as timer:
+        response = get_scheduler().run(
+            lambda: client.models.generate_content(model=model, contents=[chunk.text, prompt]),
+            key=key, timer=timer
+        )
+    text = response_text(response)
+    cache.set(key, text)
+    return text
+
+
+def summarize_chunks(client, pdf_data: bytes, model: str, page_range: Optional[Tuple[int, int]] = None,
+                     max_tokens: int = CHUNK_MAX_TOKENS, max_workers: int = CHUNK_MAX_WORKERS) -> List[Tuple[Tuple[int, int], str]]:
+    """Extract text locally and summarize each chunk in parallel (the map step).
+
+    Chunks are summarized while the following pages are still being
+    extracted, and each chunk's text is released once summarized. Returns
+    ((first_page, last_page), summary) pairs in document order.
+    """
+    def summarize(chunk: TextChunk):
+        return (chunk.first_page, chunk.last_page), _summarize_chunk(client, chunk, model)
+
+    first_page, last_page = page_range or (1, None)
+    chunks = extract_chunks(pdf_data, first_page, last_page, max_tokens)
+    summaries = {}
+    for index, summary in map_bounded(summarize, chunks, max_workers):
+        summaries[index] = summary
+        report_progress(message=f"Summarized {len(summaries)} sections...")
+    if not summaries:
+        raise ValueError("No extractable text found in the selected pages")
+    return [summaries[index] for index in range(len(summaries))]
+
+
+def build_section_notes(summaries: List[Tuple[Tuple[int, int], str]]) -> str:
+    """Join chunk summaries into the text used for the reduce step"""
+    sections = "\n\n".join(
+        f"[Pages {first_page}-{last_page}]\n{summary}" for (first_page, last_page), summary in summaries
+    )
+    return f"{REDUCE_PREAMBLE}\n\n{sections}"
@@ -0,0 +1,203 @@
+import os
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+from dataclasses import dataclass, field
+from typing import Callable, List, Optional
+
+from models.user_profile import UserProfile
+from services.document_registry import get_document_registry
+from services.pdf_analysis import cached_pdf_types
+from services.preflight import InputSize, size_pdf, size_video
+from services.upload_store import StoredUpload, get_upload_store
+from services.video_analysis import cached_video_types, load_transcript
+from utils.config import PREFETCH_ENABLED, PREFETCH_MAX_WORKERS
+from utils.http_client import DownloadCancelled, fetch_pdf
+from utils.prompts import profile_key
+from utils.youtube_url import VideoRef
+
+# Inputs tracked at once, across sessions; the least recently started are dropped first
+MAX_PREFETCHES = 64
+# Prefetches not taken by a job within this time are dropped
+PREFETCH_TTL_SECONDS = 15 * 60
+
+
+@dataclass
+class Prepared:
+    """What a prefetch produced: the input's pre-flight size, the spooled document (PDFs only) and
+    the already cached analysis types"""
+    doc_hash: str
+    size: InputSize
+    upload: Optional[StoredUpload] = None
+    cached_types: List[str] = field(default_factory=list)
+
+
+class Prefetch:
+    """One input being prepared in the background"""
+
+    def __init__(self, key: tuple, future, cancel: threading.Event):
+        self.key = key
+        self.future = future
+        self.cancel = cancel
+        self.started = time.monotonic()
+
+    @property
+    def ready(self) -> Optional[Prepared]:
+        """The prepared input, or None while running, after a failure or once cancelled"""
+        if self.cancel.is_set() or not self.future.done() or self.future.exception() is not None:
+            return None
+        return self.future.result()
+
+
+class Prefetcher:
+    """Prepare inputs while the user is still choosing options.
+
+    As soon as a URL is entered or a file uploaded, the document is
+    downloaded, validated, hashed, staged through the Files API when large,
+    and checked against the result cache, on a small pool of its own. Each
+    (session, slot) tracks one input: entering another input cancels the
+    previous prefetch. A job then takes the prepared document through
+    open(), falling back to doing the work itself. A dropped prefetch
+    (superseded, cancelled, expired or evicted) deletes the speculative
+    copy it spooled, unless a job has opened it.
+    """
+
+    def __init__(self, max_workers: int = PREFETCH_MAX_WORKERS, enabled: bool = PREFETCH_ENABLED):
+        self.enabled = enabled and max_workers > 0
+        self.hits = 0
+        self._pool = ThreadPoolExecutor(max_workers=max(1, max_workers), thread_name_prefix="hikmamind-prefetch")
+        self._slots = OrderedDict()
+        self._lock = threading.Lock()
+
+    def start(self, session_id: str, slot: str, key: tuple, fn, *args) -> Optional[Prefetch]:
+        """Run fn(cancel, *args) for the input identified by key, unless it is already prefetched"""
+        if not self.enabled:
+            return None
+        with self._lock:
+            self._expire()
+            current = self._slots.get((session_id, slot))
+            if current is not None and current.key == key and not current.cancel.is_set():
+                return current
+            if current is not None:
+                self._drop(current)
+            cancel = threading.Event()
+            prefetch = Prefetch(key, self._pool.submit(fn, cancel, *args), cancel)
+            self._slots[(session_id, slot)] = prefetch
+            self._slots.move_to_end((session_id, slot))
+            while len(self._slots) > MAX_PREFETCHES:
+                _, dropped = self._slots.popitem(last=False)
+                self._drop(dropped)
+            return prefetch
+
+    def _expire(self):
+        # Slots are in start order, so expired ones are at the front
+        now = time.monotonic()
+        while self._slots:
+            slot, prefetch = next(iter(self._slots.items()))
+            if now - prefetch.started <= PREFETCH_TTL_SECONDS:
+                return
+            del self._slots[slot]
+            self._drop(prefetch)
+
+    @staticmethod
+    def _drop(prefetch: Prefetch):
+        prefetch.cancel.set()
+        prefetch.future.add_done_callback(_discard_prepared)
+
+    def get(self, session_id: str, slot: str, key: tuple) -> Optional[Prefetch]:
+        with self._lock:
+            prefetch = self._slots.get((session_id, slot))
+        return prefetch if prefetch is not None and prefetch.key == key else None
+
+    def cancel(self, session_id: str, slot: str):
+        """Abandon a slot's prefetch, e.g. when its input was cleared"""
+        with self._lock:
+            prefetch = self._slots.pop((session_id, slot), None)
+        if prefetch is not None:
+            self._drop(prefetch)
+
+    @contextmanager
+    def open(self, session_id: str, slot: str, key: tuple, fallback: Callable[[], bytes]):
+        """Yield the prefetched document for key, waiting for a prefetch still in flight.
+        
+        The document is held through the upload store for the whole block;
+        without a usable prefetch, fallback() provides it.
+        """
+        prefetch = self.get(session_id, slot, key)
+        prepared = None
+        if prefetch is not None and not prefetch.cancel.is_set():
+            try:
+                prepared = prefetch.future.result()
+            except Exception:
+                # Report the failure from a fresh attempt, in the job that needs the document
+                prepared = None
+        if prepared is not None and prepared.upload is not None and os.path.exists(prepared.upload.path):
+            self.hits += 1
+            with get_upload_store().open(prepared.upload) as pdf_data:
+                yield pdf_data
+        else:
+            yield fallback()
+
+
+def _discard_prepared(future):
+    if future.cancelled() or future.exception() is not None:
+        return
+    prepared = future.result()
+    if prepared.upload is not None:
+        get_upload_store().discard_speculative(prepared.upload)
+
+
+def _stage(client, cancel: threading.Event, pdf_data: bytes, doc_hash: str):
+    # Large documents are uploaded through the Files API now rather than after the click
+    if client is not None and not cancel.is_set():
+        get_document_registry().get_part(client, pdf_data, doc_hash)
+
+
+def prepare_pdf_url(cancel: threading.Event, client, pdf_url: str, user_profile: UserProfile) -> Prepared:
+    """Download, validate, hash, spool and stage a PDF URL, and check which analyses are cached.
+    
+    The document is spooled into the upload store as a speculative copy,
+    not kept in memory, and is deleted again if no job ever opens it.
+    """
+    pdf_data = fetch_pdf(pdf_url, cancel=cancel)
+    if cancel.is_set():
+        raise DownloadCancelled(f"Prefetch of {pdf_url} was cancelled")
+    upload = get_upload_store().put_bytes(pdf_data, pdf_url, speculative=True)
+    _stage(client, cancel, pdf_data, upload.doc_hash)
+    size = size_pdf(pdf_data)
+    return Prepared(upload.doc_hash, size, upload, cached_pdf_types(upload.doc_hash, user_profile, size.tokens))
+
+
+def prepare_upload(cancel: threading.Event, client, upload: StoredUpload, user_profile: UserProfile) -> Prepared:
+    """Size and stage an uploaded PDF (already spooled and hashed) and check which analyses are cached"""
+    with get_upload_store().open(upload) as pdf_data:
+        size = size_pdf(pdf_data)
+        if upload.size > get_document_registry().inline_limit:
+            _stage(client, cancel, pdf_data, upload.doc_hash)
+    return Prepared(upload.doc_hash, size, upload, cached_pdf_types(upload.doc_hash, user_profile, size.tokens))
+
+
+def prepare_video(cancel: threading.Event, video: VideoRef, use_transcript: bool, user_profile: UserProfile) -> Prepared:
+    """Fetch (and cache) a video's transcript and check which analyses are cached"""
+    transcript = load_transcript(video) if use_transcript else None
+    return Prepared(video.key, size_video(video, transcript), None, cached_video_types(video, transcript, user_profile))
+
+
+def prefetch_key(source, user_profile: UserProfile, *options) -> tuple:
+    """Identify an input together with what its cache check depends on"""
+    return (source,) + options + profile_key(user_profile)
+
+
+_prefetcher = None
+_prefetcher_lock = threading.Lock()
+
+
+def get_prefetcher() -> Prefetcher:
+    """Return the process-wide prefetcher"""
+    global _prefetcher
+    with _prefetcher_lock:
+        if _prefetcher is None:
+            _prefetcher = Prefetcher()
+        return _prefetcher
@@ -0,0 +1,118 @@
+from contextlib import contextmanager
+from dataclasses import dataclass
+from typing import Optional
+
+from services.pdf_text import count_pages, estimate_tokens
+from utils.budget import get_token_budget
+from utils.config import (
+    MODELS,
+    ROUTING_ENABLED,
+    ROUTING_FAST_MAX_TOKENS,
+    ROUTING_FAST_TIER,
+    ROUTING_MAX_INPUT_TOKENS,
+    TOKEN_BUDGET_DOWNGRADE_AT,
+)
+from utils.jobs import LOCAL_USER, current_job, metered
+from utils.youtube_url import VideoRef
+
+# Gemini bills each PDF page as one image of this many tokens
+PDF_TOKENS_PER_PAGE = 258
+# Video frames (one per second) and audio at the default media resolution
+VIDEO_TOKENS_PER_SECOND = 300
+# Length assumed for a full video, whose duration is not known locally
+ASSUMED_VIDEO_SECONDS = 600
+# Page size assumed for a PDF whose pages cannot be counted locally
+ASSUMED_BYTES_PER_PAGE = 100 * 1024
+# Output allowance added to each estimate when reserving budget
+OUTPUT_TOKENS = 2048
+
+
+class InputTooLarge(Exception):
+    """Raised when an input is estimated above the per-request token limit"""
+
+
+@dataclass
+class InputSize:
+    """What a request will send, measured locally before the call"""
+    bytes: int
+    tokens: int
+    pages: Optional[int] = None
+
+    def describe(self) -> str:
+        pages = f"{self.pages} pages, " if self.pages is not None else ""
+        return f"{pages}~{self.tokens:,} tokens"
+
+
+def size_pdf(pdf_data: bytes, chunked: bool = False, page_range=None) -> InputSize:
+    """Estimate a PDF's tokens from its page count (only the pages in range in large document mode)"""
+    try:
+        pages = count_pages(pdf_data)
+    except Exception:
+        # The model may still read a PDF pypdf cannot parse
+        pages = None
+    sent = pages if pages is not None else max(1, len(pdf_data) // ASSUMED_BYTES_PER_PAGE)
+    if chunked and page_range is not None:
+        first_page, last_page = page_range
+        sent = max(0, min(last_page or sent, sent) - max(first_page, 1) + 1)
+    return InputSize(len(pdf_data), sent * PDF_TOKENS_PER_PAGE, pages)
+
+
+def size_text(text: str) -> InputSize:
+    return InputSize(len(text.encode("utf-8")), estimate_tokens(text))
+
+
+def size_video(video: VideoRef, transcript: str = None) -> InputSize:
+    """Estimate a video's tokens from its transcript, or from the clip length for the full video"""
+    if transcript is not None:
+        return size_text(transcript)
+    seconds = video.end - (video.start or 0) if video.end is not None else ASSUMED_VIDEO_SECONDS
+    return InputSize(0, max(1, seconds) * VIDEO_TOKENS_PER_SECOND)
+
+
+def fast_model() -> str:
+    """Return the model of the fast (and cheapest) routing tier"""
+    return MODELS.get(ROUTING_FAST_TIER, ROUTING_FAST_TIER)
+
+
+def route_model(model: str, tokens: Optional[int]) -> str:
+    """Return the model for an input of this size: the fast tier for small inputs, otherwise model"""
+    if not ROUTING_ENABLED or tokens is None or tokens > ROUTING_FAST_MAX_TOKENS:
+        return model
+    return fast_model()
+
+
+def current_user() -> str:
+    """Budget owner of the running request: the session of the current job, if any"""
+    job = current_job()
+    return job.session_id if job is not None else LOCAL_USER
+
+
+def plan_model(model: str, size: InputSize, user: str = None) -> str:
+    """Check an input against the per-request limit and downgrade it under budget pressure.
+
+    Raises InputTooLarge. Once the user's or the process's budget is mostly
+    spent, requests move to the fast tier before they start being rejected.
+    """
+    if ROUTING_MAX_INPUT_TOKENS > 0 and size.tokens > ROUTING_MAX_INPUT_TOKENS:
+        raise InputTooLarge(
+            f"This input is estimated at {size.describe()}, above the limit of {ROUTING_MAX_INPUT_TOKENS:,} "
+            f"tokens per request. Use large document mode with a page range, or a shorter clip."
+        )
+    if ROUTING_ENABLED and get_token_budget().pressure(user or current_user()) >= TOKEN_BUDGET_DOWNGRADE_AT:
+        return fast_model()
+    return model
+
+
+@contextmanager
+def token_budget(size: InputSize, user: str = None):
+    """Reserve an input's estimated tokens, plus an output allowance, for the duration of a request.
+
+    Raises BudgetExceeded. The reservation is then settled to the tokens
+    this request's model calls actually used, so cache hits cost nothing.
+    """
+    with get_token_budget().reserve(user or current_user(), size.tokens + OUTPUT_TOKENS) as reservation:
+        with metered() as meter:
+            try:
+                yield reservation
+            finally:
+                reservation.used = meter.tokens
@@ -0,0 +1,132 @@
+import json
+import os
+import threading
+from typing import List, Optional, Tuple
+
+from utils.cache import ResultCache
+from utils.config import CACHE_DIR, TRANSCRIPT_FIXTURES_DIR, TRANSCRIPT_LANGUAGES
+from utils.metrics import timed
+
+# A transcript is a list of (start_seconds, text) segments; start is None when untimed
+Segments = List[Tuple[Optional[float], str]]
+
+
+def join_segments(segments: Segments, start: int = None, end: int = None) -> Optional[str]:
+    """Return the transcript text, restricted to [start, end) seconds when given.
+
+    Returns None when a range is requested but the transcript has no timings.
+    """
+    if start is not None or end is not None:
+        if any(offset is None for offset, _ in segments):
+            return None
+        segments = [
+            (offset, text) for offset, text in segments
+            if (start is None or offset >= start) and (end is None or offset < end)
+        ]
+    return " ".join(text.strip() for _, text in segments if text.strip()) or None
+
+
+class YouTubeTranscriptFetcher:
+    """Fetches captions through the optional youtube-transcript-api package"""
+
+    name = "youtube-transcript-api"
+
+    def fetch(self, video_id: str) -> Optional[Segments]:
+        """Return the timed transcript segments, or None when the video has none"""
+        try:
+            from youtube_transcript_api import NoTranscriptFound, TranscriptsDisabled, YouTubeTranscriptApi
+        except ImportError:
+            return None
+
+        try:
+            if hasattr(YouTubeTranscriptApi, "get_transcript"):
+                snippets = YouTubeTranscriptApi.get_transcript(video_id, languages=TRANSCRIPT_LANGUAGES)
+                segments = [(snippet["start"], snippet["text"]) for snippet in snippets]
+            else:
+                snippets = YouTubeTranscriptApi().fetch(video_id, languages=TRANSCRIPT_LANGUAGES)
+                segments = [(snippet.start, snippet.text) for snippet in snippets]
+        except (NoTranscriptFound, TranscriptsDisabled):
+            return None
+        return [(offset, text) for offset, text in segments if text.strip()] or None
+
+
+class FixtureTranscriptFetcher:
+    """Reads transcripts from <directory>/<video_id>.json or .txt; used for tests and offline runs.
+
+    A .json fixture is a list of {"start": seconds, "text": ...} objects; a
+    .txt fixture is a single untimed segment.
+    """
+
+    name = "fixtures"
+
+    def __init__(self, directory: str):
+        self.directory = directory
+
+    def fetch(self, video_id: str) -> Optional[Segments]:
+        path = os.path.join(self.directory, f"{video_id}.json")
+        if os.path.exists(path):
+            with open(path, encoding="utf-8") as f:
+                return [(float(item["start"]), item["text"]) for item in json.load(f)] or None
+        path = os.path.join(self.directory, f"{video_id}.txt")
+        if not os.path.exists(path):
+            return None
+        with open(path, encoding="utf-8") as f:
+            text = f.read().strip()
+        return [(None, text)] if text else None
+
+
+_fetcher = None
+_transcript_cache = None
+_lock = threading.Lock()
+
+
+def set_transcript_fetcher(fetcher):
+    """Replace the transcript fetcher (any object with fetch(video_id) -> Optional[Segments])"""
+    global _fetcher
+    with _lock:
+        _fetcher = fetcher
+
+
+def get_transcript_fetcher():
+    global _fetcher
+    with _lock:
+        if _fetcher is None:
+            if TRANSCRIPT_FIXTURES_DIR:
+                _fetcher = FixtureTranscriptFetcher(TRANSCRIPT_FIXTURES_DIR)
+            else:
+                _fetcher = YouTubeTranscriptFetcher()
+        return _fetcher
+
+
+def get_transcript_cache() -> ResultCache:
+    """Return the persistent per-video transcript cache"""
+    global _transcript_cache
+    with _lock:
+        if _transcript_cache is None:
+            _transcript_cache = ResultCache(os.path.join(CACHE_DIR, "transcripts.sqlite3"), name="transcript")
+        return _transcript_cache
+
+
+def get_segments(video_id: str) -> Optional[Segments]:
+    """Return the timed transcript of a video, fetching it at most once.
+
+    A video without a transcript is cached as an empty list so the
+    fetcher is not asked again; fetch errors are not cached.
+    """
+    cache = get_transcript_cache()
+    cached = cache.get(f"segments:{video_id}")
+    if cached is not None:
+        return [tuple(segment) for segment in json.loads(cached)] or None
+
+    fetcher = get_transcript_fetcher()
+    with timed("transcript") as timer:
+        segments = fetcher.fetch(video_id)
+        timer.bytes = sum(len(text) for _, text in segments or [])
+    cache.set(f"segments:{video_id}", json.dumps(segments or []))
+    return segments
+
+
+def get_transcript(video_id: str, start: int = None, end: int = None) -> Optional[str]:
+    """Return the transcript text of a video, or of the [start, end) clip"""
+    segments = get_segments(video_id)
+    return join_segments(segments, start, end) if segments else None
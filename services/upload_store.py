@@ -0,0 +1,200 @@
+import hashlib
+import os
+import tempfile
+import threading
+import time
+from collections import OrderedDict
+from contextlib import contextmanager
+from dataclasses import dataclass
+
+from utils.config import UPLOAD_DIR, UPLOAD_DISK_MAX_BYTES, UPLOAD_MAX_AGE_SECONDS, UPLOAD_MEMORY_BUDGET_BYTES
+from utils.metrics import timed
+
+# Streamlit file ids remembered so reruns don't hash the same upload again
+MAX_KNOWN_FILE_IDS = 256
+
+
+@dataclass(frozen=True)
+class StoredUpload:
+    """An uploaded PDF spooled to disk, identified by the SHA-256 of its bytes"""
+    doc_hash: str
+    name: str
+    size: int
+    path: str
+
+
+class UploadStore:
+    """Keep each distinct upload once on disk and at most once in memory.
+
+    put() hashes the upload through a zero-copy view of its buffer and
+    spools it under its hash, so identical uploads from any session share
+    one file. open() hands out a single shared bytes object per document
+    and accounts for it against memory_budget: when the documents in use
+    would exceed the budget, it waits for others to be released. Released
+    documents stay in memory until the space is needed. Spooled files
+    unused for max_age seconds, or beyond disk_budget bytes, are deleted
+    (least recently used first) whenever a new document is spooled.
+    Speculative copies (put_bytes(..., speculative=True)) are deleted by
+    discard_speculative() unless they have been opened since.
+    """
+
+    def __init__(self, directory: str = UPLOAD_DIR, memory_budget: int = UPLOAD_MEMORY_BUDGET_BYTES,
+                 disk_budget: int = UPLOAD_DISK_MAX_BYTES, max_age: float = UPLOAD_MAX_AGE_SECONDS):
+        self.directory = directory
+        self.memory_budget = memory_budget
+        self.disk_budget = disk_budget
+        self.max_age = max_age
+        self.loads = 0
+        self.reuses = 0
+        self._resident = OrderedDict()  # doc_hash -> [data, users]
+        self._resident_bytes = 0
+        self._file_ids = OrderedDict()
+        self._speculative = set()
+        self._cond = threading.Condition()
+        os.makedirs(directory, exist_ok=True)
+
+    def put(self, uploaded_file) -> StoredUpload:
+        """Spool an uploaded file (any BytesIO-like object) and return its handle"""
+        file_id = getattr(uploaded_file, "file_id", None)
+        with self._cond:
+            stored = self._file_ids.get(file_id) if file_id else None
+        if stored is not None and os.path.exists(stored.path):
+            return stored
+
+        view = uploaded_file.getbuffer()
+        try:
+            stored = self.put_bytes(view, uploaded_file.name)
+        finally:
+            view.release()
+
+        if file_id:
+            with self._cond:
+                self._file_ids[file_id] = stored
+                while len(self._file_ids) > MAX_KNOWN_FILE_IDS:
+                    self._file_ids.popitem(last=False)
+        return stored
+
+    def put_bytes(self, data, name: str, speculative: bool = False) -> StoredUpload:
+        """Spool a document given as bytes (or a memoryview) and return its handle.
+        
+        A speculative document that was not already stored can be deleted
+        again with discard_speculative() as long as nobody opened it.
+        """
+        with timed("spool_upload") as timer:
+            timer.bytes = len(data)
+            doc_hash = hashlib.sha256(data).hexdigest()
+            path = os.path.join(self.directory, f"{doc_hash}.pdf")
+            if os.path.exists(path):
+                os.utime(path)
+                if not speculative:
+                    # A real upload of the same document keeps the file
+                    with self._cond:
+                        self._speculative.discard(doc_hash)
+            else:
+                fd, tmp_path = tempfile.mkstemp(dir=self.directory, suffix=".part")
+                with os.fdopen(fd, "wb") as f:
+                    f.write(data)
+                os.replace(tmp_path, path)
+                if speculative:
+                    with self._cond:
+                        self._speculative.add(doc_hash)
+                self._prune_disk(keep=doc_hash)
+        return StoredUpload(doc_hash, name, len(data), path)
+
+    def _prune_disk(self, keep: str):
+        # Delete expired files, then the least recently used ones until the rest fit the disk budget
+        now = time.time()
+        files = []
+        for entry in os.scandir(self.directory):
+            if entry.name.endswith(".pdf"):
+                stat = entry.stat()
+                files.append((stat.st_mtime, stat.st_size, entry.path, entry.name[:-len(".pdf")]))
+        total = sum(size for _, size, _, _ in files)
+        with self._cond:
+            in_use = {doc_hash for doc_hash, (_, users) in self._resident.items() if users}
+        for mtime, size, path, doc_hash in sorted(files):
+            if doc_hash == keep or doc_hash in in_use:
+                continue
+            if total <= self.disk_budget and now - mtime <= self.max_age:
+                continue
+            try:
+                os.remove(path)
+            except OSError:
+                continue
+            total -= size
+            with self._cond:
+                self._speculative.discard(doc_hash)
+
+    def discard_speculative(self, upload: StoredUpload):
+        """Delete a speculative document that was never opened"""
+        with self._cond:
+            if upload.doc_hash not in self._speculative:
+                return
+            self._speculative.discard(upload.doc_hash)
+            try:
+                os.remove(upload.path)
+            except OSError:
+                pass
+
+    def _evict(self, needed: int):
+        # Drop released documents, least recently used first, until needed bytes fit
+        for doc_hash in list(self._resident):
+            if self._resident_bytes + needed <= self.memory_budget:
+                return
+            data, users = self._resident[doc_hash]
+            if users == 0:
+                del self._resident[doc_hash]
+                self._resident_bytes -= len(data)
+
+    def _in_use(self) -> bool:
+        return any(users for _, users in self._resident.values())
+
+    @contextmanager
+    def open(self, upload: StoredUpload):
+        """Yield the document bytes, waiting while the memory budget is exhausted"""
+        with self._cond:
+            while True:
+                entry = self._resident.get(upload.doc_hash)
+                if entry is not None:
+                    self.reuses += 1
+                    break
+                self._evict(upload.size)
+                # A document larger than the whole budget still runs, alone
+                if self._resident_bytes + upload.size <= self.memory_budget or not self._in_use():
+                    try:
+                        with open(upload.path, "rb") as f:
+                            entry = [f.read(), 0]
+                    except FileNotFoundError:
+                        raise FileNotFoundError(f"{upload.name} is no longer available, please upload it again") from None
+                    self._resident[upload.doc_hash] = entry
+                    self._resident_bytes += len(entry[0])
+                    self.loads += 1
+                    break
+                self._cond.wait()
+            entry[1] += 1
+            self._resident.move_to_end(upload.doc_hash)
+            self._speculative.discard(upload.doc_hash)
+        try:
+            # Recently used files are the last to be pruned from disk
+            os.utime(upload.path)
+        except OSError:
+            pass
+        try:
+            yield entry[0]
+        finally:
+            with self._cond:
+                entry[1] -= 1
+                self._cond.notify_all()
+
+
+_upload_store = None
+_upload_store_lock = threading.Lock()
+
+
+def get_upload_store() -> UploadStore:
+    """Return the process-wide upload store"""
+    global _upload_store
+    with _upload_store_lock:
+        if _upload_store is None:
+            _upload_store = UploadStore()
+        return _upload_store
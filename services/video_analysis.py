@@ -0,0 +1,184 @@
+import time
+from contextlib import nullcontext
+
+from models.user_profile import UserProfile
+from services.preflight import plan_model, route_model, size_video, token_budget
+from services.transcript_service import get_transcript
+from utils.config import get_model
+from utils.history import record_analysis
+from utils.jobs import current_job, report_progress
+from utils.metrics import instrument_stream, timed
+from utils.scheduler import get_scheduler
+from utils.cache import cached_stream, get_result_cache, hash_bytes, make_cache_key, response_text
+from utils.prompts import analysis_types, render_prompt
+from utils.youtube_url import VideoRef, as_video_ref, parse_timestamp, parse_youtube_url
+from utils.lazy import lazy_import
+
+genai = lazy_import("google.genai")
+
+VIDEO_ANALYSIS_TYPES = analysis_types("video")
+
+def generate_prompt_for_youtube(analogy_type, user_profile):
+    """Return the prompt for an analysis type and user profile (rendered once per profile)."""
+    return render_prompt("video", analogy_type, user_profile)
+
+def video_model_for(analogy_type: str, tokens: int = None) -> str:
+    """Return the model used for an analysis type; short summaries and short inputs use a cheaper model"""
+    task = "video_summary" if analogy_type == "Simple summary (3 sentences)" else "video_analysis"
+    return route_model(get_model(task), tokens)
+
+TRANSCRIPT_PREAMBLE = "The video is provided below as its transcript."
+
+def _video_source_hash(video: VideoRef, transcript: str = None) -> str:
+    # Keyed on the canonical video id and clip, so every URL form of a video shares results
+    return hash_bytes((transcript if transcript is not None else video.key).encode("utf-8"))
+
+def _video_metadata(video: VideoRef):
+    if not video.is_clip:
+        return None
+    return genai.types.VideoMetadata(
+        start_offset=f"{video.start}s" if video.start is not None else None,
+        end_offset=f"{video.end}s" if video.end is not None else None
+    )
+
+def _video_contents(video: VideoRef, prompt: str, transcript: str = None):
+    # Transcript mode sends text only, so the model never ingests the video frames
+    if transcript is not None:
+        return genai.types.Content(
+            parts=[
+                genai.types.Part(text=f"{TRANSCRIPT_PREAMBLE}\n\n{transcript}"),
+                genai.types.Part(text=prompt)
+            ]
+        )
+    # For a clip, the offsets make the model process only that part of the video
+    return genai.types.Content(
+        parts=[
+            genai.types.Part(
+                file_data=genai.types.FileData(file_uri=video.url),
+                video_metadata=_video_metadata(video)
+            ),
+            genai.types.Part(text=prompt)
+        ]
+    )
+
+def analyze_video_url(client, yt_url, prompt: str, model: str = None, transcript: str = None,
+                      cache_model: str = None) -> str:
+    """Analyze a YouTube video (URL or VideoRef) with the given prompt, reusing cached results when possible.
+    
+    The result is cached under cache_model's key when given, so it can be
+    found by requests that asked for that model.
+    """
+    video = as_video_ref(yt_url)
+    model = model or get_model("video_analysis")
+    cache = get_result_cache()
+    key = make_cache_key(_video_source_hash(video, transcript), prompt, cache_model or model)
+    cached = cache.get(key)
+    if cached is not None:
+        return cached
+    
+    with timed("model.video", model) as timer:
+        response = get_scheduler().run(lambda: client.models.generate_content(
+            model=model,
+            contents=_video_contents(video, prompt, transcript)
+        ), key=key, timer=timer)
+    text = response_text(response)
+    cache.set(key, text)
+    return text
+
+def stream_video_analysis(client, yt_url, prompt: str, model: str = None, transcript: str = None,
+                          cache_model: str = None):
+    """Yield the analysis text chunk by chunk as the model generates it (cached like analyze_video_url)"""
+    video = as_video_ref(yt_url)
+    model = model or get_model("video_analysis")
+    key = make_cache_key(_video_source_hash(video, transcript), prompt, cache_model or model)
+    return cached_stream(key, lambda: instrument_stream(lambda timer: get_scheduler().stream(
+        lambda: client.models.generate_content_stream(
+            model=model,
+            contents=_video_contents(video, prompt, transcript)
+        ), key=key, timer=timer
+    ), "model.video", model))
+
+def load_transcript(yt_url):
+    """Return the cached or freshly fetched transcript of a video or clip, or None"""
+    try:
+        video = as_video_ref(yt_url)
+        return get_transcript(video.video_id, video.start, video.end)
+    except Exception:
+        # Any fetcher failure just means we fall back to the full video
+        return None
+
+def cached_video_types(video: VideoRef, transcript: str, user_profile: UserProfile) -> list:
+    """Return the analysis types whose result for this video (or transcript) and profile is already cached"""
+    cache = get_result_cache()
+    source_hash = _video_source_hash(video, transcript)
+    tokens = size_video(video, transcript).tokens
+    return [
+        analysis_type for analysis_type in VIDEO_ANALYSIS_TYPES
+        if cache.contains(make_cache_key(source_hash, generate_prompt_for_youtube(analysis_type, user_profile),
+                                         video_model_for(analysis_type, tokens)))
+    ]
+
+def plan_video_analysis(video: VideoRef, transcript: str, prompt: str, analysis_type: str,
+                        model: str = None, user: str = None):
+    """Size a video (or its transcript) locally and pick its model; returns (size, model, cache_model, budget).
+    
+    An explicit model is kept unless budget pressure downgrades it; either
+    way the result is cached under the key of cache_model, the model that
+    was asked for. budget is a reservation on the token budgets, or
+    nothing when the result is already cached.
+    """
+    size = size_video(video, transcript)
+    cache_model = model or video_model_for(analysis_type, size.tokens)
+    if get_result_cache().contains(make_cache_key(_video_source_hash(video, transcript), prompt, cache_model)):
+        return size, cache_model, cache_model, nullcontext()
+    return size, plan_model(cache_model, size, user), cache_model, token_budget(size, user)
+
+def run_video_analysis_job(client, yt_url, prompt: str, stream: bool = True, model: str = None,
+                           use_transcript: bool = True, analysis_type: str = "", user_profile: UserProfile = None):
+    """Body of a background video analysis job.
+    
+    In transcript mode the analysis runs on the video's transcript and falls
+    back to the full video when no transcript exists. The finished analysis
+    is recorded in the history.
+    """
+    job = current_job()
+    start = time.perf_counter()
+    video = as_video_ref(yt_url)
+    transcript = None
+    if use_transcript:
+        report_progress(0.05, "Fetching transcript...")
+        transcript = load_transcript(video)
+    size, model, cache_model, budget = plan_video_analysis(video, transcript, prompt, analysis_type, model)
+    report_progress(0.1, f"Analyzing {'transcript' if transcript else 'video'} ({size.describe()}) "
+                         f"with {model.split('/')[-1]}...")
+    with budget:
+        if stream and job is not None:
+            for chunk in stream_video_analysis(client, video, prompt, model, transcript, cache_model):
+                job.append(chunk)
+            result = job.partial
+        else:
+            result = analyze_video_url(client, video, prompt, model, transcript, cache_model)
+    record_analysis(
+        "video", video.label, _video_source_hash(video), analysis_type, result,
+        user_profile, model, time.perf_counter() - start, "Transcript" if transcript else "Full video"
+    )
+    return result
+
+def parse_video_input(yt_url: str, start: str = "", end: str = "") -> VideoRef:
+    """Validate a URL and optional start/end timestamps; raises InvalidYouTubeURL"""
+    return parse_youtube_url(yt_url).with_range(parse_timestamp(start), parse_timestamp(end))
+
+def analyze_video(client, yt_url, analysis_type: str, user_profile: UserProfile, use_transcript: bool = True,
+                  user: str = None) -> str:
+    """Analyze a YouTube video (URL or VideoRef, optionally a clip) and return the text.
+    
+    This is the headless entry point used by the CLI; it needs no Streamlit
+    session. Raises InvalidYouTubeURL for anything that is not a video URL.
+    Tokens are charged to `user`'s budget.
+    """
+    video = as_video_ref(yt_url)
+    transcript = load_transcript(video) if use_transcript else None
+    prompt = generate_prompt_for_youtube(analysis_type, user_profile)
+    _, model, cache_model, budget = plan_video_analysis(video, transcript, prompt, analysis_type, user=user)
+    with budget:
+        return analyze_video_url(client, video, prompt, model, transcript, cache_model)
@@ -1,27 +1,17 @@
 import streamlit as st
-from google import genai
 from models.user_profile import UserProfile
+from services.video_analysis import (
+    VIDEO_ANALYSIS_TYPES,
+    generate_prompt_for_youtube,
+    parse_video_input,
+    run_video_analysis_job,
+)
+from services.prefetch import get_prefetcher, prefetch_key, prepare_video
+from utils.jobs import get_job_manager
+from utils.ui_components import fragment, get_session_id, get_user_id, render_job_progress, render_prefetch_status
+from utils.youtube_url import InvalidYouTubeURL
 
-def generate_prompt_for_youtube(analogy_type, user_profile):
-    """Generate a simple English prompt string based on analysis type and user profile."""
-    if analogy_type == "Simple summary (3 sentences)":
-        base_prompt = "Please summarize this video in 3 sentences."
-    elif analogy_type == "Detailed analogy":
-        base_prompt = "Explain the key concepts of this video using simple, familiar analogies."
-    elif analogy_type == "Key points":
-        base_prompt = "List and explain the 5 key points of this video."
-    else:  # Beginner explanation
-        base_prompt = "Explain the content of this video as if presenting to someone new to the topic."
-    
-    profile_context = (
-        f"The user is in the field of {user_profile.field}, "
-        f"knowledge level: {user_profile.knowledge_level}, "
-        f"prefers analogies: {user_profile.analogy_style}."
-    )
-    
-    prompt = f"{profile_context}\n{base_prompt}"
-    return prompt
-
+@fragment
 def youtube_analyzer(client, user_profile: UserProfile):
     st.header("YouTube Video Analysis")
     
@@ -32,48 +22,84 @@ def youtube_analyzer(client, user_profile: UserProfile):
     
     analogy_type = st.selectbox(
         "Type of analysis:",
-        ["Simple summary (3 sentences)", "Detailed analogy", "Key points", "Beginner explanation"]
+        VIDEO_ANALYSIS_TYPES
+    )
+    
+    stream_results = st.checkbox("Stream results as they are generated", value=True, key="yt_stream")
+    use_transcript = st.checkbox(
+        "Analyze the transcript when available (much faster)",
+        value=True,
+        key="yt_use_transcript",
+        help="Falls back to analyzing the full video when the video has no transcript"
     )
     
+    col_start, col_end = st.columns(2)
+    with col_start:
+        clip_start = st.text_input("Start at (optional)", placeholder="e.g. 1:30", key="yt_clip_start",
+                                   help="Analyze only part of the video")
+    with col_end:
+        clip_end = st.text_input("End at (optional)", placeholder="e.g. 12:00", key="yt_clip_end")
+    
+    # Fetch the transcript and check the cache while options are chosen
+    try:
+        prefetch_video = parse_video_input(yt_url, clip_start, clip_end) if yt_url else None
+    except InvalidYouTubeURL:
+        prefetch_video = None
+    if prefetch_video is not None:
+        render_prefetch_status(get_prefetcher().start(
+            get_session_id(), "youtube", prefetch_key(prefetch_video.key, user_profile, use_transcript),
+            prepare_video, prefetch_video, use_transcript, user_profile
+        ))
+    else:
+        get_prefetcher().cancel(get_session_id(), "youtube")
+    
     if st.button("Analyze video"):
         if yt_url:
             try:
-                with st.spinner("Analyzing video..."):
-                    prompt = generate_prompt_for_youtube(analogy_type, user_profile)
-                    
-                    response = client.models.generate_content(
-                        model="gemini-2.5-flash-preview-04-17",
-                        contents=genai.types.Content(
-                            parts=[
-                                genai.types.Part(
-                                    file_data=genai.types.FileData(file_uri=yt_url)
-                                ),
-                                genai.types.Part(text=prompt)
-                            ]
-                        )
-                    )
-                    
-                    st.success("Analysis complete!")
-                    
-                    with st.container(border=True):
-                        st.subheader("🎯 Personalized analysis for your profile")
-                        st.caption(f"Field: {user_profile.field} | Level: {user_profile.knowledge_level} | Analogy style: {user_profile.analogy_style}")
-                        st.markdown(response.text)
-                    
-                    st.markdown("### Your feedback helps us improve")
-                    col1, col2, col3 = st.columns(3)
-                    with col1:
-                        if st.button("👍 Very helpful"):
-                            st.toast("Thank you for your positive feedback!")
-                    with col2:
-                        if st.button("😐 Somewhat helpful"):
-                            st.toast("Thanks for your feedback! We'll work to improve.")
-                    with col3:
-                        if st.button("👎 Not helpful"):
-                            st.toast("Sorry this wasn't helpful. We'll improve!")
-                            st.text_area("What wasn't helpful?", placeholder="Your comments help us improve...")
-                    
-            except Exception as e:
-                st.error(f"Error during analysis: {str(e)}")
+                video = parse_video_input(yt_url, clip_start, clip_end)
+            except InvalidYouTubeURL as e:
+                st.warning(f"⚠️ {e}")
+                video = None
+            if video is not None:
+                prompt = generate_prompt_for_youtube(analogy_type, user_profile)
+                
+                # Run in the background so widget interactions don't cancel the analysis;
+                # the model is picked by the job once the transcript is sized
+                job = get_job_manager().submit(
+                    get_session_id(), "Video analysis", run_video_analysis_job,
+                    client, video, prompt, stream_results, None, use_transcript,
+                    analogy_type, user_profile, user=get_user_id()
+                )
+                st.session_state["yt_job"] = job.id
         else:
             st.warning("⚠️ Please enter a valid YouTube URL.")
+    
+    job = get_job_manager().get(st.session_state.get("yt_job"))
+    if job is None:
+        return
+    if not job.done:
+        render_job_progress(job.id)
+        return
+    if job.status == "failed":
+        st.error(f"Error during analysis: {job.error}")
+        return
+    
+    st.success("Analysis complete!")
+    
+    with st.container(border=True):
+        st.subheader("🎯 Personalized analysis for your profile")
+        st.caption(f"Field: {user_profile.field} | Level: {user_profile.knowledge_level} | Analogy style: {user_profile.analogy_style}")
+        st.markdown(job.result)
+    
+    st.markdown("### Your feedback helps us improve")
+    col1, col2, col3 = st.columns(3)
+    with col1:
+        if st.button("👍 Very helpful"):
+            st.toast("Thank you for your positive feedback!")
+    with col2:
+        if st.button("😐 Somewhat helpful"):
+            st.toast("Thanks for your feedback! We'll work to improve.")
+    with col3:
+        if st.button("👎 Not helpful"):
+            st.toast("Sorry this wasn't helpful. We'll improve!")
+            st.text_area("What wasn't helpful?", placeholder="Your comments help us improve...")
@@ -0,0 +1,18 @@
+import os
+import sys
+import tempfile
+
+# Settings are read at import time: point every cache at a scratch directory first
+os.environ.setdefault("HIKMAMIND_CACHE_DIR", tempfile.mkdtemp(prefix="hikmamind-tests-"))
+# The fake client answers instantly, so the rate limiter would only slow the suite down
+os.environ.setdefault("HIKMAMIND_RATE_LIMIT_RPM", "100000")
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import pytest  # noqa: E402
+from bench.fake_client import FakeClient  # noqa: E402
+
+
+@pytest.fixture
+def client():
+    """A fake Gemini client that answers instantly and counts calls and bytes"""
+    return FakeClient()
@@ -0,0 +1,96 @@
+import io
+import json
+import threading
+import zipfile
+from contextlib import nullcontext
+
+import pytest
+from models.user_profile import UserProfile
+from services import batch_service
+from services.batch_service import BatchItem, export_jsonl, export_zip, run_batch
+from utils.budget import BudgetExceeded
+
+PROFILE = UserProfile()
+
+
+def _items(count: int):
+    return [BatchItem(f"paper-{i}.pdf", f"https://example.com/{i}.pdf", lambda i=i: nullcontext(f"doc-{i}".encode()))
+            for i in range(count)]
+
+
+@pytest.fixture
+def analyze(monkeypatch):
+    """Replace the analysis with fn(pdf_data) and skip retry backoff (time.sleep is a no-op meanwhile)"""
+    def install(fn):
+        monkeypatch.setattr(batch_service, "analyze_pdf", lambda client, pdf_data, *args, **kwargs: fn(pdf_data))
+    monkeypatch.setattr(batch_service.time, "sleep", lambda seconds: None)
+    return install
+
+
+def test_results_keep_input_order_while_reported_as_they_finish(analyze):
+    def slow_first(pdf_data):
+        if pdf_data == b"doc-0":
+            threading.Event().wait(0.05)
+        return pdf_data.decode().upper()
+
+    analyze(slow_first)
+    reported = []
+
+    results = run_batch(None, _items(4), "General summary", PROFILE, max_workers=4,
+                        on_result=lambda index, result: reported.append(index))
+
+    assert [result.text for result in results] == ["DOC-0", "DOC-1", "DOC-2", "DOC-3"]
+    assert all(result.status == "done" and result.attempts == 1 for result in results)
+    assert sorted(reported) == [0, 1, 2, 3] and reported[-1] == 0
+
+
+def test_transient_failures_are_retried(analyze):
+    attempts = []
+    lock = threading.Lock()
+
+    def flaky(pdf_data):
+        with lock:
+            attempts.append(pdf_data)
+            if attempts.count(pdf_data) < 3:
+                raise ConnectionError("reset")
+        return "ok"
+
+    analyze(flaky)
+
+    result, = run_batch(None, _items(1), "General summary", PROFILE, max_retries=2)
+
+    assert (result.status, result.attempts, result.error) == ("done", 3, None)
+
+
+def test_persistent_failure_is_reported_after_the_last_retry(analyze):
+    def fail(pdf_data):
+        raise ConnectionError("reset")
+
+    analyze(fail)
+
+    result, = run_batch(None, _items(1), "General summary", PROFILE, max_retries=2)
+
+    assert (result.status, result.attempts, result.error) == ("failed", 3, "reset")
+
+
+def test_budget_errors_are_not_retried(analyze):
+    def over_budget(pdf_data):
+        raise BudgetExceeded("over budget")
+
+    analyze(over_budget)
+
+    result, = run_batch(None, _items(1), "General summary", PROFILE, max_retries=3)
+
+    assert (result.status, result.attempts) == ("failed", 1)
+
+
+def test_exports_list_every_result_and_archive_the_successes(analyze):
+    analyze(lambda pdf_data: "summary" if pdf_data != b"doc-1" else 1 / 0)
+    results = run_batch(None, _items(3), "General summary", PROFILE, max_retries=0)
+
+    lines = [json.loads(line) for line in export_jsonl(results).splitlines()]
+    assert [line["status"] for line in lines] == ["done", "failed", "done"]
+    with zipfile.ZipFile(io.BytesIO(export_zip(results))) as archive:
+        names = archive.namelist()
+    assert "results.jsonl" in names
+    assert len(names) == 3
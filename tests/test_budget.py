@@ -0,0 +1,70 @@
+import time
+
+import pytest
+from utils.budget import BudgetExceeded, TokenBudget
+
+
+def test_reservations_count_until_settled_to_actual_usage():
+    budget = TokenBudget(per_user=1000, per_process=0, window=3600)
+
+    with budget.reserve("alice", 600) as reservation:
+        assert budget.pressure("alice") == pytest.approx(0.6)
+        reservation.used = 100
+
+    assert budget.pressure("alice") == pytest.approx(0.1)
+    assert budget.pressure("bob") == 0.0
+
+
+def test_unknown_usage_is_charged_at_the_estimate():
+    budget = TokenBudget(per_user=1000, per_process=0, window=3600)
+
+    with budget.reserve("alice", 300):
+        pass
+
+    assert budget.pressure("alice") == pytest.approx(0.3)
+
+
+def test_concurrent_reservations_cannot_overshoot():
+    budget = TokenBudget(per_user=1000, per_process=0, window=3600)
+
+    with budget.reserve("alice", 700):
+        with pytest.raises(BudgetExceeded, match="only 300"):
+            with budget.reserve("alice", 400):
+                pass
+        with budget.reserve("bob", 400):
+            pass
+
+
+def test_process_budget_is_shared_by_every_user():
+    budget = TokenBudget(per_user=1000, per_process=1500, window=3600)
+
+    with budget.reserve("alice", 1000), pytest.raises(BudgetExceeded, match="the shared"):
+        with budget.reserve("bob", 600):
+            pass
+
+
+def test_request_above_the_whole_budget_is_rejected():
+    budget = TokenBudget(per_user=1000, per_process=0, window=3600)
+
+    with pytest.raises(BudgetExceeded, match="more than your budget"):
+        with budget.reserve("alice", 1001):
+            pass
+
+
+def test_spending_leaves_the_window():
+    budget = TokenBudget(per_user=1000, per_process=0, window=0.05)
+
+    with budget.reserve("alice", 1000):
+        pass
+    time.sleep(0.06)
+
+    assert budget.pressure("alice") == 0.0
+    with budget.reserve("alice", 1000):
+        pass
+
+
+def test_zero_limit_disables_a_budget():
+    budget = TokenBudget(per_user=0, per_process=0)
+
+    with budget.reserve("alice", 10 ** 9):
+        assert budget.pressure("alice") == 0.0
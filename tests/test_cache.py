@@ -0,0 +1,104 @@
+import time
+from types import SimpleNamespace
+
+import pytest
+from utils.cache import EmptyResponse, ResultCache, cached_stream, make_cache_key, response_text
+from utils.prompts import Prompt
+
+
+@pytest.fixture
+def cache(tmp_path):
+    return ResultCache(str(tmp_path / "results.sqlite3"), max_bytes=1000, max_age=3600)
+
+
+@pytest.fixture
+def result_cache(cache, monkeypatch):
+    """Make cache the process-wide result cache"""
+    monkeypatch.setattr("utils.cache.get_result_cache", lambda: cache)
+    return cache
+
+
+def _chunks(*texts):
+    return lambda: iter(SimpleNamespace(text=text) for text in texts)
+
+
+def test_hits_and_misses_are_counted(cache):
+    assert cache.get("a") is None
+    cache.set("a", "result")
+
+    assert cache.get("a") == "result"
+    assert cache.contains("a")
+    assert (cache.hits, cache.misses) == (1, 1)
+
+
+def test_expired_entries_are_misses(cache):
+    cache.set("a", "result")
+    cache.max_age = 0.01
+    time.sleep(0.02)
+
+    assert not cache.contains("a")
+    assert cache.get("a") is None
+
+
+def test_least_recently_used_entries_are_evicted_first(cache):
+    cache.set("old", "x" * 400)
+    cache.set("used", "y" * 400)
+    cache.get("old")
+    cache.set("new", "z" * 400)
+
+    assert cache.contains("old") and cache.contains("new")
+    assert not cache.contains("used")
+    assert cache.stats()["bytes"] <= cache.max_bytes
+
+
+def test_empty_results_are_never_stored(cache):
+    cache.set("a", "")
+
+    assert not cache.contains("a")
+    assert cache.get("a") is None
+
+
+def test_keys_depend_on_every_input():
+    keys = {
+        make_cache_key("doc", "prompt", "model"),
+        make_cache_key("doc2", "prompt", "model"),
+        make_cache_key("doc", "prompt2", "model"),
+        make_cache_key("doc", "prompt", "model2"),
+        make_cache_key("doc", Prompt("prompt", "template-v2"), "model"),
+    }
+    assert len(keys) == 5
+    assert make_cache_key("doc", "prompt", "model") == make_cache_key("doc", "prompt", "model")
+    # Parts are delimited, so shifting text between them changes the key
+    assert make_cache_key("ab", "c", "m") != make_cache_key("a", "bc", "m")
+
+
+def test_cached_stream_stores_the_assembled_text(result_cache):
+    assert list(cached_stream("k", _chunks("Hello ", "", "world"))) == ["Hello ", "world"]
+    assert result_cache.get("k") == "Hello world"
+    # A hit is replayed in one piece without calling the model
+    assert list(cached_stream("k", _chunks("never", "called"))) == ["Hello world"]
+
+
+def test_abandoned_stream_is_not_cached(result_cache):
+    stream = cached_stream("k", _chunks("partial ", "text"))
+    next(stream)
+    stream.close()
+
+    assert not result_cache.contains("k")
+
+
+def test_empty_stream_raises_and_is_not_cached(result_cache):
+    blocked = SimpleNamespace(text=None, prompt_feedback=SimpleNamespace(block_reason="SAFETY"))
+
+    with pytest.raises(EmptyResponse, match="SAFETY"):
+        list(cached_stream("k", lambda: iter([blocked])))
+    assert not result_cache.contains("k")
+
+
+def test_response_text_explains_missing_text():
+    assert response_text(SimpleNamespace(text="ok")) == "ok"
+    truncated = SimpleNamespace(text=None, candidates=[SimpleNamespace(finish_reason="MAX_TOKENS")])
+    with pytest.raises(EmptyResponse, match="MAX_TOKENS"):
+        response_text(truncated)
+    with pytest.raises(EmptyResponse):
+        response_text(SimpleNamespace(text="   "))
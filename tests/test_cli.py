@@ -0,0 +1,19 @@
+import io
+import json
+
+import hikmamind
+from models.user_profile import UserProfile
+
+
+def test_malformed_lines_fail_alone(client):
+    lines = ["{not json", '{"type": "Key points"}', "# comment", "", "https://youtu.be/clitest0001"]
+    output = io.StringIO()
+
+    failed = hikmamind.run(client, lines, output, UserProfile(), 2, hikmamind.ALL_ANALYSES,
+                           hikmamind.VIDEO_ANALYSIS_TYPES[0], use_transcript=False)
+
+    records = [json.loads(line) for line in output.getvalue().splitlines()]
+    assert failed == 2
+    assert [record["status"] for record in records] == ["failed", "failed", "done"]
+    assert records[0]["source"] == "{not json"
+    assert "source" in records[1]["error"]
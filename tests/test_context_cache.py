@@ -0,0 +1,114 @@
+import pytest
+from bench.corpus import make_pdf
+from google.genai import errors, types
+from services.context_cache import ContextCacheRegistry
+from services.document_registry import DocumentRegistry
+
+PROMPT = "List the key points of this paper."
+
+
+@pytest.fixture
+def registry():
+    return ContextCacheRegistry(ttl=3600, min_bytes=10_000)
+
+
+@pytest.fixture
+def pdf_data():
+    return make_pdf(50_000, seed=10)
+
+
+def _generate(registry, client, pdf_data, doc_hash):
+    part = types.Part.from_bytes(data=pdf_data, mime_type="application/pdf")
+    return registry.generate(client, "models/test", pdf_data, PROMPT, doc_hash, lambda: [part, PROMPT])
+
+
+def test_context_is_created_on_the_second_analysis_and_reused_after(registry, client, pdf_data):
+    assert registry.get(client, "models/test", pdf_data, "doc-a") is None
+    created = registry.get(client, "models/test", pdf_data, "doc-a")
+    reused = registry.get(client, "models/test", pdf_data, "doc-a")
+
+    assert created is not None and reused == created
+    assert (registry.created, registry.reuses) == (1, 1)
+
+
+def test_contexts_are_per_model(registry, client, pdf_data):
+    for model in ("models/a", "models/a", "models/b", "models/b"):
+        registry.get(client, model, pdf_data, "doc-b")
+
+    assert registry.created == 2
+
+
+def test_small_documents_are_never_cached(registry, client):
+    small = make_pdf(2_000, seed=11)
+    for _ in range(3):
+        assert registry.get(client, "models/test", small, "doc-c") is None
+    assert registry.created == 0
+
+
+def test_reuse_sends_only_the_prompt(registry, client, pdf_data):
+    _generate(registry, client, pdf_data, "doc-d")
+    first = client.bytes_sent
+    for _ in range(2):
+        _generate(registry, client, pdf_data, "doc-d")
+
+    assert first >= len(pdf_data)
+    assert client.bytes_sent - first < 1_000
+
+
+def test_context_deleted_by_the_provider_is_recreated(registry, client, pdf_data):
+    registry.get(client, "models/test", pdf_data, "doc-e")
+    name = registry.get(client, "models/test", pdf_data, "doc-e")
+    client.caches.delete(name)
+
+    response = _generate(registry, client, pdf_data, "doc-e")
+
+    assert response.text
+    assert registry.created == 2
+    assert registry.get(client, "models/test", pdf_data, "doc-e") != name
+
+
+def test_refused_document_is_not_retried(registry, client, pdf_data, monkeypatch):
+    attempts = []
+
+    def refuse(model, config):
+        attempts.append(model)
+        raise errors.ClientError(400, {"error": {"code": 400, "message": "Cached content is too small",
+                                                 "status": "INVALID_ARGUMENT"}})
+
+    monkeypatch.setattr(client.caches, "create", refuse)
+    for _ in range(4):
+        assert registry.get(client, "models/test", pdf_data, "doc-f") is None
+    assert len(attempts) == 1
+
+
+def test_tracked_documents_are_bounded(client, pdf_data):
+    registry = ContextCacheRegistry(ttl=3600, min_bytes=0, max_tracked=2)
+    for doc_hash in ("doc-1", "doc-2", "doc-3"):
+        registry.get(client, "models/test", pdf_data, doc_hash)
+
+    assert len(registry._tracked) == 2
+    # The least recently used document was forgotten, so it counts as new again
+    assert registry.get(client, "models/test", pdf_data, "doc-1") is None
+    assert registry.created == 0
+
+
+def test_document_whose_upload_went_missing_is_uploaded_again(registry, client, pdf_data, monkeypatch):
+    documents = DocumentRegistry(inline_limit=1024, ttl=3600)
+    monkeypatch.setattr("services.context_cache.get_document_registry", lambda: documents)
+    stale = documents.get_file(client, pdf_data, "doc-g")
+    generate = client.models.generate_content
+
+    def generate_content(model, contents, config=None):
+        # The retry may already reference a cached context, created from a fresh upload
+        file_data = getattr(contents[0], "file_data", None)
+        if file_data is not None and file_data.file_uri == stale.uri:
+            raise errors.ClientError(404, {"error": {"code": 404, "message": f"File {stale.name} not found.",
+                                                     "status": "NOT_FOUND"}})
+        return generate(model=model, contents=contents, config=config)
+
+    monkeypatch.setattr(client.models, "generate_content", generate_content)
+    response = registry.generate(client, "models/test", pdf_data, PROMPT, "doc-g",
+                                 lambda: [documents.get_part(client, pdf_data, "doc-g"), PROMPT])
+
+    assert response.text
+    assert documents.uploads == 2
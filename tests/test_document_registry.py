@@ -0,0 +1,105 @@
+import pytest
+from bench.corpus import make_pdf
+from google.genai import errors
+from services.document_registry import EXPIRY_MARGIN_SECONDS, DocumentRegistry
+from utils.cache import hash_bytes
+
+
+def test_large_document_is_uploaded_once_and_reused(client):
+    registry = DocumentRegistry(inline_limit=1024, ttl=3600)
+    pdf_data = make_pdf(50_000, seed=1)
+
+    first = registry.get_file(client, pdf_data)
+    second = registry.get_file(client, pdf_data, hash_bytes(pdf_data))
+
+    assert second is first
+    assert (registry.uploads, registry.reuses) == (1, 1)
+    part = registry.get_part(client, pdf_data)
+    assert part.file_data.file_uri == first.uri
+    assert registry.uploads == 1
+
+
+def test_small_document_is_sent_inline(client):
+    registry = DocumentRegistry(inline_limit=1024 * 1024)
+    pdf_data = make_pdf(20_000, seed=2)
+
+    part = registry.get_part(client, pdf_data)
+
+    assert part.inline_data.data == pdf_data
+    assert registry.uploads == 0
+    assert client.bytes_sent == 0
+
+
+def test_expired_reference_is_uploaded_again(client):
+    # A TTL within the safety margin expires the reference as soon as it is stored
+    registry = DocumentRegistry(inline_limit=1024, ttl=EXPIRY_MARGIN_SECONDS)
+    pdf_data = make_pdf(50_000, seed=3)
+
+    first = registry.get_file(client, pdf_data)
+    second = registry.get_file(client, pdf_data)
+
+    assert second.name != first.name
+    assert (registry.uploads, registry.reuses) == (2, 0)
+
+
+def test_forgotten_reference_is_uploaded_again(client):
+    registry = DocumentRegistry(inline_limit=1024, ttl=3600)
+    pdf_data = make_pdf(50_000, seed=4)
+
+    registry.get_file(client, pdf_data)
+    registry.forget(hash_bytes(pdf_data))
+    registry.get_file(client, pdf_data)
+
+    assert registry.uploads == 2
+
+
+def _missing_file(name):
+    return errors.ClientError(403, {"error": {
+        "code": 403, "status": "PERMISSION_DENIED",
+        "message": f"You do not have permission to access the File {name} or it may not exist.",
+    }})
+
+
+def test_file_deleted_by_the_provider_is_uploaded_again_once(client):
+    registry = DocumentRegistry(inline_limit=1024, ttl=3600)
+    pdf_data = make_pdf(50_000, seed=5)
+    doc_hash = hash_bytes(pdf_data)
+    stale = registry.get_file(client, pdf_data, doc_hash)
+    sent = []
+
+    def call():
+        part = registry.get_part(client, pdf_data, doc_hash)
+        sent.append(part.file_data.file_uri)
+        if part.file_data.file_uri == stale.uri:
+            raise _missing_file(stale.name)
+        return "ok"
+
+    assert registry.retry_if_missing(doc_hash, call) == "ok"
+    assert sent[0] == stale.uri and sent[1] != stale.uri
+    assert registry.uploads == 2
+
+
+def test_other_errors_are_not_retried(client):
+    registry = DocumentRegistry(inline_limit=1024, ttl=3600)
+    calls = []
+
+    def call():
+        calls.append(1)
+        raise errors.ClientError(400, {"error": {"code": 400, "message": "Bad file", "status": "INVALID_ARGUMENT"}})
+
+    with pytest.raises(errors.ClientError):
+        registry.retry_if_missing("doc", call)
+    assert len(calls) == 1
+
+
+def test_only_the_most_recent_documents_are_tracked(client):
+    registry = DocumentRegistry(inline_limit=1024, ttl=3600, max_tracked=2)
+    documents = [make_pdf(5_000, seed=seed) for seed in (6, 7, 8)]
+    for pdf_data in documents:
+        registry.get_file(client, pdf_data)
+
+    registry.get_file(client, documents[2])
+    registry.get_file(client, documents[0])
+
+    assert len(registry._tracked) == 2
+    assert (registry.uploads, registry.reuses) == (4, 1)
@@ -0,0 +1,85 @@
+import sqlite3
+import time
+
+import pytest
+from models.user_profile import UserProfile
+from utils.history import HistoryEntry, HistoryStore, record_analysis
+from utils.jobs import LOCAL_USER, get_job_manager
+
+
+@pytest.fixture
+def store(tmp_path):
+    return HistoryStore(str(tmp_path / "history.sqlite3"))
+
+
+def _entry(result: str, owner: str = LOCAL_USER, **fields) -> HistoryEntry:
+    return HistoryEntry("pdf", "paper.pdf", "hash", "Key points", result, owner=owner, **fields)
+
+
+def test_search_finds_words_and_prefixes(store):
+    store.add(_entry("Transformers replace recurrence with attention"))
+    store.add(_entry("Convolutional networks for images"))
+
+    assert [e.result for e in store.search(LOCAL_USER, "recurrence")] == ["Transformers replace recurrence with attention"]
+    assert len(store.search(LOCAL_USER, "convol")) == 1
+    assert store.search(LOCAL_USER, 'attention" OR "images') == []
+    assert len(store.search(LOCAL_USER)) == 2
+
+
+def test_users_only_see_and_delete_their_own_entries(store):
+    mine = store.add(_entry("mine", owner="alice"))
+    theirs = store.add(_entry("theirs", owner="bob"))
+
+    assert [e.result for e in store.search("alice")] == ["mine"]
+    assert store.get(theirs, "alice") is None
+    assert not store.delete(theirs, "alice")
+    assert store.get(theirs, "bob") is not None
+    assert store.delete(mine, "alice")
+    assert store.search("alice") == []
+
+
+def test_profile_filter_includes_citations(store):
+    store.add(_entry("with citations", field="CS", knowledge_level="Expert", analogy_style="Tech",
+                     include_citations=True))
+    store.add(_entry("without", field="CS", knowledge_level="Expert", analogy_style="Tech"))
+
+    found = store.search(LOCAL_USER, user_profile=UserProfile("CS", "Expert", "Tech", True))
+
+    assert [e.result for e in found] == ["with citations"]
+    assert found[0].include_citations is True
+
+
+def test_entries_outlive_the_store(store):
+    store.add(_entry("kept", options="Large document mode, pages 1-10"))
+
+    reopened = HistoryStore(store.path).search(LOCAL_USER)
+
+    assert [(e.result, e.options) for e in reopened] == [("kept", "Large document mode, pages 1-10")]
+
+
+def test_old_databases_are_migrated(tmp_path):
+    path = str(tmp_path / "old.sqlite3")
+    with sqlite3.connect(path) as conn:
+        conn.execute(
+            "CREATE TABLE analyses (id INTEGER PRIMARY KEY, kind TEXT NOT NULL, source TEXT NOT NULL,"
+            " source_hash TEXT NOT NULL, analysis_type TEXT NOT NULL, result TEXT NOT NULL, field TEXT,"
+            " knowledge_level TEXT, analogy_style TEXT, model TEXT, seconds REAL, tokens_in INTEGER,"
+            " tokens_out INTEGER, created REAL NOT NULL)"
+        )
+        conn.execute("INSERT INTO analyses (kind, source, source_hash, analysis_type, result, created)"
+                     " VALUES ('pdf', 'old.pdf', 'h', 'Key points', 'old result', 0)")
+
+    assert [e.result for e in HistoryStore(path).search(LOCAL_USER)] == ["old result"]
+
+
+def test_analyses_are_recorded_for_the_job_user(store, monkeypatch):
+    monkeypatch.setattr("utils.history.get_history_store", lambda: store)
+
+    record_analysis("pdf", "cli.pdf", "h", "Key points", "from the command line")
+    job = get_job_manager().submit("session", "test", record_analysis, "pdf", "ui.pdf", "h", "Key points",
+                                   "from the app", user="alice")
+    while not job.done:
+        time.sleep(0.01)
+
+    assert [e.source for e in store.search(LOCAL_USER)] == ["cli.pdf"]
+    assert [e.source for e in store.search("alice")] == ["ui.pdf"]
@@ -0,0 +1,107 @@
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
+from utils import http_client
+from utils.http_client import DownloadCancelled, DownloadError, DownloadStore, fetch_pdf
+
+PDF = b"%PDF-1.4\n" + b"x" * 20_000
+
+
+class Handler(BaseHTTPRequestHandler):
+    requests = []
+
+    def log_message(self, *args):
+        pass
+
+    def _send(self, status: int, body: bytes = b"", content_type: str = "application/pdf", headers=None,
+              length: bool = True):
+        self.send_response(status)
+        self.send_header("Content-Type", content_type)
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+        if length:
+            self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        try:
+            self.wfile.write(body)
+        except (BrokenPipeError, ConnectionResetError):
+            pass
+
+    def do_GET(self):
+        Handler.requests.append((self.path, self.headers.get("If-None-Match")))
+        if self.path == "/paper.pdf":
+            if self.headers.get("If-None-Match") == '"v1"':
+                self.send_response(304)
+                self.end_headers()
+            else:
+                self._send(200, PDF, headers={"ETag": '"v1"'})
+        elif self.path == "/undeclared.pdf":
+            # No Content-Length: the size is only known while reading
+            self.close_connection = True
+            self._send(200, PDF, length=False)
+        elif self.path == "/page.html":
+            self._send(200, b"<html></html>", "text/html")
+        elif self.path == "/not-a-pdf":
+            self._send(200, b"plain bytes" * 100, "application/octet-stream")
+        else:
+            self._send(404, b"missing", "text/plain")
+
+
+@pytest.fixture(scope="module")
+def server():
+    httpd = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+    threading.Thread(target=httpd.serve_forever, daemon=True).start()
+    yield f"http://127.0.0.1:{httpd.server_address[1]}"
+    httpd.shutdown()
+
+
+@pytest.fixture(autouse=True)
+def store(tmp_path, monkeypatch):
+    store = DownloadStore(str(tmp_path))
+    monkeypatch.setattr(http_client, "get_download_store", lambda: store)
+    Handler.requests.clear()
+    return store
+
+
+def test_unchanged_document_is_revalidated_not_downloaded(server):
+    assert fetch_pdf(f"{server}/paper.pdf") == PDF
+    assert fetch_pdf(f"{server}/paper.pdf") == PDF
+
+    assert Handler.requests == [("/paper.pdf", None), ("/paper.pdf", '"v1"')]
+
+
+def test_stored_copy_over_a_lowered_limit_is_refused(server):
+    fetch_pdf(f"{server}/paper.pdf")
+
+    with pytest.raises(DownloadError, match="size limit"):
+        fetch_pdf(f"{server}/paper.pdf", max_bytes=1000)
+
+
+def test_declared_size_over_the_limit_is_refused(server):
+    with pytest.raises(DownloadError, match="size limit"):
+        fetch_pdf(f"{server}/paper.pdf", max_bytes=1000)
+
+
+def test_undeclared_size_is_capped_while_reading(server):
+    assert fetch_pdf(f"{server}/undeclared.pdf") == PDF
+    with pytest.raises(DownloadError, match="size limit"):
+        fetch_pdf(f"{server}/undeclared.pdf", max_bytes=1000)
+
+
+@pytest.mark.parametrize("path, message", [
+    ("/page.html", "content type: text/html"),
+    ("/not-a-pdf", "did not return a PDF document"),
+    ("/missing.pdf", "HTTP 404"),
+])
+def test_non_pdf_responses_are_refused(server, path, message):
+    with pytest.raises(DownloadError, match=message):
+        fetch_pdf(f"{server}{path}")
+
+
+def test_cancelled_download_stops(server):
+    cancel = threading.Event()
+    cancel.set()
+
+    with pytest.raises(DownloadCancelled):
+        fetch_pdf(f"{server}/undeclared.pdf", cancel=cancel)
@@ -0,0 +1,32 @@
+import pytest
+from services import image_service
+
+
+@pytest.fixture
+def client(client):
+    client.image_px = 64
+    return client
+
+
+def test_failed_variant_keeps_the_others(client, monkeypatch):
+    generate = image_service._generate_variant
+
+    def flaky(client, prompt, model, variant):
+        if variant == 1:
+            raise RuntimeError("quota exceeded")
+        return generate(client, prompt, model, variant)
+
+    monkeypatch.setattr(image_service, "_generate_variant", flaky)
+    images, errors = image_service.generate_images(client, "A diagram of attention heads", 3)
+
+    assert len(images) == 2
+    assert errors == ["Image 2: quota exceeded"]
+
+
+def test_every_variant_failing_raises(client, monkeypatch):
+    def failing(client, prompt, model, variant):
+        raise RuntimeError("service unavailable")
+
+    monkeypatch.setattr(image_service, "_generate_variant", failing)
+    with pytest.raises(RuntimeError, match="service unavailable"):
+        image_service.generate_images(client, "A diagram of attention heads", 2)
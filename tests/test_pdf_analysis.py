@@ -0,0 +1,77 @@
+import json
+from contextlib import nullcontext
+
+import pytest
+from bench.corpus import make_pdf
+from models.user_profile import UserProfile
+from services.pdf_analysis import analyze_pdf, analyze_pdf_all, is_pdf_cached, pdf_model_for, plan_pdf_analysis
+from services.preflight import fast_model, size_pdf
+from utils.budget import TokenBudget
+from utils.cache import hash_bytes
+from utils.prompts import analysis_types, json_field
+
+PROFILE = UserProfile("Biology", "Beginner", "Nature", False)
+
+
+def _json_reply(client, rewrite):
+    """Make the client pass its structured replies through rewrite"""
+    respond = client.respond
+
+    def reply(texts, config=None):
+        text = respond(texts, config)
+        return rewrite(text) if getattr(config, "response_schema", None) is not None else text
+
+    client.respond = reply
+
+
+@pytest.mark.parametrize("seed, rewrite", [
+    (101, lambda text: text[:len(text) // 2]),
+    (102, lambda text: ""),
+    (103, lambda text: "[]"),
+], ids=["truncated", "empty", "not-an-object"])
+def test_unusable_json_falls_back_to_one_request_per_type(client, seed, rewrite):
+    pdf_data = make_pdf(2_000, seed=seed)
+    _json_reply(client, rewrite)
+
+    results = analyze_pdf_all(client, pdf_data, PROFILE)
+
+    types = analysis_types("pdf")
+    assert list(results) == types and all(results.values())
+    assert client.calls == 1 + len(types)
+    assert all(is_pdf_cached(hash_bytes(pdf_data), t, PROFILE) for t in types)
+
+
+def test_missing_fields_are_requested_on_their_own(client):
+    pdf_data = make_pdf(2_000, seed=104)
+    missing = json_field(analysis_types("pdf")[0])
+    _json_reply(client, lambda text: json.dumps({k: v for k, v in json.loads(text).items() if k != missing}))
+
+    results = analyze_pdf_all(client, pdf_data, PROFILE)
+
+    assert all(results.values())
+    assert client.calls == 2
+
+
+def test_downgraded_result_is_cached_under_the_requested_model(client, monkeypatch):
+    budget = TokenBudget(per_user=100_000, per_process=0)
+    monkeypatch.setattr("services.preflight.get_token_budget", lambda: budget)
+    ran = []
+    generate = client.models.generate_content
+    monkeypatch.setattr(client.models, "generate_content",
+                        lambda model, **kwargs: ran.append(model) or generate(model, **kwargs))
+    # Large enough to skip the fast tier, so only budget pressure downgrades it
+    pdf_data = make_pdf(2_000, seed=105, text_pages=40)
+    tokens = size_pdf(pdf_data).tokens
+    requested = pdf_model_for("Key research points", tokens)
+    assert requested != fast_model()
+
+    with budget.reserve("alice", 85_000):
+        analyze_pdf(client, pdf_data, "Key research points", PROFILE, user="alice")
+
+    assert ran == [fast_model()]
+    assert is_pdf_cached(hash_bytes(pdf_data), "Key research points", PROFILE, tokens)
+    _, model, cache_model, plan_budget = plan_pdf_analysis(pdf_data, "Key research points", PROFILE, user="alice")
+    assert (model, cache_model) == (requested, requested)
+    assert isinstance(plan_budget, nullcontext)
+    assert analyze_pdf(client, pdf_data, "Key research points", PROFILE, user="alice")
+    assert ran == [fast_model()]
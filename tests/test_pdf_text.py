@@ -0,0 +1,53 @@
+import threading
+import time
+
+from bench.corpus import make_pdf
+from services.pdf_text import build_section_notes, summarize_chunks
+from utils.jobs import map_bounded
+
+
+def test_items_are_pulled_lazily_with_a_bounded_number_in_flight():
+    pulled, running, peak = [], [0], [0]
+    lock = threading.Lock()
+
+    def items():
+        for index in range(20):
+            pulled.append(index)
+            yield index
+
+    def work(item):
+        with lock:
+            running[0] += 1
+            peak[0] = max(peak[0], running[0])
+        time.sleep(0.005)
+        with lock:
+            running[0] -= 1
+        return item * item
+
+    results = map_bounded(work, items(), max_workers=2)
+    first = next(results)
+    assert len(pulled) <= 5
+    rest = dict([first, *results])
+
+    assert rest == {index: index * index for index in range(20)}
+    assert peak[0] <= 2
+
+
+def test_summaries_come_back_in_document_order(client):
+    pdf_data = make_pdf(30_000, seed=200)
+
+    summaries = summarize_chunks(client, pdf_data, "models/test", max_tokens=1000, max_workers=3)
+
+    pages = [page_range for page_range, _ in summaries]
+    assert len(pages) > 3
+    assert pages == sorted(pages) and pages[0][0] == 1
+    assert all(summary for _, summary in summaries)
+    assert build_section_notes(summaries).count("[Pages ") == len(pages)
+
+
+def test_selected_pages_only(client):
+    pdf_data = make_pdf(30_000, seed=201)
+
+    summaries = summarize_chunks(client, pdf_data, "models/test", page_range=(3, 4), max_tokens=10_000)
+
+    assert [page_range for page_range, _ in summaries] == [(3, 4)]
@@ -0,0 +1,110 @@
+import os
+import threading
+
+import pytest
+from services import prefetch as prefetch_module
+from services.prefetch import Prefetcher, Prepared
+from services.preflight import InputSize
+from services.upload_store import UploadStore
+
+
+@pytest.fixture
+def store(tmp_path, monkeypatch):
+    store = UploadStore(str(tmp_path))
+    monkeypatch.setattr(prefetch_module, "get_upload_store", lambda: store)
+    return store
+
+
+@pytest.fixture
+def prefetcher():
+    return Prefetcher(max_workers=2)
+
+
+def _spool(store, data: bytes):
+    """A prefetch body spooling data as a speculative copy"""
+    def prepare(cancel):
+        upload = store.put_bytes(data, "paper.pdf", speculative=True)
+        return Prepared(upload.doc_hash, InputSize(len(data), 1), upload)
+    return prepare
+
+
+def _fallback():
+    pytest.fail("the prefetched document was not used")
+
+
+def test_prepared_document_is_used_by_the_job(prefetcher, store):
+    prefetcher.start("session", "pdf", ("a",), _spool(store, b"a" * 100))
+
+    with prefetcher.open("session", "pdf", ("a",), _fallback) as pdf_data:
+        assert pdf_data == b"a" * 100
+    assert prefetcher.hits == 1
+
+
+def test_same_input_is_prefetched_once(prefetcher, store):
+    calls = []
+
+    def prepare(cancel):
+        calls.append(1)
+        return _spool(store, b"a" * 100)(cancel)
+
+    first = prefetcher.start("session", "pdf", ("a",), prepare)
+    second = prefetcher.start("session", "pdf", ("a",), prepare)
+    first.future.result()
+
+    assert second is first and len(calls) == 1
+
+
+def test_new_input_cancels_the_previous_one_and_deletes_its_copy(prefetcher, store):
+    previous = prefetcher.start("session", "pdf", ("a",), _spool(store, b"a" * 100))
+    upload = previous.future.result().upload
+    prefetcher.start("session", "pdf", ("b",), _spool(store, b"b" * 100))
+
+    assert previous.cancel.is_set() and previous.ready is None
+    assert not os.path.exists(upload.path)
+    assert prefetcher.get("session", "pdf", ("a",)) is None
+
+
+def test_sessions_and_slots_are_independent(prefetcher, store):
+    first = prefetcher.start("session", "pdf", ("a",), _spool(store, b"a" * 100))
+    prefetcher.start("session", "compare", ("b",), _spool(store, b"b" * 100))
+    prefetcher.start("other", "pdf", ("c",), _spool(store, b"c" * 100))
+
+    assert not first.cancel.is_set()
+
+
+def test_job_waits_for_a_prefetch_in_flight(prefetcher, store):
+    release = threading.Event()
+    spool = _spool(store, b"a" * 100)
+
+    def slow(cancel):
+        release.wait(1)
+        return spool(cancel)
+
+    prefetcher.start("session", "pdf", ("a",), slow)
+    threading.Timer(0.05, release.set).start()
+
+    with prefetcher.open("session", "pdf", ("a",), _fallback) as pdf_data:
+        assert pdf_data == b"a" * 100
+
+
+def test_failed_or_cancelled_prefetch_falls_back(prefetcher, store):
+    def fail(cancel):
+        raise ConnectionError("offline")
+
+    prefetcher.start("session", "pdf", ("a",), fail)
+    with prefetcher.open("session", "pdf", ("a",), lambda: b"fresh") as pdf_data:
+        assert pdf_data == b"fresh"
+
+    prefetcher.start("session", "pdf", ("b",), _spool(store, b"b" * 100)).future.result()
+    prefetcher.cancel("session", "pdf")
+    with prefetcher.open("session", "pdf", ("b",), lambda: b"fresh") as pdf_data:
+        assert pdf_data == b"fresh"
+    assert prefetcher.hits == 0
+
+
+def test_disabled_prefetcher_does_nothing(store):
+    prefetcher = Prefetcher(max_workers=0)
+
+    assert prefetcher.start("session", "pdf", ("a",), _spool(store, b"a" * 100)) is None
+    with prefetcher.open("session", "pdf", ("a",), lambda: b"fresh") as pdf_data:
+        assert pdf_data == b"fresh"
@@ -0,0 +1,91 @@
+import numpy as np
+import pytest
+from bench.corpus import make_pdf
+from services import paper_index
+from services.paper_index import ChunkIndex, HashingEmbedder, answer_question
+
+PASSAGES = [
+    "The encoder stacks self-attention and feed-forward layers.",
+    "We train on the WMT 2014 English-German dataset of 4.5 million sentence pairs.",
+    "Dropout of 0.1 is applied to the output of each sub-layer.",
+    "Results show a BLEU score of 28.4 on the English-German test set.",
+    "Positional encodings use sine and cosine functions of different frequencies.",
+]
+
+
+@pytest.fixture
+def index():
+    embedder = HashingEmbedder()
+    pages = np.array([(i + 1, i + 1) for i in range(len(PASSAGES))], dtype=np.int32)
+    return ChunkIndex(PASSAGES, pages, embedder.embed(PASSAGES))
+
+
+def _query(text: str) -> np.ndarray:
+    return HashingEmbedder().embed([text], query=True)[0]
+
+
+def test_best_passage_ranks_first(index):
+    hits = index.search(_query("Which dataset was used for training?"), k=3)
+
+    assert hits[0][0] == 1
+    assert len(hits) == 3
+    scores = [score for _, score in hits]
+    assert scores == sorted(scores, reverse=True)
+
+
+def test_top_k_matches_a_full_sort(index):
+    query = _query("dropout applied to each sub-layer output")
+    scores = index.vectors @ query
+
+    # Compared by score, since passages sharing no words with the query tie at 0
+    for k in range(1, len(PASSAGES) + 1):
+        hits = index.search(query, k)
+        assert [score for _, score in hits] == pytest.approx(sorted(scores, reverse=True)[:k])
+        assert all(scores[i] == pytest.approx(score) for i, score in hits)
+
+
+def test_k_larger_than_the_index_returns_every_passage(index):
+    assert sorted(i for i, _ in index.search(_query("BLEU"), k=50)) == list(range(len(PASSAGES)))
+
+
+def test_empty_index_returns_nothing():
+    empty = ChunkIndex([], np.zeros((0, 2), dtype=np.int32), np.zeros((0, 8), dtype=np.float32))
+
+    assert empty.search(np.ones(8, dtype=np.float32), k=3) == []
+
+
+def test_index_round_trips_through_disk(index, tmp_path):
+    path = str(tmp_path / "index.npz")
+    index.save(path)
+    loaded = ChunkIndex.load(path)
+
+    assert loaded.texts == index.texts
+    assert loaded.search(_query("positional encodings"), 2) == index.search(_query("positional encodings"), 2)
+
+
+def test_question_sends_only_the_top_k_passages(client, index, monkeypatch):
+    monkeypatch.setattr(paper_index, "get_paper_index", lambda client, pdf_data, doc_hash=None: index)
+    monkeypatch.setattr(paper_index, "_embedder", HashingEmbedder())
+    sent = []
+    generate = client.models.generate_content
+    monkeypatch.setattr(client.models, "generate_content",
+                        lambda model, contents, config=None: sent.append(contents) or generate(model, contents, config))
+
+    answer_question(client, b"retrieval-test", "Which dataset was used for training?", k=2)
+
+    excerpts = sent[0][0]
+    assert excerpts.count("[Pages ") == 2
+    assert PASSAGES[1] in excerpts
+
+
+def test_index_built_in_batches_matches_one_batch(monkeypatch):
+    pdf_data = make_pdf(30_000, seed=300)
+    whole = paper_index.build_index(pdf_data, HashingEmbedder(), max_tokens=100)
+    monkeypatch.setattr(paper_index, "EMBED_BATCH_SIZE", 7)
+
+    batched = paper_index.build_index(pdf_data, HashingEmbedder(), max_tokens=100, max_workers=3)
+
+    assert len(whole) > 7 * 3
+    assert batched.texts == whole.texts
+    assert np.array_equal(batched.pages, whole.pages)
+    assert np.allclose(batched.vectors, whole.vectors)
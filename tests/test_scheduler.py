@@ -0,0 +1,120 @@
+import threading
+import time
+
+import pytest
+from utils.metrics import StageTimer
+from utils.scheduler import DeadlineExceeded, RequestScheduler, TokenBucket
+
+
+class Flaky(Exception):
+    def __init__(self, code: int):
+        super().__init__(f"HTTP {code}")
+        self.code = code
+
+
+@pytest.fixture
+def scheduler():
+    return RequestScheduler(rpm=0, max_attempts=3, base_delay=0.001, deadline=5)
+
+
+def _concurrently(count: int, fn) -> list:
+    results = [None] * count
+    threads = [threading.Thread(target=lambda i=i: results.__setitem__(i, fn(i))) for i in range(count)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    return results
+
+
+def test_retryable_errors_are_retried(scheduler):
+    attempts = []
+
+    def call():
+        attempts.append(1)
+        if len(attempts) < 3:
+            raise Flaky(429)
+        return "ok"
+
+    assert scheduler.run(call) == "ok"
+    assert scheduler.retries == 2
+
+
+def test_other_errors_are_raised_at_once(scheduler):
+    attempts = []
+
+    def call():
+        attempts.append(1)
+        raise Flaky(400)
+
+    with pytest.raises(Flaky):
+        scheduler.run(call)
+    assert len(attempts) == 1
+
+
+def test_identical_calls_in_flight_share_one_request(scheduler):
+    calls = []
+
+    def call():
+        calls.append(1)
+        time.sleep(0.1)
+        return "shared"
+
+    timers = [StageTimer("test") for _ in range(4)]
+    results = _concurrently(4, lambda i: scheduler.run(call, key="same", timer=timers[i]))
+
+    assert results == ["shared"] * 4
+    assert len(calls) == 1
+    assert sum(timer.coalesced for timer in timers) == 3
+
+
+def test_identical_streams_in_flight_share_one_request(scheduler):
+    calls = []
+
+    def make_stream():
+        calls.append(1)
+        for word in ("one ", "two ", "three"):
+            time.sleep(0.05)
+            yield word
+
+    timers = [StageTimer("test") for _ in range(4)]
+    results = _concurrently(4, lambda i: "".join(scheduler.stream(make_stream, key="same", timer=timers[i])))
+
+    assert results == ["one two three"] * 4
+    assert len(calls) == 1
+    assert sum(timer.coalesced for timer in timers) == 3
+
+
+def test_shared_stream_failure_reaches_every_consumer(scheduler):
+    def make_stream():
+        yield "partial"
+        time.sleep(0.1)
+        raise Flaky(400)
+
+    def consume(i):
+        try:
+            return list(scheduler.stream(make_stream, key="failing"))
+        except Flaky as e:
+            return e.code
+
+    assert _concurrently(3, consume) == [400, 400, 400]
+
+
+def test_streams_with_different_keys_are_independent(scheduler):
+    calls = []
+
+    def make_stream():
+        calls.append(1)
+        yield "text"
+
+    _concurrently(3, lambda i: list(scheduler.stream(make_stream, key=f"key-{i}")))
+
+    assert len(calls) == 3
+
+
+def test_rate_limit_respects_the_deadline():
+    bucket = TokenBucket(rate=0.01, capacity=1)
+    bucket.acquire()
+
+    with pytest.raises(DeadlineExceeded):
+        bucket.acquire(deadline=time.monotonic() + 0.05)
@@ -0,0 +1,64 @@
+import json
+
+import pytest
+from bench.fake_client import Recordings
+from services import transcript_service
+from services.transcript_service import FixtureTranscriptFetcher
+from services.video_analysis import TRANSCRIPT_PREAMBLE, load_transcript, run_video_analysis_job
+from utils.youtube_url import parse_youtube_url
+
+
+@pytest.fixture
+def fixtures(tmp_path, monkeypatch):
+    """Serve transcripts from a scratch fixture directory"""
+    monkeypatch.setattr(transcript_service, "_fetcher", FixtureTranscriptFetcher(str(tmp_path)))
+    return tmp_path
+
+
+@pytest.fixture
+def client(client):
+    # Answers say which input the model was given
+    client.recordings = Recordings([{"match": TRANSCRIPT_PREAMBLE, "text": "from transcript"}, {"text": "from video"}])
+    return client
+
+
+def _analyze(client, url: str, use_transcript: bool = True) -> str:
+    return run_video_analysis_job(client, parse_youtube_url(url), "Summarize the video.", stream=False,
+                                  use_transcript=use_transcript, analysis_type="Key points")
+
+
+def test_transcript_is_used_when_available(client, fixtures):
+    (fixtures / "trnscrpt001.json").write_text(json.dumps([
+        {"start": 0, "text": "Attention is all you need."},
+        {"start": 5, "text": "Transformers replace recurrence."},
+    ]))
+
+    assert _analyze(client, "https://youtu.be/trnscrpt001") == "from transcript"
+
+
+def test_video_is_used_without_transcript(client, fixtures):
+    assert load_transcript(parse_youtube_url("https://youtu.be/trnscrpt002")) is None
+    assert _analyze(client, "https://youtu.be/trnscrpt002") == "from video"
+
+
+def test_video_is_used_when_transcript_mode_is_off(client, fixtures):
+    (fixtures / "trnscrpt003.txt").write_text("An untimed transcript.")
+
+    assert _analyze(client, "https://youtu.be/trnscrpt003", use_transcript=False) == "from video"
+
+
+def test_clip_of_an_untimed_transcript_falls_back_to_the_video(client, fixtures):
+    (fixtures / "trnscrpt004.txt").write_text("An untimed transcript cannot be cut to a clip.")
+    clip = parse_youtube_url("https://youtu.be/trnscrpt004").with_range(60, 120)
+
+    assert load_transcript(clip) is None
+    assert run_video_analysis_job(client, clip, "Summarize the clip.", stream=False,
+                                  analysis_type="Key points") == "from video"
+
+
+def test_clip_uses_only_its_part_of_a_timed_transcript(fixtures):
+    (fixtures / "trnscrpt005.json").write_text(json.dumps([
+        {"start": 0, "text": "intro"}, {"start": 60, "text": "middle"}, {"start": 120, "text": "outro"},
+    ]))
+
+    assert load_transcript(parse_youtube_url("https://youtu.be/trnscrpt005").with_range(60, 120)) == "middle"
@@ -0,0 +1,124 @@
+import io
+import os
+import threading
+import time
+
+import pytest
+from services.upload_store import UploadStore
+
+
+class FakeUpload(io.BytesIO):
+    """Stand-in for a Streamlit UploadedFile"""
+
+    def __init__(self, data: bytes, name: str = "paper.pdf", file_id: str = None):
+        super().__init__(data)
+        self.name = name
+        self.file_id = file_id
+
+
+@pytest.fixture
+def store(tmp_path):
+    return UploadStore(str(tmp_path), memory_budget=1000, disk_budget=10_000, max_age=3600)
+
+
+def test_identical_uploads_share_one_file(store):
+    first = store.put(FakeUpload(b"a" * 100, "one.pdf"))
+    second = store.put(FakeUpload(b"a" * 100, "two.pdf"))
+
+    assert first.path == second.path and first.doc_hash == second.doc_hash
+    assert (first.name, second.name) == ("one.pdf", "two.pdf")
+    assert len(os.listdir(store.directory)) == 1
+
+
+def test_known_file_id_is_not_hashed_again(store, monkeypatch):
+    stored = store.put(FakeUpload(b"a" * 100, file_id="id-1"))
+    monkeypatch.setattr(store, "put_bytes", lambda *args: pytest.fail("hashed again"))
+
+    assert store.put(FakeUpload(b"a" * 100, file_id="id-1")) == stored
+
+
+def test_open_documents_share_one_copy(store):
+    upload = store.put(FakeUpload(b"a" * 100))
+
+    with store.open(upload) as first, store.open(upload) as second:
+        assert first is second and first == b"a" * 100
+    assert (store.loads, store.reuses) == (1, 1)
+
+
+def test_released_documents_are_evicted_when_memory_is_needed(store):
+    first = store.put_bytes(b"a" * 600, "a.pdf")
+    second = store.put_bytes(b"b" * 600, "b.pdf")
+    with store.open(first):
+        pass
+    with store.open(second):
+        pass
+    with store.open(first):
+        pass
+
+    assert store.loads == 3
+
+
+def test_open_waits_while_the_memory_budget_is_in_use(store):
+    first = store.put_bytes(b"a" * 600, "a.pdf")
+    second = store.put_bytes(b"b" * 600, "b.pdf")
+    opened = threading.Event()
+
+    def open_second():
+        with store.open(second):
+            opened.set()
+
+    with store.open(first):
+        thread = threading.Thread(target=open_second)
+        thread.start()
+        time.sleep(0.05)
+        assert not opened.is_set()
+    thread.join(1)
+    assert opened.is_set()
+
+
+def test_document_larger_than_the_budget_still_opens_alone(store):
+    upload = store.put_bytes(b"a" * 5000, "big.pdf")
+
+    with store.open(upload) as data:
+        assert len(data) == 5000
+
+
+def test_least_recently_used_files_are_pruned_over_the_disk_budget(store):
+    old = store.put_bytes(b"a" * 4000, "old.pdf")
+    os.utime(old.path, (time.time() - 100, time.time() - 100))
+    kept = store.put_bytes(b"b" * 4000, "kept.pdf")
+    new = store.put_bytes(b"c" * 4000, "new.pdf")
+
+    assert not os.path.exists(old.path)
+    assert os.path.exists(kept.path) and os.path.exists(new.path)
+
+
+def test_speculative_copy_is_discarded_unless_opened(store):
+    unopened = store.put_bytes(b"a" * 100, "a.pdf", speculative=True)
+    opened = store.put_bytes(b"b" * 100, "b.pdf", speculative=True)
+    with store.open(opened):
+        pass
+
+    store.discard_speculative(unopened)
+    store.discard_speculative(opened)
+
+    assert not os.path.exists(unopened.path)
+    assert os.path.exists(opened.path)
+
+
+def test_real_upload_keeps_a_speculative_copy(store):
+    speculative = store.put_bytes(b"a" * 100, "a.pdf", speculative=True)
+    store.put(FakeUpload(b"a" * 100))
+
+    store.discard_speculative(speculative)
+
+    assert os.path.exists(speculative.path)
+
+
+def test_deleted_file_asks_for_a_new_upload(store):
+    upload = store.put_bytes(b"a" * 100, "gone.pdf")
+    os.remove(upload.path)
+
+    with pytest.raises(FileNotFoundError, match="gone.pdf"):
+        with store.open(upload):
+            pass
@@ -0,0 +1,64 @@
+import pytest
+from utils.youtube_url import InvalidYouTubeURL, VideoRef, parse_timestamp, parse_youtube_url
+
+VIDEO_ID = "dQw4w9WgXcQ"
+
+
+@pytest.mark.parametrize("url", [
+    f"https://www.youtube.com/watch?v={VIDEO_ID}",
+    f"https://youtube.com/watch?feature=share&v={VIDEO_ID}&list=PL123",
+    f"http://m.youtube.com/watch?v={VIDEO_ID}",
+    f"https://music.youtube.com/watch?v={VIDEO_ID}",
+    f"https://youtu.be/{VIDEO_ID}?si=abc",
+    f"https://www.youtube.com/shorts/{VIDEO_ID}",
+    f"https://www.youtube-nocookie.com/embed/{VIDEO_ID}",
+    f"https://www.youtube.com/live/{VIDEO_ID}?feature=shared",
+    f"youtube.com/watch?v={VIDEO_ID}",
+    f"  https://YOUTU.BE/{VIDEO_ID}  ",
+])
+def test_every_url_form_has_the_same_identity(url):
+    video = parse_youtube_url(url)
+
+    assert video == VideoRef(VIDEO_ID)
+    assert video.url == f"https://www.youtube.com/watch?v={VIDEO_ID}"
+
+
+def test_playback_position_is_not_part_of_the_identity():
+    assert parse_youtube_url(f"https://youtu.be/{VIDEO_ID}?t=90").key == VIDEO_ID
+
+
+@pytest.mark.parametrize("url", [
+    "",
+    "not a url",
+    "https://example.com/watch?v=dQw4w9WgXcQ",
+    "https://www.youtube.com/watch?v=short",
+    "https://www.youtube.com/channel/UC1234567890",
+    "https://youtu.be/",
+])
+def test_invalid_urls_are_rejected(url):
+    with pytest.raises(InvalidYouTubeURL):
+        parse_youtube_url(url)
+
+
+@pytest.mark.parametrize("value, seconds", [
+    ("", None), ("90", 90), ("90s", 90), ("1m30s", 90), ("1h2m3s", 3723), ("1:30", 90), ("1:02:03", 3723),
+])
+def test_timestamps(value, seconds):
+    assert parse_timestamp(value) == seconds
+
+
+@pytest.mark.parametrize("value", ["abc", "1:xx", "1:2:3:4", "-5"])
+def test_invalid_timestamps_are_rejected(value):
+    with pytest.raises(InvalidYouTubeURL):
+        parse_timestamp(value)
+
+
+def test_clips_have_their_own_identity():
+    video = parse_youtube_url(f"https://youtu.be/{VIDEO_ID}")
+    clip = video.with_range(60, 120)
+
+    assert clip.is_clip and not video.is_clip
+    assert clip.key == f"{VIDEO_ID}@60-120" and clip.key != video.key
+    assert video.with_range(start=60).key == f"{VIDEO_ID}@60-"
+    with pytest.raises(InvalidYouTubeURL):
+        video.with_range(120, 60)
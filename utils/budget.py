@@ -0,0 +1,116 @@
+import threading
+import time
+from collections import defaultdict, deque
+from contextlib import contextmanager
+from typing import Optional
+
+from utils.config import TOKEN_BUDGET_PER_PROCESS, TOKEN_BUDGET_PER_USER, TOKEN_BUDGET_WINDOW_SECONDS
+
+# Budget key of the whole process, alongside one key per user
+_PROCESS = None
+
+
+class BudgetExceeded(Exception):
+    """Raised when a request does not fit the remaining token budget"""
+
+
+class Reservation:
+    """Tokens held for one request; set `used` to settle it to the actual usage"""
+
+    def __init__(self, user: str, tokens: int):
+        self.user = user
+        self.tokens = tokens
+        self.used: Optional[int] = None
+
+
+class TokenBudget:
+    """Per-user and per-process token budgets over a rolling window.
+
+    A request reserves its estimated tokens before it is sent, so
+    concurrent requests cannot overshoot a budget together. When it ends
+    the reservation is settled to the tokens actually used, or to the
+    estimate when usage is unknown. A limit of 0 disables that budget.
+    """
+
+    def __init__(self, per_user: int = TOKEN_BUDGET_PER_USER, per_process: int = TOKEN_BUDGET_PER_PROCESS,
+                 window: float = TOKEN_BUDGET_WINDOW_SECONDS):
+        self.per_user = per_user
+        self.per_process = per_process
+        self.window = window
+        self._spent = defaultdict(deque)
+        self._spent_totals = defaultdict(int)
+        self._reserved = defaultdict(int)
+        self._lock = threading.Lock()
+
+    def _prune(self, key, now: float):
+        spent = self._spent[key]
+        while spent and spent[0][0] <= now - self.window:
+            self._spent_totals[key] -= spent.popleft()[1]
+
+    def _used(self, key, now: float) -> int:
+        self._prune(key, now)
+        return self._spent_totals[key] + self._reserved[key]
+
+    def _limits(self, user: str):
+        return ((user, self.per_user, "your"), (_PROCESS, self.per_process, "the shared"))
+
+    def pressure(self, user: str) -> float:
+        """Fraction (0..1) of the tighter of the user's and the process's budgets already used"""
+        now = time.monotonic()
+        with self._lock:
+            return max(
+                [min(1.0, self._used(key, now) / limit) for key, limit, _ in self._limits(user) if limit > 0],
+                default=0.0
+            )
+
+    def _retry_after(self, key, now: float) -> float:
+        spent = self._spent[key]
+        return max(0.0, spent[0][0] + self.window - now) if spent else self.window
+
+    @contextmanager
+    def reserve(self, user: str, tokens: int):
+        """Hold tokens from both budgets while a request runs; raises BudgetExceeded if they do not fit"""
+        now = time.monotonic()
+        with self._lock:
+            for key, limit, owner in self._limits(user):
+                if limit <= 0:
+                    continue
+                if tokens > limit:
+                    raise BudgetExceeded(
+                        f"This request needs about {tokens:,} tokens, more than {owner} budget of "
+                        f"{limit:,} tokens per {self.window / 60:.0f} min. Select a page range or a shorter clip."
+                    )
+                used = self._used(key, now)
+                if used + tokens > limit:
+                    raise BudgetExceeded(
+                        f"This request needs about {tokens:,} tokens but only {max(0, limit - used):,} of "
+                        f"{owner} token budget are left. Try again in "
+                        f"{self._retry_after(key, now) / 60:.0f} min."
+                    )
+            for key, _, _ in self._limits(user):
+                self._reserved[key] += tokens
+        reservation = Reservation(user, tokens)
+        try:
+            yield reservation
+        finally:
+            charged = reservation.used if reservation.used is not None else tokens
+            now = time.monotonic()
+            with self._lock:
+                for key, _, _ in self._limits(user):
+                    self._reserved[key] -= tokens
+                    if charged > 0:
+                        self._spent[key].append((now, charged))
+                        self._spent_totals[key] += charged
+
+
+_token_budget = None
+_token_budget_lock = threading.Lock()
+
+
+def get_token_budget() -> TokenBudget:
+    """Return the process-wide token budget"""
+    global _token_budget
+    with _token_budget_lock:
+        if _token_budget is None:
+            _token_budget = TokenBudget()
+        return _token_budget
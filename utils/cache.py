@@ -0,0 +1,208 @@
+import hashlib
+import os
+import sqlite3
+import threading
+import time
+
+from utils.config import CACHE_DIR, CACHE_MAX_AGE_SECONDS, CACHE_MAX_BYTES
+from utils.metrics import record_cache
+
+
+class EmptyResponse(Exception):
+    """Raised when the model returns no text, e.g. a blocked or truncated response"""
+
+
+def response_text(response) -> str:
+    """Return a response's text, or raise EmptyResponse saying why there is none"""
+    text = getattr(response, "text", None)
+    if text and text.strip():
+        return text
+    reason = getattr(getattr(response, "prompt_feedback", None), "block_reason", None)
+    if reason is None:
+        candidates = getattr(response, "candidates", None) or []
+        reason = getattr(candidates[0], "finish_reason", None) if candidates else None
+    detail = f" (reason: {getattr(reason, 'name', reason)})" if reason is not None else ""
+    raise EmptyResponse(f"The model returned no text{detail}. Try again, or rephrase the request.")
+
+
+def hash_bytes(data: bytes) -> str:
+    """Return the SHA-256 hex digest of a document"""
+    return hashlib.sha256(data).hexdigest()
+
+
+def make_cache_key(doc_hash: str, prompt: str, model: str) -> str:
+    """Build a content-addressed key from document hash, prompt and model.
+
+    When the prompt was rendered from a template, its template id (which
+    carries the template version) is part of the key too.
+    """
+    h = hashlib.sha256()
+    for part in (doc_hash, prompt, model, getattr(prompt, "template_id", "")):
+        h.update(part.encode("utf-8"))
+        h.update(b"\0")
+    return h.hexdigest()
+
+
+class ResultCache:
+    """Persistent analysis result cache backed by SQLite.
+
+    SQLite gives us cross-process safety for free, so several Streamlit
+    workers can share the same cache directory. `name` labels the cache's
+    hits and misses in the metrics. Empty results are never stored, and
+    any left by older versions are treated as misses.
+    """
+
+    def __init__(self, path: str, max_bytes: int = CACHE_MAX_BYTES,
+                 max_age: float = CACHE_MAX_AGE_SECONDS, name: str = "result"):
+        self.path = path
+        self.name = name
+        self.max_bytes = max_bytes
+        self.max_age = max_age
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+        dirname = os.path.dirname(path)
+        if dirname:
+            os.makedirs(dirname, exist_ok=True)
+        with self._connect() as conn:
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS results ("
+                " key TEXT PRIMARY KEY,"
+                " value TEXT NOT NULL,"
+                " size INTEGER NOT NULL,"
+                " created REAL NOT NULL,"
+                " accessed REAL NOT NULL)"
+            )
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS stats ("
+                " name TEXT PRIMARY KEY,"
+                " value INTEGER NOT NULL)"
+            )
+
+    def _connect(self):
+        return sqlite3.connect(self.path, timeout=30)
+
+    def _bump(self, conn, name: str):
+        conn.execute(
+            "INSERT INTO stats (name, value) VALUES (?, 1) "
+            "ON CONFLICT(name) DO UPDATE SET value = value + 1",
+            (name,)
+        )
+
+    def get(self, key: str):
+        """Return the cached text for key, or None on a miss"""
+        now = time.time()
+        with self._lock, self._connect() as conn:
+            row = conn.execute(
+                "SELECT value, created FROM results WHERE key = ?", (key,)
+            ).fetchone()
+            if row is not None and (not row[0] or (self.max_age and now - row[1] > self.max_age)):
+                conn.execute("DELETE FROM results WHERE key = ?", (key,))
+                row = None
+            if row is None:
+                self.misses += 1
+                self._bump(conn, "misses")
+                record_cache(self.name, hit=False)
+                return None
+            conn.execute("UPDATE results SET accessed = ? WHERE key = ?", (now, key))
+            self.hits += 1
+            record_cache(self.name, hit=True)
+            self._bump(conn, "hits")
+            return row[0]
+
+    def contains(self, key: str) -> bool:
+        """True when a fresh result is cached for key; not counted as a hit or miss"""
+        with self._lock, self._connect() as conn:
+            row = conn.execute("SELECT created FROM results WHERE key = ? AND size > 0", (key,)).fetchone()
+        return row is not None and not (self.max_age and time.time() - row[0] > self.max_age)
+
+    def set(self, key: str, value: str):
+        """Store a result and evict old entries if over budget; empty results are not stored"""
+        if not value:
+            return
+        now = time.time()
+        size = len(value.encode("utf-8"))
+        with self._lock, self._connect() as conn:
+            conn.execute(
+                "INSERT OR REPLACE INTO results (key, value, size, created, accessed) "
+                "VALUES (?, ?, ?, ?, ?)",
+                (key, value, size, now, now)
+            )
+            self._evict(conn, now)
+
+    def _evict(self, conn, now: float):
+        if self.max_age:
+            conn.execute("DELETE FROM results WHERE created < ?", (now - self.max_age,))
+        total = conn.execute("SELECT COALESCE(SUM(size), 0) FROM results").fetchone()[0]
+        if total <= self.max_bytes:
+            return
+        # Drop least recently used entries until we fit in the budget
+        for key, size in conn.execute(
+            "SELECT key, size FROM results ORDER BY accessed ASC"
+        ).fetchall():
+            conn.execute("DELETE FROM results WHERE key = ?", (key,))
+            total -= size
+            if total <= self.max_bytes:
+                break
+
+    def stats(self) -> dict:
+        """Return hit/miss counters for this process and across all processes"""
+        with self._connect() as conn:
+            shared = dict(conn.execute("SELECT name, value FROM stats").fetchall())
+            entries, size = conn.execute(
+                "SELECT COUNT(*), COALESCE(SUM(size), 0) FROM results"
+            ).fetchone()
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "total_hits": shared.get("hits", 0),
+            "total_misses": shared.get("misses", 0),
+            "entries": entries,
+            "bytes": size,
+        }
+
+    def clear(self):
+        """Remove every cached result"""
+        with self._lock, self._connect() as conn:
+            conn.execute("DELETE FROM results")
+
+
+_result_cache = None
+_result_cache_lock = threading.Lock()
+
+
+def get_result_cache() -> ResultCache:
+    """Return the process-wide result cache, creating it on first use"""
+    global _result_cache
+    with _result_cache_lock:
+        if _result_cache is None:
+            _result_cache = ResultCache(os.path.join(CACHE_DIR, "results.sqlite3"))
+        return _result_cache
+
+
+def cached_stream(key: str, make_stream):
+    """Yield text chunks from make_stream(), caching the assembled text.
+
+    On a hit the cached text is yielded in one piece. The result is only
+    stored once the stream has been fully consumed, so an abandoned stream
+    never leaves a truncated entry behind. A stream that produced no text
+    raises EmptyResponse instead of being cached.
+    """
+    cache = get_result_cache()
+    cached = cache.get(key)
+    if cached is not None:
+        yield cached
+        return
+
+    chunks, last = [], None
+    for chunk in make_stream():
+        last = chunk
+        if chunk.text:
+            chunks.append(chunk.text)
+            yield chunk.text
+    text = "".join(chunks)
+    if not text.strip():
+        # Raises with the block or finish reason carried by the last chunk
+        response_text(last)
+    cache.set(key, text)
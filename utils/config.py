@@ -1,57 +1,209 @@
 import os
-from google import genai 
-from google.genai import types
+import threading
 from dotenv import load_dotenv
-import streamlit as st
-from PIL import Image
-from io import BytesIO
-import base64
+from utils.lazy import lazy_import
 
-def configure_api():
-    """Configure Google Generative AI and return a client"""
-    # Load environment variables
-    load_dotenv()
+# google.genai takes most of the app's import time; it is loaded when first used
+genai = lazy_import("google.genai")
+types = lazy_import("google.genai.types")
+
+# Load environment variables once per process
+load_dotenv()
+
+_client = None
+_client_lock = threading.Lock()
+
+class LazyClient:
+    """Proxy creating the genai.Client (and importing the SDK) on first attribute access"""
     
-    # Get API key from environment
-    api_key = os.getenv("GOOGLE_GENAI_API_KEY")
-    if not api_key:
-        return None
+    def __init__(self, api_key: str):
+        self._api_key = api_key
+        self._client = None
+        self._lock = threading.Lock()
     
-    # Create and return client instance directly (no configure method needed)
-    return genai.Client(api_key=api_key)
+    def _load(self):
+        with self._lock:
+            if self._client is None:
+                self._client = genai.Client(
+                    api_key=self._api_key,
+                    http_options=types.HttpOptions(timeout=int(REQUEST_DEADLINE_SECONDS * 1000))
+                )
+        return self._client
+    
+    def __getattr__(self, name):
+        return getattr(self._client or self._load(), name)
+
+def get_client():
+    """Return the process-wide Gemini client, creating it on first use.
+    
+    The client is shared by every session and rerun so its HTTP connections
+    are reused. It is a LazyClient, so pages that make no model call never
+    import the SDK. Returns None when no API key is configured.
+    """
+    global _client
+    with _client_lock:
+        if _client is None:
+            # Get API key from environment
+            api_key = os.getenv("GOOGLE_GENAI_API_KEY")
+            if not api_key:
+                return None
+            _client = LazyClient(api_key)
+        return _client
+
+def configure_api():
+    """Configure Google Generative AI and return a client"""
+    return get_client()
 
 # Available models
 MODELS = {
     "default": "models/gemini-2.0-flash",
     "advanced": "models/gemini-2.5-flash-preview-04-17",
     "pro": "models/gemini-2.0-pro",
-    "image_gen": "gemini-2.0-flash-exp-image-generation"  # New model for image generation
+    "image_gen": "gemini-2.0-flash-exp-image-generation",  # New model for image generation
+    "embedding": "models/text-embedding-004"
+}
+
+# Model used for each task, as a MODELS key or a full model name.
+# Any entry can be overridden with HIKMAMIND_MODEL_<TASK>, e.g. HIKMAMIND_MODEL_PDF_SUMMARY.
+TASK_MODELS = {
+    "pdf_analysis": "advanced",
+    "pdf_summary": "default",
+    "chunk_summary": "default",
+    "video_analysis": "advanced",
+    "video_summary": "default",
+    "image": "image_gen",
+    "embedding": "embedding",
+    "paper_question": "default",
+    "paper_digest": "default",
+    "comparison": "advanced",
 }
 
+def get_model(task: str) -> str:
+    """Return the model name to use for a task"""
+    name = os.getenv(f"HIKMAMIND_MODEL_{task.upper()}") or TASK_MODELS.get(task, "advanced")
+    return MODELS.get(name, name)
+
 def generate_image(client, prompt):
-    """Generate an image based on a text prompt using Gemini."""
-    try:
-        response = client.models.generate_content(
-            model=MODELS["image_gen"],
+    """Generate an image based on a text prompt using Gemini.
+    
+    Errors are raised to the caller rather than returned as text.
+    """
+    # Imported here because these modules read their settings from this one
+    from utils.metrics import timed
+    from utils.scheduler import get_scheduler
+    
+    model = get_model("image")
+    with timed("image", model) as timer:
+        response = get_scheduler().run(lambda: client.models.generate_content(
+            model=model,
             contents=prompt,
             config=types.GenerateContentConfig(
                 response_modalities=['TEXT', 'IMAGE']
             )
-        )
-        
-        # Process response for images
-        image_data = None
-        text_response = None
-        
-        for part in response.candidates[0].content.parts:
-            if part.text is not None:
-                text_response = part.text
-            elif part.inline_data is not None:
-                image_data = part.inline_data.data
-                
-        return text_response, image_data
-    except Exception as e:
-        return str(e), None
+        ))
+        timer.record_usage(response)
+    
+    # Process response for images
+    image_data = None
+    text_response = None
+    
+    for part in response.candidates[0].content.parts:
+        if part.text is not None:
+            text_response = part.text
+        elif part.inline_data is not None:
+            image_data = part.inline_data.data
+    
+    return text_response, image_data
+
+# Pre-flight routing: inputs estimated at up to ROUTING_FAST_MAX_TOKENS go to the fast tier,
+# inputs above ROUTING_MAX_INPUT_TOKENS are rejected before any request is sent
+ROUTING_ENABLED = os.getenv("HIKMAMIND_ROUTING", "1") == "1"
+ROUTING_FAST_TIER = os.getenv("HIKMAMIND_ROUTING_FAST_TIER", "default")
+ROUTING_FAST_MAX_TOKENS = int(os.getenv("HIKMAMIND_ROUTING_FAST_MAX_TOKENS", "8000"))
+ROUTING_MAX_INPUT_TOKENS = int(os.getenv("HIKMAMIND_ROUTING_MAX_INPUT_TOKENS", "1000000"))
+
+# Token budgets over a rolling window (0 = unlimited); past DOWNGRADE_AT of a budget, requests use the fast tier
+TOKEN_BUDGET_WINDOW_SECONDS = float(os.getenv("HIKMAMIND_TOKEN_BUDGET_WINDOW", "3600"))
+TOKEN_BUDGET_PER_USER = int(os.getenv("HIKMAMIND_TOKEN_BUDGET_PER_USER", "2000000"))
+TOKEN_BUDGET_PER_PROCESS = int(os.getenv("HIKMAMIND_TOKEN_BUDGET_PER_PROCESS", "20000000"))
+TOKEN_BUDGET_DOWNGRADE_AT = float(os.getenv("HIKMAMIND_TOKEN_BUDGET_DOWNGRADE_AT", "0.8"))
+
+# Request scheduling: quota-sized rate limit, retries and per-call deadline
+RATE_LIMIT_RPM = float(os.getenv("HIKMAMIND_RATE_LIMIT_RPM", "60"))
+RATE_LIMIT_BURST = float(os.getenv("HIKMAMIND_RATE_LIMIT_BURST", "10"))
+RETRY_MAX_ATTEMPTS = int(os.getenv("HIKMAMIND_RETRY_MAX_ATTEMPTS", "5"))
+RETRY_BASE_DELAY_SECONDS = float(os.getenv("HIKMAMIND_RETRY_BASE_DELAY", "1.0"))
+REQUEST_DEADLINE_SECONDS = float(os.getenv("HIKMAMIND_REQUEST_DEADLINE", "300"))
+
+# Metrics settings: optional JSONL log and Prometheus /metrics port
+METRICS_LOG_PATH = os.getenv("HIKMAMIND_METRICS_LOG", "")
+METRICS_PORT = int(os.getenv("HIKMAMIND_METRICS_PORT", "0"))
+METRICS_WINDOW = int(os.getenv("HIKMAMIND_METRICS_WINDOW", "1000"))
+SHOW_ADMIN_PANEL = os.getenv("HIKMAMIND_ADMIN_PANEL", "1") == "1"
+
+# Result cache settings
+CACHE_DIR = os.getenv("HIKMAMIND_CACHE_DIR", os.path.join(os.path.expanduser("~"), ".cache", "hikmamind"))
+CACHE_MAX_BYTES = int(os.getenv("HIKMAMIND_CACHE_MAX_BYTES", str(200 * 1024 * 1024)))
+CACHE_MAX_AGE_SECONDS = float(os.getenv("HIKMAMIND_CACHE_MAX_AGE", str(7 * 24 * 3600)))
+
+# Files API settings: PDFs above this size are uploaded once and referenced
+INLINE_PDF_MAX_BYTES = int(os.getenv("HIKMAMIND_INLINE_PDF_MAX_BYTES", str(5 * 1024 * 1024)))
+FILE_REF_TTL_SECONDS = float(os.getenv("HIKMAMIND_FILE_REF_TTL", str(47 * 3600)))
+
+# Uploaded PDFs are spooled to disk once; this caps the bytes of documents held in memory per process
+UPLOAD_DIR = os.getenv("HIKMAMIND_UPLOAD_DIR", os.path.join(CACHE_DIR, "uploads"))
+UPLOAD_MEMORY_BUDGET_BYTES = int(os.getenv("HIKMAMIND_UPLOAD_MEMORY_BUDGET_BYTES", str(256 * 1024 * 1024)))
+UPLOAD_DISK_MAX_BYTES = int(os.getenv("HIKMAMIND_UPLOAD_DISK_MAX_BYTES", str(1024 * 1024 * 1024)))
+UPLOAD_MAX_AGE_SECONDS = float(os.getenv("HIKMAMIND_UPLOAD_MAX_AGE", str(24 * 3600)))
+
+# Speculative preparation (download, hashing, staging, cache check) of inputs before "Analyze" is clicked
+PREFETCH_ENABLED = os.getenv("HIKMAMIND_PREFETCH", "1") == "1"
+PREFETCH_MAX_WORKERS = int(os.getenv("HIKMAMIND_PREFETCH_MAX_WORKERS", "4"))
+
+# Provider-side context caching for documents analyzed more than once (a TTL of 0 disables it)
+CONTEXT_CACHE_TTL_SECONDS = float(os.getenv("HIKMAMIND_CONTEXT_CACHE_TTL", "3600"))
+CONTEXT_CACHE_MIN_BYTES = int(os.getenv("HIKMAMIND_CONTEXT_CACHE_MIN_BYTES", str(200 * 1024)))
+
+# PDF download settings
+PDF_MAX_DOWNLOAD_BYTES = int(os.getenv("HIKMAMIND_PDF_MAX_DOWNLOAD_BYTES", str(100 * 1024 * 1024)))
+HTTP_TIMEOUT_SECONDS = float(os.getenv("HIKMAMIND_HTTP_TIMEOUT", "60"))
+HTTP_MAX_CONNECTIONS = int(os.getenv("HIKMAMIND_HTTP_MAX_CONNECTIONS", "20"))
+
+# Large document (chunked map-reduce) settings
+CHUNK_MAX_TOKENS = int(os.getenv("HIKMAMIND_CHUNK_MAX_TOKENS", "8000"))
+CHUNK_MAX_WORKERS = int(os.getenv("HIKMAMIND_CHUNK_MAX_WORKERS", "4"))
+
+# Background job settings
+JOB_MAX_WORKERS = int(os.getenv("HIKMAMIND_JOB_MAX_WORKERS", "8"))
+JOB_TTL_SECONDS = float(os.getenv("HIKMAMIND_JOB_TTL", "3600"))
+JOB_POLL_SECONDS = float(os.getenv("HIKMAMIND_JOB_POLL_SECONDS", "0.5"))
+
+# YouTube transcript settings; the fixtures directory replaces the live fetcher
+TRANSCRIPT_FIXTURES_DIR = os.getenv("HIKMAMIND_TRANSCRIPT_FIXTURES", "")
+TRANSCRIPT_LANGUAGES = [lang.strip() for lang in os.getenv("HIKMAMIND_TRANSCRIPT_LANGUAGES", "en").split(",") if lang.strip()]
+
+# Batch analysis settings
+BATCH_MAX_WORKERS = int(os.getenv("HIKMAMIND_BATCH_MAX_WORKERS", "4"))
+BATCH_MAX_RETRIES = int(os.getenv("HIKMAMIND_BATCH_MAX_RETRIES", "2"))
+
+# Analysis history settings
+HISTORY_DB_PATH = os.getenv("HIKMAMIND_HISTORY_DB", os.path.join(CACHE_DIR, "history.sqlite3"))
+HISTORY_PAGE_SIZE = int(os.getenv("HIKMAMIND_HISTORY_PAGE_SIZE", "50"))
+
+# Question answering index: "gemini" embeds with the embedding model, "hashing" is local and deterministic
+EMBEDDER = os.getenv("HIKMAMIND_EMBEDDER", "gemini")
+INDEX_CHUNK_TOKENS = int(os.getenv("HIKMAMIND_INDEX_CHUNK_TOKENS", "400"))
+INDEX_TOP_K = int(os.getenv("HIKMAMIND_INDEX_TOP_K", "6"))
+INDEX_MEMORY_ENTRIES = int(os.getenv("HIKMAMIND_INDEX_MEMORY_ENTRIES", "16"))
+
+# Generated image settings
+IMAGE_CACHE_MAX_BYTES = int(os.getenv("HIKMAMIND_IMAGE_CACHE_MAX_BYTES", str(200 * 1024 * 1024)))
+IMAGE_THUMBNAIL_PX = int(os.getenv("HIKMAMIND_IMAGE_THUMBNAIL_PX", "512"))
+IMAGE_MAX_VARIANTS = int(os.getenv("HIKMAMIND_IMAGE_MAX_VARIANTS", "4"))
+
+# Paper comparison settings
+COMPARE_MAX_PAPERS = int(os.getenv("HIKMAMIND_COMPARE_MAX_PAPERS", "10"))
+COMPARE_MAX_WORKERS = int(os.getenv("HIKMAMIND_COMPARE_MAX_WORKERS", "4"))
 
 # Analogy styles available
 ANALOGY_STYLES = {
@@ -0,0 +1,226 @@
+import os
+import sqlite3
+import threading
+import time
+from dataclasses import asdict, dataclass, field as dataclass_field
+from typing import List, Optional
+
+from utils.config import HISTORY_DB_PATH
+from utils.jobs import LOCAL_USER, current_job
+
+
+@dataclass
+class HistoryEntry:
+    """One finished analysis, as recorded in the history store.
+
+    `owner` is the user it was run for; `options` describes the choices
+    other than the profile that shaped the prompt (page range, transcript...).
+    """
+    kind: str
+    source: str
+    source_hash: str
+    analysis_type: str
+    result: str
+    field: str = ""
+    knowledge_level: str = ""
+    analogy_style: str = ""
+    include_citations: bool = False
+    options: str = ""
+    owner: str = LOCAL_USER
+    model: str = ""
+    seconds: float = 0.0
+    tokens_in: int = 0
+    tokens_out: int = 0
+    created: float = dataclass_field(default_factory=time.time)
+    id: Optional[int] = None
+
+
+_COLUMNS = [name for name in HistoryEntry.__dataclass_fields__ if name != "id"]
+
+# Columns added after the first release, created on existing databases at startup
+_ADDED_COLUMNS = {
+    "include_citations": "INTEGER NOT NULL DEFAULT 0",
+    "options": "TEXT NOT NULL DEFAULT ''",
+    "owner": f"TEXT NOT NULL DEFAULT '{LOCAL_USER}'",
+}
+
+
+def _fts_query(text: str) -> str:
+    # Quote every term so user input can't use FTS5 syntax; the last term matches as a prefix
+    terms = ['"{}"'.format(term.replace('"', '""')) for term in text.split()]
+    if terms:
+        terms[-1] += "*"
+    return " ".join(terms)
+
+
+class HistoryStore:
+    """Persistent log of analyses with full-text search, backed by SQLite FTS5.
+
+    Entries belong to the user they were run for (see get_user_id): searches
+    and deletes only ever see that user's entries. Falls back to LIKE matching when
+    the SQLite build has no FTS5.
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        self._lock = threading.Lock()
+        dirname = os.path.dirname(path)
+        if dirname:
+            os.makedirs(dirname, exist_ok=True)
+        with self._connect() as conn:
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS analyses ("
+                " id INTEGER PRIMARY KEY,"
+                " kind TEXT NOT NULL,"
+                " source TEXT NOT NULL,"
+                " source_hash TEXT NOT NULL,"
+                " analysis_type TEXT NOT NULL,"
+                " result TEXT NOT NULL,"
+                " field TEXT, knowledge_level TEXT, analogy_style TEXT,"
+                " model TEXT, seconds REAL, tokens_in INTEGER, tokens_out INTEGER,"
+                " created REAL NOT NULL)"
+            )
+            existing = {row["name"] for row in conn.execute("PRAGMA table_info(analyses)")}
+            for name, definition in _ADDED_COLUMNS.items():
+                if name not in existing:
+                    conn.execute(f"ALTER TABLE analyses ADD COLUMN {name} {definition}")
+            # Entries recorded outside of a job used to have no owner
+            conn.execute("UPDATE analyses SET owner = ? WHERE owner = ''", (LOCAL_USER,))
+            conn.execute("CREATE INDEX IF NOT EXISTS analyses_created ON analyses (created)")
+            conn.execute("CREATE INDEX IF NOT EXISTS analyses_owner ON analyses (owner, created)")
+            conn.execute("CREATE INDEX IF NOT EXISTS analyses_source ON analyses (source_hash)")
+            self.fts = self._create_fts(conn)
+
+    def _connect(self):
+        conn = sqlite3.connect(self.path, timeout=30)
+        conn.row_factory = sqlite3.Row
+        return conn
+
+    def _create_fts(self, conn) -> bool:
+        try:
+            conn.execute(
+                "CREATE VIRTUAL TABLE IF NOT EXISTS analyses_fts USING fts5("
+                " source, analysis_type, result, content='analyses', content_rowid='id')"
+            )
+        except sqlite3.OperationalError:
+            return False
+        # External-content table: keep the index in sync through triggers
+        conn.execute(
+            "CREATE TRIGGER IF NOT EXISTS analyses_ai AFTER INSERT ON analyses BEGIN"
+            " INSERT INTO analyses_fts (rowid, source, analysis_type, result)"
+            " VALUES (new.id, new.source, new.analysis_type, new.result); END"
+        )
+        conn.execute(
+            "CREATE TRIGGER IF NOT EXISTS analyses_ad AFTER DELETE ON analyses BEGIN"
+            " INSERT INTO analyses_fts (analyses_fts, rowid, source, analysis_type, result)"
+            " VALUES ('delete', old.id, old.source, old.analysis_type, old.result); END"
+        )
+        return True
+
+    def add(self, entry: HistoryEntry) -> int:
+        """Record an analysis and return its id"""
+        values = asdict(entry)
+        with self._lock, self._connect() as conn:
+            cursor = conn.execute(
+                f"INSERT INTO analyses ({', '.join(_COLUMNS)}) VALUES ({', '.join('?' for _ in _COLUMNS)})",
+                [values[name] for name in _COLUMNS]
+            )
+            entry.id = cursor.lastrowid
+        return entry.id
+
+    def get(self, entry_id: int, owner: str) -> Optional[HistoryEntry]:
+        with self._connect() as conn:
+            row = conn.execute("SELECT * FROM analyses WHERE id = ? AND owner = ?", (entry_id, owner)).fetchone()
+        return _entry(row) if row else None
+
+    def search(self, owner: str, query: str = "", kind: str = None, limit: int = 50,
+               user_profile=None) -> List[HistoryEntry]:
+        """Return the owner's matching analyses, best match first; the most recent ones when query is empty.
+
+        With user_profile, only analyses made for that same profile are returned.
+        """
+        where, params = ["a.owner = ?"], [owner]
+        if user_profile is not None:
+            where.append("a.field = ? AND a.knowledge_level = ? AND a.analogy_style = ? AND a.include_citations = ?")
+            params.extend([user_profile.field, user_profile.knowledge_level, user_profile.analogy_style,
+                           int(bool(getattr(user_profile, "include_citations", False)))])
+        if kind:
+            where.append("a.kind = ?")
+            params.append(kind)
+        query = (query or "").strip()
+        if query and self.fts:
+            sql = "SELECT a.* FROM analyses_fts JOIN analyses a ON a.id = analyses_fts.rowid"
+            where.insert(0, "analyses_fts MATCH ?")
+            params.insert(0, _fts_query(query))
+            order = "bm25(analyses_fts), a.created DESC"
+        else:
+            sql = "SELECT a.* FROM analyses a"
+            if query:
+                where.append("(a.source LIKE ? OR a.analysis_type LIKE ? OR a.result LIKE ?)")
+                params.extend([f"%{query}%"] * 3)
+            order = "a.created DESC"
+        sql += " WHERE " + " AND ".join(where)
+        sql += f" ORDER BY {order} LIMIT ?"
+        params.append(limit)
+        with self._connect() as conn:
+            rows = conn.execute(sql, params).fetchall()
+        return [_entry(row) for row in rows]
+
+    def delete(self, entry_id: int, owner: str) -> bool:
+        """Delete one of the owner's analyses; returns False if it is not theirs or no longer exists"""
+        with self._lock, self._connect() as conn:
+            cursor = conn.execute("DELETE FROM analyses WHERE id = ? AND owner = ?", (entry_id, owner))
+        return cursor.rowcount > 0
+
+
+def _entry(row) -> HistoryEntry:
+    entry = HistoryEntry(**dict(row))
+    entry.include_citations = bool(entry.include_citations)
+    return entry
+
+
+_history_store = None
+_history_store_lock = threading.Lock()
+
+
+def get_history_store() -> HistoryStore:
+    """Return the process-wide history store"""
+    global _history_store
+    with _history_store_lock:
+        if _history_store is None:
+            _history_store = HistoryStore(HISTORY_DB_PATH)
+        return _history_store
+
+
+def record_analysis(kind: str, source: str, source_hash: str, analysis_type: str, result: str,
+                    user_profile=None, model: str = "", seconds: float = 0.0, options: str = ""):
+    """Save a finished analysis to the history.
+
+    The owner and token counts come from the current job, the owner being
+    the local user outside of one; `options`
+    describes the choices besides the profile that shaped the prompt.
+    """
+    job = current_job()
+    entry = HistoryEntry(
+        kind=kind,
+        source=source,
+        source_hash=source_hash,
+        analysis_type=analysis_type,
+        result=result,
+        field=getattr(user_profile, "field", ""),
+        knowledge_level=getattr(user_profile, "knowledge_level", ""),
+        analogy_style=getattr(user_profile, "analogy_style", ""),
+        include_citations=bool(getattr(user_profile, "include_citations", False)),
+        options=options,
+        owner=job.user if job else LOCAL_USER,
+        model=model or "",
+        seconds=seconds,
+        tokens_in=job.tokens_in if job else 0,
+        tokens_out=job.tokens_out if job else 0,
+    )
+    try:
+        return get_history_store().add(entry)
+    except sqlite3.Error:
+        # Losing a history entry must never fail the analysis itself
+        return None
@@ -0,0 +1,227 @@
+import hashlib
+import json
+import os
+import tempfile
+import threading
+import time
+
+from utils.config import (
+    CACHE_DIR,
+    CACHE_MAX_AGE_SECONDS,
+    CACHE_MAX_BYTES,
+    HTTP_MAX_CONNECTIONS,
+    HTTP_TIMEOUT_SECONDS,
+    PDF_MAX_DOWNLOAD_BYTES,
+)
+from utils.lazy import lazy_import
+from utils.metrics import timed
+
+httpx = lazy_import("httpx")
+
+# Downloads larger than this are spooled to disk instead of held in memory
+SPOOL_MEMORY_BYTES = 8 * 1024 * 1024
+
+# Content types some servers use for PDFs besides application/pdf
+PDF_CONTENT_TYPES = {
+    "application/pdf",
+    "application/x-pdf",
+    "application/octet-stream",
+    "binary/octet-stream",
+}
+
+
+class DownloadError(Exception):
+    """Raised when a URL cannot be fetched as a PDF"""
+
+
+class DownloadCancelled(DownloadError):
+    """Raised when a download is abandoned through its cancel event"""
+
+
+_http_client = None
+_http_client_lock = threading.Lock()
+
+
+def get_http_client() -> "httpx.Client":
+    """Return the process-wide pooled HTTP client"""
+    global _http_client
+    with _http_client_lock:
+        if _http_client is None:
+            _http_client = httpx.Client(
+                follow_redirects=True,
+                timeout=httpx.Timeout(HTTP_TIMEOUT_SECONDS, connect=10.0),
+                limits=httpx.Limits(
+                    max_connections=HTTP_MAX_CONNECTIONS,
+                    max_keepalive_connections=HTTP_MAX_CONNECTIONS
+                ),
+                headers={"User-Agent": "HikmaMind/1.0"}
+            )
+        return _http_client
+
+
+class DownloadStore:
+    """On-disk copies of downloaded PDFs with their ETag/Last-Modified validators.
+
+    Bounded like the result cache: copies older than max_age are ignored
+    and, on every write, expired and least recently used copies are deleted
+    until the rest fit in max_bytes.
+    """
+
+    def __init__(self, directory: str, max_bytes: int = CACHE_MAX_BYTES, max_age: float = CACHE_MAX_AGE_SECONDS):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self.max_age = max_age
+        os.makedirs(directory, exist_ok=True)
+
+    def _paths(self, url: str):
+        name = hashlib.sha256(url.encode("utf-8")).hexdigest()
+        base = os.path.join(self.directory, name)
+        return base + ".pdf", base + ".json"
+
+    def validators(self, url: str) -> dict:
+        """Return the stored validators for url, or an empty dict"""
+        body_path, meta_path = self._paths(url)
+        try:
+            if self.max_age and time.time() - os.path.getmtime(body_path) > self.max_age:
+                return {}
+        except OSError:
+            return {}
+        try:
+            with open(meta_path, encoding="utf-8") as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return {}
+
+    def size(self, url: str) -> int:
+        return os.path.getsize(self._paths(url)[0])
+
+    def read(self, url: str) -> bytes:
+        """Return a stored copy, marking it as revalidated and recently used"""
+        body_path, _ = self._paths(url)
+        with open(body_path, "rb") as f:
+            data = f.read()
+        try:
+            os.utime(body_path)
+        except OSError:
+            pass
+        return data
+
+    def write(self, url: str, body, validators: dict):
+        """Store a spooled body and its validators atomically"""
+        body_path, meta_path = self._paths(url)
+        fd, tmp_path = tempfile.mkstemp(dir=self.directory)
+        with os.fdopen(fd, "wb") as f:
+            body.seek(0)
+            while True:
+                block = body.read(1024 * 1024)
+                if not block:
+                    break
+                f.write(block)
+        os.replace(tmp_path, body_path)
+        fd, tmp_path = tempfile.mkstemp(dir=self.directory)
+        with os.fdopen(fd, "w", encoding="utf-8") as f:
+            json.dump(validators, f)
+        os.replace(tmp_path, meta_path)
+        self._evict(keep=body_path)
+
+    def _evict(self, keep: str):
+        now = time.time()
+        copies = []
+        for entry in os.scandir(self.directory):
+            if entry.name.endswith(".pdf"):
+                stat = entry.stat()
+                copies.append((stat.st_mtime, stat.st_size, entry.path))
+        total = sum(size for _, size, _ in copies)
+        for mtime, size, body_path in sorted(copies):
+            expired = self.max_age and now - mtime > self.max_age
+            if body_path == keep or (total <= self.max_bytes and not expired):
+                continue
+            for path in (body_path, body_path[:-len(".pdf")] + ".json"):
+                try:
+                    os.remove(path)
+                except OSError:
+                    pass
+            total -= size
+
+
+_download_store = None
+
+
+def get_download_store() -> DownloadStore:
+    global _download_store
+    with _http_client_lock:
+        if _download_store is None:
+            _download_store = DownloadStore(os.path.join(CACHE_DIR, "downloads"))
+        return _download_store
+
+
+def _check_content_type(response: "httpx.Response"):
+    content_type = response.headers.get("content-type", "").split(";")[0].strip().lower()
+    if content_type and content_type not in PDF_CONTENT_TYPES:
+        raise DownloadError(f"URL did not return a PDF (content type: {content_type})")
+
+
+def fetch_pdf(url: str, max_bytes: int = PDF_MAX_DOWNLOAD_BYTES, cancel: threading.Event = None) -> bytes:
+    """Download a PDF through the shared client, recording download metrics.
+    
+    Setting cancel aborts the download at the next block with DownloadCancelled.
+    """
+    with timed("download") as timer:
+        pdf_data = _fetch_pdf(url, max_bytes, cancel)
+        timer.bytes = len(pdf_data)
+        return pdf_data
+
+
+def _fetch_pdf(url: str, max_bytes: int, cancel: threading.Event = None) -> bytes:
+    """Download a PDF.
+
+    The body is streamed into a spooled temporary file and aborted as soon
+    as it exceeds max_bytes. When a previous copy exists, the request is
+    made conditional on its ETag/Last-Modified so an unchanged document is
+    revalidated with a 304 instead of downloaded again.
+    """
+    store = get_download_store()
+    validators = store.validators(url)
+    headers = {}
+    if validators.get("etag"):
+        headers["If-None-Match"] = validators["etag"]
+    if validators.get("last_modified"):
+        headers["If-Modified-Since"] = validators["last_modified"]
+
+    try:
+        with get_http_client().stream("GET", url, headers=headers) as response:
+            if response.status_code == 304 and validators:
+                # The limit may have been lowered since the copy was stored
+                if store.size(url) > max_bytes:
+                    raise DownloadError(f"PDF exceeds the download size limit of {max_bytes:,} bytes")
+                return store.read(url)
+            if response.status_code >= 400:
+                raise DownloadError(f"Download failed with HTTP {response.status_code}")
+            _check_content_type(response)
+
+            content_length = response.headers.get("content-length")
+            if content_length and content_length.isdigit() and int(content_length) > max_bytes:
+                raise DownloadError(f"PDF exceeds the download size limit of {max_bytes:,} bytes")
+
+            with tempfile.SpooledTemporaryFile(max_size=SPOOL_MEMORY_BYTES) as body:
+                size = 0
+                for block in response.iter_bytes():
+                    if cancel is not None and cancel.is_set():
+                        raise DownloadCancelled(f"Download of {url} was cancelled")
+                    if size == 0 and b"%PDF" not in block[:1024]:
+                        raise DownloadError("URL did not return a PDF document")
+                    size += len(block)
+                    if size > max_bytes:
+                        raise DownloadError(f"PDF exceeds the download size limit of {max_bytes:,} bytes")
+                    body.write(block)
+
+                new_validators = {
+                    "etag": response.headers.get("etag"),
+                    "last_modified": response.headers.get("last-modified"),
+                }
+                if new_validators["etag"] or new_validators["last_modified"]:
+                    store.write(url, body, new_validators)
+                body.seek(0)
+                return body.read()
+    except httpx.HTTPError as e:
+        raise DownloadError(f"Could not download PDF: {e}") from e
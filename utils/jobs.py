@@ -0,0 +1,204 @@
+import threading
+import time
+import uuid
+from contextlib import contextmanager
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from dataclasses import dataclass, field
+from typing import Any, Callable, Iterable, Iterator, Optional, Tuple
+
+from utils.config import JOB_MAX_WORKERS, JOB_TTL_SECONDS
+
+# Owner of work done outside of the web UI (CLI, Python API), and of UI work without a ?user= link
+LOCAL_USER = "local"
+
+_current = threading.local()
+_usage_lock = threading.Lock()
+
+
+@dataclass
+class Job:
+    """A unit of work running off the Streamlit script thread"""
+    id: str
+    session_id: str
+    label: str
+    user: str = LOCAL_USER
+    status: str = "queued"
+    progress: float = 0.0
+    message: str = ""
+    partial: str = ""
+    result: Any = None
+    error: Optional[str] = None
+    tokens_in: int = 0
+    tokens_out: int = 0
+    created: float = field(default_factory=time.time)
+    finished: Optional[float] = None
+
+    @property
+    def done(self) -> bool:
+        return self.status in ("done", "failed")
+
+    def update(self, progress: float = None, message: str = None):
+        """Report progress (0..1) and/or a status message"""
+        if progress is not None:
+            self.progress = max(0.0, min(1.0, progress))
+        if message is not None:
+            self.message = message
+
+    def append(self, text: str):
+        """Append streamed output so pollers can show it before the job ends"""
+        self.partial += text
+
+    def add_usage(self, tokens_in: int, tokens_out: int):
+        """Add the tokens of one model call made by this job (possibly from one of its worker threads)"""
+        with _usage_lock:
+            self.tokens_in += tokens_in
+            self.tokens_out += tokens_out
+
+
+def current_job() -> Optional[Job]:
+    """Return the job running on this thread, if any"""
+    return getattr(_current, "job", None)
+
+
+class UsageMeter:
+    """Tokens used by the model calls made inside one metered() block, worker threads included"""
+
+    def __init__(self, parent: "UsageMeter" = None):
+        self.parent = parent
+        self.tokens = 0
+
+    def add(self, tokens: int):
+        meter = self
+        with _usage_lock:
+            while meter is not None:
+                meter.tokens += tokens
+                meter = meter.parent
+
+
+def current_meter() -> Optional[UsageMeter]:
+    """Return the innermost usage meter of this thread, if any"""
+    return getattr(_current, "meter", None)
+
+
+@contextmanager
+def metered():
+    """Count the tokens of the model calls made in this block (also by in_job() workers it starts)"""
+    previous = current_meter()
+    meter = UsageMeter(previous)
+    _current.meter = meter
+    try:
+        yield meter
+    finally:
+        _current.meter = previous
+
+
+def in_job(job: Optional[Job], fn):
+    """Wrap fn to run as part of job on another thread, so its usage is attributed to the job.
+
+    The caller's usage meter, if any, is carried over as well.
+    """
+    meter = current_meter()
+
+    def run(*args, **kwargs):
+        previous = current_job(), current_meter()
+        _current.job, _current.meter = job, meter
+        try:
+            return fn(*args, **kwargs)
+        finally:
+            _current.job, _current.meter = previous
+    return run
+
+
+def map_bounded(fn: Callable, items: Iterable, max_workers: int) -> Iterator[Tuple[int, Any]]:
+    """Run fn over items on a thread pool, yielding (index, result) as each one finishes.
+
+    Items are pulled lazily and at most 2 * max_workers are in flight, so
+    long inputs are processed in constant memory. Workers run as part of
+    the caller's job.
+    """
+    max_workers = max(1, max_workers)
+    fn = in_job(current_job(), fn)
+    with ThreadPoolExecutor(max_workers=max_workers) as pool:
+        pending = {}
+        for index, item in enumerate(items):
+            if len(pending) >= 2 * max_workers:
+                for future in wait(pending, return_when=FIRST_COMPLETED).done:
+                    yield pending.pop(future), future.result()
+            pending[pool.submit(fn, item)] = index
+        while pending:
+            for future in wait(pending, return_when=FIRST_COMPLETED).done:
+                yield pending.pop(future), future.result()
+
+
+def report_progress(progress: float = None, message: str = None):
+    """Update the current job's progress; a no-op outside of a job"""
+    job = current_job()
+    if job is not None:
+        job.update(progress, message)
+
+
+class JobManager:
+    """Runs analyses on a thread pool and keeps their state across reruns.
+
+    Jobs are indexed by session id, so later reruns of the same browser
+    session can pick up status, partial output and results by job id. A
+    job also carries the user it runs for, which owns what it records in
+    the history. Finished jobs are dropped after ttl seconds.
+    """
+
+    def __init__(self, max_workers: int = JOB_MAX_WORKERS, ttl: float = JOB_TTL_SECONDS):
+        self.ttl = ttl
+        self._pool = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="hikmamind-job")
+        self._jobs = {}
+        self._lock = threading.Lock()
+
+    def submit(self, session_id: str, label: str, fn, *args, user: str = LOCAL_USER, **kwargs) -> Job:
+        """Queue fn(*args, **kwargs) on behalf of user and return its Job"""
+        job = Job(id=uuid.uuid4().hex, session_id=session_id, label=label, user=user)
+        with self._lock:
+            self._prune()
+            self._jobs[job.id] = job
+        self._pool.submit(self._run, job, fn, args, kwargs)
+        return job
+
+    def _run(self, job: Job, fn, args, kwargs):
+        _current.job = job
+        job.status = "running"
+        try:
+            job.result = fn(*args, **kwargs)
+            job.progress = 1.0
+            job.status = "done"
+        except Exception as e:
+            job.error = str(e)
+            job.status = "failed"
+        finally:
+            job.finished = time.time()
+            _current.job = None
+
+    def get(self, job_id: Optional[str]) -> Optional[Job]:
+        with self._lock:
+            return self._jobs.get(job_id) if job_id else None
+
+    def jobs_for(self, session_id: str) -> list:
+        """Return a session's jobs, newest first"""
+        with self._lock:
+            jobs = [job for job in self._jobs.values() if job.session_id == session_id]
+        return sorted(jobs, key=lambda job: job.created, reverse=True)
+
+    def _prune(self):
+        cutoff = time.time() - self.ttl
+        for job_id in [job_id for job_id, job in self._jobs.items() if job.finished and job.finished < cutoff]:
+            del self._jobs[job_id]
+
+
+_job_manager = None
+_job_manager_lock = threading.Lock()
+
+
+def get_job_manager() -> JobManager:
+    """Return the process-wide job manager"""
+    global _job_manager
+    with _job_manager_lock:
+        if _job_manager is None:
+            _job_manager = JobManager()
+        return _job_manager
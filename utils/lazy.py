@@ -0,0 +1,60 @@
+import importlib
+import threading
+import types
+
+
+class LazyModule(types.ModuleType):
+    """Stand-in for a module that is only imported on first attribute access.
+
+    Heavy dependencies (google.genai, pypdf, PIL, httpx) are bound to a
+    LazyModule at the top of the modules using them, so importing the app
+    does not pay for them until an analysis actually needs them.
+    """
+
+    def __init__(self, name: str):
+        super().__init__(name)
+        self._lock = threading.Lock()
+        self._module = None
+
+    def _load(self):
+        with self._lock:
+            if self._module is None:
+                self._module = importlib.import_module(self.__name__)
+        return self._module
+
+    def __getattr__(self, attr: str):
+        return getattr(self._module or self._load(), attr)
+
+    def __dir__(self):
+        return dir(self._load())
+
+
+def lazy_import(name: str) -> LazyModule:
+    """Return a proxy importing module `name` on first use"""
+    return LazyModule(name)
+
+
+_warmed_up = False
+_warm_up_lock = threading.Lock()
+
+
+def warm_up(*names: str):
+    """Import modules on a background thread, once per process.
+
+    Called after the first page is rendered, so the first analysis does
+    not wait for imports the page itself did not need.
+    """
+    global _warmed_up
+    with _warm_up_lock:
+        if _warmed_up:
+            return
+        _warmed_up = True
+
+    def run():
+        for name in names:
+            try:
+                importlib.import_module(name)
+            except ImportError:
+                pass
+
+    threading.Thread(target=run, name="hikmamind-warm-up", daemon=True).start()
@@ -0,0 +1,209 @@
+import json
+import threading
+import time
+from collections import defaultdict, deque
+from contextlib import contextmanager
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from utils.config import METRICS_LOG_PATH, METRICS_WINDOW
+from utils.jobs import current_job, current_meter
+
+_lock = threading.Lock()
+_durations = defaultdict(lambda: deque(maxlen=METRICS_WINDOW))
+_counters = defaultdict(lambda: defaultdict(float))
+# Lookups per cache name: {"result": {"hit": n, "miss": n}, "transcript": ..., "image": ...}
+_cache_counters = defaultdict(lambda: defaultdict(int))
+
+
+class StageTimer:
+    """Collects the measurements of one timed stage"""
+
+    def __init__(self, stage: str, model: str = None):
+        self.stage = stage
+        self.model = model
+        self.tokens_in = 0
+        self.tokens_out = 0
+        self.bytes = 0
+        self.first_chunk_seconds = None
+        # Set by the scheduler when the call shared another in-flight call's response
+        self.coalesced = False
+
+    def record_usage(self, response):
+        """Read token counts from a response's usage metadata, if present"""
+        usage = getattr(response, "usage_metadata", None)
+        if usage is None:
+            return
+        self.tokens_in = getattr(usage, "prompt_token_count", None) or self.tokens_in
+        self.tokens_out = getattr(usage, "candidates_token_count", None) or self.tokens_out
+
+
+def _record(timer: StageTimer, seconds: float, ok: bool):
+    if timer.coalesced:
+        # Only the call that reached the API is counted; the wait is observed as coalesced_wait
+        return
+    entry = {
+        "ts": time.time(),
+        "stage": timer.stage,
+        "seconds": round(seconds, 6),
+        "model": timer.model,
+        "tokens_in": timer.tokens_in,
+        "tokens_out": timer.tokens_out,
+        "bytes": timer.bytes,
+        "ok": ok,
+    }
+    if timer.first_chunk_seconds is not None:
+        entry["first_chunk_seconds"] = round(timer.first_chunk_seconds, 6)
+    job = current_job()
+    if job is not None:
+        job.add_usage(timer.tokens_in, timer.tokens_out)
+    meter = current_meter()
+    if meter is not None:
+        meter.add(timer.tokens_in + timer.tokens_out)
+    with _lock:
+        _durations[timer.stage].append(seconds)
+        counters = _counters[timer.stage]
+        counters["count"] += 1
+        counters["seconds"] += seconds
+        counters["tokens_in"] += timer.tokens_in
+        counters["tokens_out"] += timer.tokens_out
+        counters["bytes"] += timer.bytes
+        if not ok:
+            counters["errors"] += 1
+        if timer.first_chunk_seconds is not None:
+            _durations[f"{timer.stage}.first_chunk"].append(timer.first_chunk_seconds)
+        if METRICS_LOG_PATH:
+            with open(METRICS_LOG_PATH, "a", encoding="utf-8") as f:
+                f.write(json.dumps(entry) + "\n")
+
+
+@contextmanager
+def timed(stage: str, model: str = None):
+    """Time a stage; the yielded StageTimer can be given tokens and bytes"""
+    timer = StageTimer(stage, model)
+    start = time.perf_counter()
+    ok = False
+    try:
+        yield timer
+        ok = True
+    finally:
+        _record(timer, time.perf_counter() - start, ok)
+
+
+def observe(stage: str, seconds: float, size: int = 0):
+    """Record a duration measured by the caller, and optionally the bytes processed"""
+    timer = StageTimer(stage)
+    timer.bytes = size
+    _record(timer, seconds, True)
+
+
+def instrument_stream(make_stream, stage: str, model: str = None):
+    """Wrap the streaming response of make_stream(timer), timing first chunk and total and reading usage"""
+    with timed(stage, model) as timer:
+        start = time.perf_counter()
+        for chunk in make_stream(timer):
+            if timer.first_chunk_seconds is None:
+                timer.first_chunk_seconds = time.perf_counter() - start
+            timer.record_usage(chunk)
+            yield chunk
+
+
+def record_cache(name: str, hit: bool):
+    """Count a lookup in the named cache (result, transcript, image)"""
+    with _lock:
+        _cache_counters[name]["hit" if hit else "miss"] += 1
+
+
+def _percentile(values, q: float) -> float:
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    index = min(len(ordered) - 1, max(0, int(round(q * (len(ordered) - 1)))))
+    return ordered[index]
+
+
+def snapshot() -> list:
+    """Return one summary row per stage, with p50/p95 over the recent window"""
+    with _lock:
+        rows = []
+        for stage, values in sorted(_durations.items()):
+            values = list(values)
+            counters = _counters.get(stage, {})
+            rows.append({
+                "stage": stage,
+                "count": int(counters.get("count", len(values))),
+                "errors": int(counters.get("errors", 0)),
+                "p50_ms": round(_percentile(values, 0.50) * 1000, 1),
+                "p95_ms": round(_percentile(values, 0.95) * 1000, 1),
+                "tokens_in": int(counters.get("tokens_in", 0)),
+                "tokens_out": int(counters.get("tokens_out", 0)),
+                "bytes": int(counters.get("bytes", 0)),
+            })
+        return rows
+
+
+def cache_counts() -> dict:
+    """Return {cache name: {"hits": n, "misses": n}} for every cache looked up so far"""
+    with _lock:
+        return {
+            name: {"hits": counts["hit"], "misses": counts["miss"]}
+            for name, counts in sorted(_cache_counters.items())
+        }
+
+
+def render_prometheus() -> str:
+    """Render all metrics in the Prometheus text exposition format"""
+    lines = [
+        "# TYPE hikmamind_stage_seconds summary",
+    ]
+    with _lock:
+        durations = {stage: list(values) for stage, values in _durations.items()}
+        counters = {stage: dict(values) for stage, values in _counters.items()}
+        cache = {name: dict(counts) for name, counts in _cache_counters.items()}
+    for stage, values in sorted(durations.items()):
+        for q in (0.5, 0.95, 0.99):
+            lines.append(f'hikmamind_stage_seconds{{stage="{stage}",quantile="{q}"}} {_percentile(values, q):.6f}')
+        if stage in counters:
+            lines.append(f'hikmamind_stage_seconds_sum{{stage="{stage}"}} {counters[stage].get("seconds", 0.0):.6f}')
+            lines.append(f'hikmamind_stage_seconds_count{{stage="{stage}"}} {int(counters[stage].get("count", 0))}')
+    lines.append("# TYPE hikmamind_stage_errors_total counter")
+    lines.append("# TYPE hikmamind_tokens_total counter")
+    lines.append("# TYPE hikmamind_payload_bytes_total counter")
+    for stage, values in sorted(counters.items()):
+        lines.append(f'hikmamind_stage_errors_total{{stage="{stage}"}} {int(values.get("errors", 0))}')
+        lines.append(f'hikmamind_tokens_total{{stage="{stage}",direction="input"}} {int(values.get("tokens_in", 0))}')
+        lines.append(f'hikmamind_tokens_total{{stage="{stage}",direction="output"}} {int(values.get("tokens_out", 0))}')
+        lines.append(f'hikmamind_payload_bytes_total{{stage="{stage}"}} {int(values.get("bytes", 0))}')
+    lines.append("# TYPE hikmamind_cache_requests_total counter")
+    for name, counts in sorted(cache.items()):
+        for result in ("hit", "miss"):
+            lines.append(f'hikmamind_cache_requests_total{{cache="{name}",result="{result}"}} {counts.get(result, 0)}')
+    return "\n".join(lines) + "\n"
+
+
+class _MetricsHandler(BaseHTTPRequestHandler):
+    def do_GET(self):
+        if self.path.rstrip("/") != "/metrics":
+            self.send_error(404)
+            return
+        body = render_prometheus().encode("utf-8")
+        self.send_response(200)
+        self.send_header("Content-Type", "text/plain; version=0.0.4")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+
+_server = None
+
+
+def start_metrics_server(port: int):
+    """Serve /metrics on the given port from a daemon thread (once per process)"""
+    global _server
+    with _lock:
+        if _server is not None:
+            return
+        _server = ThreadingHTTPServer(("0.0.0.0", port), _MetricsHandler)
+    threading.Thread(target=_server.serve_forever, name="hikmamind-metrics", daemon=True).start()
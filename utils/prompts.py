@@ -0,0 +1,143 @@
+from dataclasses import dataclass
+from typing import Dict, Tuple
+
+
+class Prompt(str):
+    """Rendered prompt text that remembers which template produced it.
+
+    It is a plain string everywhere it is sent, while make_cache_key also
+    reads its template_id, so cached results are invalidated whenever a
+    template's version changes.
+    """
+
+    template_id = ""
+
+    def __new__(cls, text: str, template_id: str = ""):
+        prompt = super().__new__(cls, text)
+        prompt.template_id = template_id
+        return prompt
+
+
+@dataclass(frozen=True)
+class PromptTemplate:
+    """Instruction for one (source, analysis type); bump version whenever the text changes"""
+    source: str
+    analysis_type: str
+    instruction: str
+    version: int = 1
+
+    @property
+    def id(self) -> str:
+        return f"{self.source}/{self.analysis_type}@v{self.version}"
+
+
+def _templates(source: str, instructions: Dict[str, str]) -> Dict[Tuple[str, str], PromptTemplate]:
+    return {
+        (source, analysis_type): PromptTemplate(source, analysis_type, instruction)
+        for analysis_type, instruction in instructions.items()
+    }
+
+
+TEMPLATES = {}
+TEMPLATES.update(_templates("pdf", {
+    "General summary": "Summarize this research paper concisely.",
+    "Detailed analogy": "Explain the main concepts of this paper using simple, familiar analogies.",
+    "Simplify concepts": "Simplify the complex concepts in this paper for a non-expert audience.",
+    "Key research points": "Identify and explain the main contributions and key findings of this research.",
+}))
+TEMPLATES.update(_templates("video", {
+    "Simple summary (3 sentences)": "Please summarize this video in 3 sentences.",
+    "Detailed analogy": "Explain the key concepts of this video using simple, familiar analogies.",
+    "Key points": "List and explain the 5 key points of this video.",
+    "Beginner explanation": "Explain the content of this video as if presenting to someone new to the topic.",
+}))
+
+# Analysis type used when a source is asked for a type it has no template for
+DEFAULT_TYPES = {"pdf": "Key research points", "video": "Beginner explanation"}
+
+# How each source's content should be cited when the profile asks for citations
+CITATION_INSTRUCTIONS = {
+    "pdf": "Cite the sections or pages your explanation relies on, and the paper's own references for key claims.",
+    "video": "Cite the timestamps (mm:ss) of the parts of the video your explanation relies on.",
+}
+
+# Produces every PDF analysis type from a single request
+ALL_PDF_ANALYSES = "All analyses"
+ALL_PDF_ANALYSES_VERSION = 1
+
+
+def analysis_types(source: str) -> list:
+    """Return the analysis types that have a template for a source, in display order"""
+    return [analysis_type for template_source, analysis_type in TEMPLATES if template_source == source]
+
+
+def json_field(analysis_type: str) -> str:
+    return analysis_type.lower().replace(" ", "_")
+
+
+def profile_key(user_profile) -> tuple:
+    """The profile fields that affect prompts, as a hashable tuple"""
+    return (
+        user_profile.field,
+        user_profile.knowledge_level,
+        user_profile.analogy_style,
+        bool(getattr(user_profile, "include_citations", False)),
+    )
+
+
+# Rendered prompts, memoized per (kind, analysis type, profile tuple); the key space is small
+_rendered = {}
+
+
+def _memoized(key: tuple, render) -> str:
+    text = _rendered.get(key)
+    if text is None:
+        text = _rendered.setdefault(key, render())
+    return text
+
+
+def profile_context(user_profile) -> str:
+    """Profile-dependent preamble shared by every prompt of the same profile"""
+    def render():
+        lines = [
+            f"The user is in the field of {user_profile.field}, "
+            f"knowledge level: {user_profile.knowledge_level}, "
+            f"prefers analogies: {user_profile.analogy_style}."
+        ]
+        modifier = user_profile.get_prompt_modifier()
+        if modifier:
+            lines.append(modifier)
+        return "\n".join(lines)
+    return _memoized(("profile",) + profile_key(user_profile), render)
+
+
+def _profile_parts(source: str, user_profile) -> list:
+    # Profile first, then the instruction: every prompt of a profile shares the same prefix
+    parts = [profile_context(user_profile)]
+    if getattr(user_profile, "include_citations", False) and source in CITATION_INSTRUCTIONS:
+        parts.append(CITATION_INSTRUCTIONS[source])
+    return parts
+
+
+def render_prompt(source: str, analysis_type: str, user_profile) -> Prompt:
+    """Render the prompt for an analysis, memoized per distinct profile"""
+    template = TEMPLATES.get((source, analysis_type)) or TEMPLATES[(source, DEFAULT_TYPES[source])]
+    return _memoized(
+        (source, analysis_type) + profile_key(user_profile),
+        lambda: Prompt("\n".join(_profile_parts(source, user_profile) + [template.instruction]), template.id)
+    )
+
+
+def render_all_pdf_prompt(user_profile) -> Prompt:
+    """Render the single-request prompt producing every PDF analysis type as JSON fields"""
+    templates = [template for (source, _), template in TEMPLATES.items() if source == "pdf"]
+    template_id = f"pdf/{ALL_PDF_ANALYSES}@v{ALL_PDF_ANALYSES_VERSION}[{','.join(t.id for t in templates)}]"
+
+    def render():
+        instructions = "\n".join(f"- {json_field(t.analysis_type)}: {t.instruction}" for t in templates)
+        return Prompt("\n".join(_profile_parts("pdf", user_profile) + [
+            "Analyze this research paper in each of the following ways and return a JSON object "
+            "with one Markdown string field per analysis:\n"
+            f"{instructions}"
+        ]), template_id)
+    return _memoized(("pdf", ALL_PDF_ANALYSES) + profile_key(user_profile), render)
@@ -0,0 +1,256 @@
+import random
+import threading
+import time
+from concurrent.futures import Future
+
+from utils.config import (
+    RATE_LIMIT_BURST,
+    RATE_LIMIT_RPM,
+    REQUEST_DEADLINE_SECONDS,
+    RETRY_BASE_DELAY_SECONDS,
+    RETRY_MAX_ATTEMPTS,
+)
+from utils.lazy import lazy_import
+from utils.metrics import StageTimer, observe
+
+httpx = lazy_import("httpx")
+
+
+class DeadlineExceeded(Exception):
+    """Raised when a request could not complete before its deadline"""
+
+
+def is_retryable(error: Exception) -> bool:
+    """True for rate limiting (429), transient server errors (5xx) and network failures"""
+    code = getattr(error, "code", None) or getattr(error, "status_code", None)
+    if isinstance(code, int):
+        return code == 429 or 500 <= code < 600
+    return isinstance(error, (httpx.TransportError, TimeoutError, ConnectionError))
+
+
+class TokenBucket:
+    """Token-bucket rate limiter: `rate` tokens per second, bursts up to `capacity`"""
+
+    def __init__(self, rate: float, capacity: float):
+        self.rate = rate
+        self.capacity = capacity
+        self._tokens = capacity
+        self._updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def _refill(self, now: float):
+        self._tokens = min(self.capacity, self._tokens + (now - self._updated) * self.rate)
+        self._updated = now
+
+    def acquire(self, deadline: float = None):
+        """Block until a token is available, or raise DeadlineExceeded"""
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                self._refill(now)
+                if self._tokens >= 1:
+                    self._tokens -= 1
+                    return
+                wait = (1 - self._tokens) / self.rate
+            if deadline is not None and now + wait > deadline:
+                raise DeadlineExceeded("Rate limit: no request slot available before the deadline")
+            time.sleep(wait)
+
+
+class SharedStream:
+    """Chunks of one in-flight stream, replayed to every consumer that joins it"""
+
+    def __init__(self):
+        self.chunks = []
+        self.done = False
+        self.error = None
+        self._cond = threading.Condition()
+
+    def append(self, chunk):
+        with self._cond:
+            self.chunks.append(chunk)
+            self._cond.notify_all()
+
+    def finish(self, error: Exception = None):
+        with self._cond:
+            self.done = True
+            self.error = error
+            self._cond.notify_all()
+
+    def follow(self, deadline: float):
+        """Yield every chunk, past and future, until the stream ends; raises its error"""
+        index = 0
+        while True:
+            with self._cond:
+                while index >= len(self.chunks) and not self.done:
+                    remaining = deadline - time.monotonic()
+                    if remaining <= 0:
+                        raise DeadlineExceeded("Shared stream did not complete before the deadline")
+                    self._cond.wait(remaining)
+                chunks = self.chunks[index:]
+                done, error = self.done, self.error
+            yield from chunks
+            index += len(chunks)
+            if done and index >= len(self.chunks):
+                if error is not None:
+                    raise error
+                return
+
+
+class RequestScheduler:
+    """Single entry point for Gemini calls.
+
+    Every call waits for a rate-limit token, is retried with exponential
+    backoff and full jitter on retryable errors, and must finish within its
+    deadline. Calls made with the same key while one is already in flight
+    share that call's result instead of hitting the API again; streams made
+    with the same key share the chunks of the first one.
+    """
+
+    def __init__(self, rpm: float = RATE_LIMIT_RPM, burst: float = RATE_LIMIT_BURST,
+                 max_attempts: int = RETRY_MAX_ATTEMPTS, base_delay: float = RETRY_BASE_DELAY_SECONDS,
+                 deadline: float = REQUEST_DEADLINE_SECONDS):
+        self.bucket = TokenBucket(rpm / 60.0, burst) if rpm > 0 else None
+        self.max_attempts = max(1, max_attempts)
+        self.base_delay = base_delay
+        self.deadline = deadline
+        self.retries = 0
+        self.coalesced = 0
+        self._inflight = {}
+        self._streams = {}
+        self._lock = threading.Lock()
+
+    def _backoff(self, attempt: int, deadline: float):
+        delay = random.uniform(0, self.base_delay * (2 ** attempt))
+        if time.monotonic() + delay > deadline:
+            raise DeadlineExceeded("Request did not succeed before its deadline")
+        self.retries += 1
+        time.sleep(delay)
+
+    def _call_with_retry(self, fn, deadline: float):
+        attempt = 0
+        while True:
+            if self.bucket is not None:
+                self.bucket.acquire(deadline)
+            try:
+                return fn()
+            except Exception as e:
+                if not is_retryable(e) or attempt + 1 >= self.max_attempts:
+                    raise
+                self._backoff(attempt, deadline)
+                attempt += 1
+
+    def run(self, fn, key: str = None, deadline: float = None, timer: StageTimer = None):
+        """Call fn() under rate limiting, retries and a deadline (in seconds).
+        
+        The response's token usage is recorded on timer. A call coalesced
+        onto another one marks its timer as coalesced instead, so metrics,
+        job usage and budgets only count the tokens of the one real request.
+        """
+        deadline = time.monotonic() + (deadline or self.deadline)
+        if key is None:
+            return self._record_usage(timer, self._call_with_retry(fn, deadline))
+
+        with self._lock:
+            future = self._inflight.get(key)
+            leader = future is None
+            if leader:
+                future = Future()
+                self._inflight[key] = future
+            else:
+                self.coalesced += 1
+        if not leader:
+            start = time.monotonic()
+            result = future.result(timeout=max(0.0, deadline - start))
+            observe("coalesced_wait", time.monotonic() - start)
+            if timer is not None:
+                timer.coalesced = True
+            return result
+
+        try:
+            result = self._record_usage(timer, self._call_with_retry(fn, deadline))
+            future.set_result(result)
+            return result
+        except Exception as e:
+            future.set_exception(e)
+            raise
+        finally:
+            with self._lock:
+                self._inflight.pop(key, None)
+
+    @staticmethod
+    def _record_usage(timer: StageTimer, response):
+        if timer is not None:
+            timer.record_usage(response)
+        return response
+
+    def stream(self, make_stream, key: str = None, deadline: float = None, timer: StageTimer = None):
+        """Yield from make_stream(), retrying until the first chunk arrives.
+
+        Once output has been yielded a failure is re-raised, since the
+        consumer has already seen part of the response. A stream started
+        with the key of one already in flight replays that stream's chunks
+        instead of calling the API, and marks its timer as coalesced.
+        """
+        deadline = time.monotonic() + (deadline or self.deadline)
+        if key is None:
+            yield from self._stream_with_retry(make_stream, deadline)
+            return
+
+        with self._lock:
+            shared = self._streams.get(key)
+            leader = shared is None
+            if leader:
+                shared = self._streams[key] = SharedStream()
+            else:
+                self.coalesced += 1
+        if not leader:
+            if timer is not None:
+                timer.coalesced = True
+            start = time.monotonic()
+            for index, chunk in enumerate(shared.follow(deadline)):
+                if index == 0:
+                    observe("coalesced_wait", time.monotonic() - start)
+                yield chunk
+            return
+
+        error = RuntimeError("The stream this request was sharing was abandoned")
+        try:
+            for chunk in self._stream_with_retry(make_stream, deadline):
+                shared.append(chunk)
+                yield chunk
+            error = None
+        except Exception as e:
+            error = e
+            raise
+        finally:
+            with self._lock:
+                self._streams.pop(key, None)
+            shared.finish(error)
+
+    def _stream_with_retry(self, make_stream, deadline: float):
+        def first_chunk():
+            iterator = iter(make_stream())
+            try:
+                return iterator, next(iterator)
+            except StopIteration:
+                return iterator, None
+
+        iterator, chunk = self._call_with_retry(first_chunk, deadline)
+        if chunk is None:
+            return
+        yield chunk
+        yield from iterator
+
+
+_scheduler = None
+_scheduler_lock = threading.Lock()
+
+
+def get_scheduler() -> RequestScheduler:
+    """Return the process-wide request scheduler"""
+    global _scheduler
+    with _scheduler_lock:
+        if _scheduler is None:
+            _scheduler = RequestScheduler()
+        return _scheduler
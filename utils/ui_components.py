@@ -1,7 +1,60 @@
+import uuid
 import streamlit as st
-from utils.config import ANALOGY_STYLES, FIELDS, KNOWLEDGE_LEVELS
+from utils.config import ANALOGY_STYLES, FIELDS, KNOWLEDGE_LEVELS, JOB_POLL_SECONDS
+from utils.jobs import LOCAL_USER, get_job_manager
+from utils.metrics import cache_counts, snapshot
 from models.user_profile import UserProfile, save_profile, get_current_profile
 
+# st.fragment graduated from st.experimental_fragment in newer Streamlit releases
+fragment = getattr(st, "fragment", None) or st.experimental_fragment
+
+def get_session_id() -> str:
+    """Return a stable id for the current browser session"""
+    if "session_id" not in st.session_state:
+        st.session_state.session_id = uuid.uuid4().hex
+    return st.session_state.session_id
+
+def get_user_id() -> str:
+    """Return the id of the person using the app, stable across refreshes, tabs and restarts.
+
+    It is the user query parameter when the link carries one (e.g.
+    ?user=alice on a shared deployment), otherwise the single local user.
+    """
+    return st.query_params.get("user") or LOCAL_USER
+
+@fragment(run_every=JOB_POLL_SECONDS)
+def render_job_progress(job_id: str):
+    """Poll a background job, showing progress and any streamed output.
+    
+    Only this fragment reruns while the job is in flight; once it finishes
+    the whole app reruns so the caller can render the final result.
+    """
+    job = get_job_manager().get(job_id)
+    if job is None or job.done:
+        st.rerun()
+    st.progress(job.progress, text=job.message or f"{job.label}...")
+    if job.partial:
+        with st.container(border=True):
+            st.markdown(job.partial)
+
+def render_prefetch_status(prefetch):
+    """Show how far the background preparation of an input has got"""
+    if prefetch is None or prefetch.cancel.is_set():
+        return
+    if not prefetch.future.done():
+        st.caption("⏳ Preparing in the background...")
+        return
+    error = prefetch.future.exception()
+    if error is not None:
+        st.caption(f"⚠️ {error}")
+        return
+    prepared = prefetch.future.result()
+    if prepared.cached_types:
+        st.caption(f"⚡ {prepared.size.describe()}. Already analyzed for your profile (instant): "
+                   f"{', '.join(prepared.cached_types)}")
+    else:
+        st.caption(f"✅ Ready to analyze ({prepared.size.describe()})")
+
 def render_header():
     """Display application header"""
     st.title("🧠 HikmaMind")
@@ -96,3 +149,16 @@ def render_sidebar():
         """)
     
     return current_profile
+
+def render_admin_panel():
+    """Display per-stage latency, token and cache metrics for this process"""
+    with st.sidebar.expander("📊 Performance metrics"):
+        rows = snapshot()
+        if rows:
+            st.dataframe(rows, width="stretch", hide_index=True)
+        else:
+            st.caption("No requests recorded yet.")
+        for name, counts in cache_counts().items():
+            lookups = counts["hits"] + counts["misses"]
+            hit_rate = f"{counts['hits'] / lookups:.0%}" if lookups else "n/a"
+            st.caption(f"{name.capitalize()} cache: {counts['hits']} hits, {counts['misses']} misses (hit rate {hit_rate})")
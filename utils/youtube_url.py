@@ -0,0 +1,120 @@
+import re
+from dataclasses import dataclass
+from typing import Optional
+from urllib.parse import parse_qs, urlparse
+
+_VIDEO_ID_RE = re.compile(r"^[A-Za-z0-9_-]{11}$")
+_HMS_RE = re.compile(r"^(?:(\d+)h)?(?:(\d+)m)?(?:(\d+)s?)?$")
+
+YOUTUBE_HOSTS = {
+    "youtube.com",
+    "www.youtube.com",
+    "m.youtube.com",
+    "music.youtube.com",
+    "youtube-nocookie.com",
+    "www.youtube-nocookie.com",
+}
+SHORT_HOSTS = {"youtu.be", "www.youtu.be"}
+
+# Path prefixes that are followed by the video id
+ID_PATH_PREFIXES = ("shorts", "embed", "live", "v", "e")
+
+
+class InvalidYouTubeURL(ValueError):
+    """Raised when a string is not a recognizable YouTube video URL"""
+
+
+@dataclass(frozen=True)
+class VideoRef:
+    """A YouTube video, optionally restricted to a clip in seconds"""
+    video_id: str
+    start: Optional[int] = None
+    end: Optional[int] = None
+
+    @property
+    def url(self) -> str:
+        """Canonical watch URL (without the time range)"""
+        return f"https://www.youtube.com/watch?v={self.video_id}"
+
+    @property
+    def label(self) -> str:
+        """Canonical URL followed by the clip range, for display"""
+        if not self.is_clip:
+            return self.url
+        return f"{self.url} ({self.start or 0}s–{'' if self.end is None else f'{self.end}s'})"
+
+    @property
+    def is_clip(self) -> bool:
+        return self.start is not None or self.end is not None
+
+    @property
+    def key(self) -> str:
+        """Stable identity for caching and dedup: the video id plus any clip range"""
+        if not self.is_clip:
+            return self.video_id
+        return f"{self.video_id}@{self.start or 0}-{self.end if self.end is not None else ''}"
+
+    def with_range(self, start: Optional[int] = None, end: Optional[int] = None) -> "VideoRef":
+        """Return a copy with start/end overridden where given"""
+        start = self.start if start is None else start
+        end = self.end if end is None else end
+        if start is not None and end is not None and end <= start:
+            raise InvalidYouTubeURL("The end of the segment must be after its start")
+        return VideoRef(self.video_id, start, end)
+
+
+def parse_timestamp(value: str) -> Optional[int]:
+    """Parse '90', '90s', '1m30s', '1h2m3s', '1:30' or '1:02:03' into seconds"""
+    value = (value or "").strip().lower()
+    if not value:
+        return None
+    if ":" in value:
+        parts = value.split(":")
+        if not all(part.isdigit() for part in parts) or len(parts) > 3:
+            raise InvalidYouTubeURL(f"Invalid timestamp: {value}")
+        seconds = 0
+        for part in parts:
+            seconds = seconds * 60 + int(part)
+        return seconds
+    match = _HMS_RE.match(value)
+    if not match or not any(match.groups()):
+        raise InvalidYouTubeURL(f"Invalid timestamp: {value}")
+    hours, minutes, seconds = (int(group or 0) for group in match.groups())
+    return hours * 3600 + minutes * 60 + seconds
+
+
+def _video_id(parsed) -> Optional[str]:
+    host = (parsed.hostname or "").lower()
+    segments = [segment for segment in parsed.path.split("/") if segment]
+    if host in SHORT_HOSTS:
+        return segments[0] if segments else None
+    if host not in YOUTUBE_HOSTS:
+        return None
+    if segments[:1] == ["watch"] or not segments:
+        return parse_qs(parsed.query).get("v", [None])[0]
+    if len(segments) >= 2 and segments[0] in ID_PATH_PREFIXES:
+        return segments[1]
+    return None
+
+
+def parse_youtube_url(yt_url: str) -> VideoRef:
+    """Canonicalize any common YouTube URL form into a VideoRef.
+
+    Handles watch, youtu.be, m./music. hosts, shorts, embed and live URLs.
+    A t=/start= parameter is only a playback position, so it is dropped and
+    every link to a video shares its identity; clips are set explicitly with
+    with_range().
+    """
+    raw = (yt_url or "").strip()
+    if raw and "://" not in raw:
+        raw = f"https://{raw}"
+    parsed = urlparse(raw)
+    video_id = _video_id(parsed)
+    if not video_id or not _VIDEO_ID_RE.match(video_id):
+        raise InvalidYouTubeURL("Not a valid YouTube video URL")
+    return VideoRef(video_id)
+
+
+def as_video_ref(video) -> VideoRef:
+    """Accept a VideoRef or a URL string"""
+    return video if isinstance(video, VideoRef) else parse_youtube_url(video)